@@ -0,0 +1,203 @@
+"""
+Pipeline benchmarks on reproducible synthetic corpora (offline, plain Linux).
+
+Usage:
+  python benchmarks/bench_pipeline.py [--scale 10k|1m|10m] [--cases extract_pdf,label,...] [--repeat 3]
+                                      [--corpus DIR] [--save-baseline] [--compare] [--tolerance 0.15]
+
+Corpora (benchmarks/corpora.py) are generated once per scale and seed under
+--corpus (default: $TMPDIR/regulqa_bench/<scale>). Each case runs in a fresh
+process and reports wall time, peak RSS and sentences/s:
+  extract_pdf / extract_html   tools/extract_to_csv.process_file over the PDFs / HTML
+  convert_t1_xml / _html       convert_t1_html_xml.convert_all on PURE-like XML / large HTML
+  build_pool / build_pool_stream   clean_all.build_pool on the CSV tiers (in-memory / streaming)
+  synth_t2                     synth_t2.make_synthetic
+  label                        bootstrap_v1_labels.main on a pool-shaped Parquet table
+Every run is appended to benchmarks/results/history.json. --save-baseline
+stores it as benchmarks/results/baseline.json. --compare flags cases slower
+(or heavier in peak RSS) than the baseline at the same scale by more than
+--tolerance (slowdowns under --min-delta seconds count as noise), and exits
+1 if there are any.
+"""
+import argparse, json, multiprocessing, os, platform, subprocess, sys, tempfile, time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+HERE = Path(__file__).resolve().parent
+RESULTS = HERE / "results"
+HISTORY = RESULTS / "history.json"
+BASELINE = RESULTS / "baseline.json"
+sys.path.insert(0, str(HERE))
+sys.path.insert(1, str(ROOT / "src" / "data"))
+import corpora
+
+REGEX = r"\b(shall|should|must)\b"
+
+# name: corpus kind (benchmarks/corpora.py) it reads
+CASES = {
+    "extract_pdf": "pdf",
+    "extract_html": "html",
+    "convert_t1_xml": "xml",
+    "convert_t1_html": "html",
+    "build_pool": "csv",
+    "build_pool_stream": "csv",
+    "synth_t2": None,
+    "label": "pool",
+}
+
+def _load(code, name):
+    import importlib.util
+    spec = importlib.util.spec_from_file_location(name, ROOT / code)
+    mod = importlib.util.module_from_spec(spec); spec.loader.exec_module(mod)
+    return mod
+
+def _prepare(case, corpus, n, scratch):
+    """Import and point the stage at the corpus; returns a no-arg callable giving the sentences handled."""
+    import re
+    d = Path(corpus) / (CASES[case] or "")
+    if case.startswith("extract_"):
+        sys.path.insert(0, str(ROOT / "tools"))
+        mod = _load("tools/extract_to_csv.py", "bench_extract")
+        rx = re.compile(REGEX, re.I)
+        if case == "extract_pdf":
+            import fitz  # noqa: F401  (imported lazily by the extractor; keep it out of the timing)
+        files = sorted((d / "downloads").glob("*.pdf")) if case == "extract_pdf" else sorted((d / "raw").rglob("*.html"))
+        return lambda: sum(len(mod.process_file(f, rx, 15, 500)) for f in files)
+    if case.startswith("convert_t1"):
+        mod = _load("src/data/convert_t1_html_xml.py", "bench_convert")
+        mod.RAW = d / "raw"
+        return lambda: (mod.convert_all(), n)[1]
+    if case.startswith("build_pool"):
+        mod = _load("src/data/clean_all.py", "bench_clean_all")
+        mod.RAW, mod.INTERIM, mod.PROCESSED = d / "raw", scratch, scratch
+        mod.POOL, mod.DELTA, mod.REGISTRY = scratch / "pool.parquet", scratch / "pool_new.parquet", scratch / "ids.sqlite"
+        return lambda: (mod.build_pool(stream=case.endswith("_stream")), n)[1]
+    if case == "synth_t2":
+        mod = _load("src/data/synth_t2.py", "bench_synth")
+        return lambda: mod.make_synthetic(n_each=n // 5, out_dir=scratch)
+    if case == "label":
+        mod = _load("data/processed/bootstrap_v1_labels.py", "bench_label")
+        mod.rule_cache.CACHE = scratch / "rule_cache"      # cold cache: every run scans all rules
+        return lambda: (mod.main(d / "pool.parquet", scratch / "labeled.parquet"), n)[1]
+    raise ValueError(case)
+
+def _child(case, corpus, n):
+    """Worker entry: run one case with stdout silenced; wall time (imports excluded), peak RSS, throughput."""
+    import contextlib, io, traceback
+    with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()):
+        try:
+            fn = _prepare(case, corpus, n, Path(tmp))
+            t0 = time.perf_counter()
+            items = fn()
+        except Exception:
+            return {"error": traceback.format_exc(limit=3)}
+        dt = time.perf_counter() - t0
+    from metrics import _peak_rss_mb
+    return {"seconds": round(dt, 3), "peak_rss_mb": _peak_rss_mb(), "items": items,
+            "items_per_s": round(items / dt, 1) if dt else None}
+
+def run(scale="10k", cases=None, repeat=3, corpus=None, seed=13):
+    n = corpora.SCALES[scale]
+    corpus = Path(corpus) if corpus else Path(tempfile.gettempdir()) / "regulqa_bench" / scale
+    cases = cases or list(CASES)
+    results = {}
+    for case in cases:
+        kind, m = CASES[case], n
+        if kind:
+            t = time.perf_counter()
+            corpora.ensure(corpus, kind, m, seed)
+            gen = time.perf_counter() - t
+            if gen > 1:
+                print(f"[corpus] {kind} n={m} ready in {gen:.1f} s")
+        best = None
+        for _ in range(repeat):
+            # spawn: the child starts clean, so peak RSS is the case's own, not the harness's
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as ex:
+                r = ex.submit(_child, case, str(corpus), m).result()
+            if "error" in r:
+                best = r; break
+            if best is None:
+                best = r
+            else:
+                best = {**min(best, r, key=lambda x: x["seconds"]), "peak_rss_mb": max(best["peak_rss_mb"], r["peak_rss_mb"])}
+        results[case] = best
+        if "error" in best:
+            print(f"{case:18s} ERROR\n{best['error']}")
+        else:
+            print(f"{case:18s} {best['seconds']:9.2f} s {best['peak_rss_mb']:8.1f} MB {best['items_per_s']:12.0f} items/s")
+    return {"run_at": datetime.now(timezone.utc).isoformat(timespec="seconds"), "git": _git_rev(), "scale": scale,
+            "seed": seed, "repeat": repeat, "host": platform.node(), "python": platform.python_version(),
+            "cpus": os.cpu_count(), "results": results}
+
+def _git_rev():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+def compare(run_, baseline, tolerance=0.15, mem_tolerance=0.25, min_delta=0.25):
+    """Cases of run_ slower / heavier than baseline beyond the tolerances → list of messages.
+
+    Slowdowns under `min_delta` seconds are treated as noise (the 10k scale runs in fractions of a second).
+    """
+    if baseline.get("scale") != run_["scale"]:
+        print(f"[warn] baseline scale {baseline.get('scale')} != {run_['scale']}; nothing compared")
+        return []
+    flags = []
+    for case, r in run_["results"].items():
+        b = baseline.get("results", {}).get(case)
+        if not b or "error" in b:
+            continue
+        if "error" in r:
+            flags.append(f"{case}: failed"); continue
+        dt = r["seconds"] / b["seconds"] - 1 if b["seconds"] else 0
+        dm = r["peak_rss_mb"] / b["peak_rss_mb"] - 1 if b["peak_rss_mb"] else 0
+        state = []
+        if dt > tolerance and r["seconds"] - b["seconds"] > min_delta:
+            state.append(f"time {b['seconds']:.2f}→{r['seconds']:.2f} s (+{dt:.0%})")
+        if dm > mem_tolerance:
+            state.append(f"peak RSS {b['peak_rss_mb']:.0f}→{r['peak_rss_mb']:.0f} MB (+{dm:.0%})")
+        print(f"{case:18s} time {dt:+.0%} rss {dm:+.0%}" + ("  REGRESSION" if state else ""))
+        if state:
+            flags.append(f"{case}: " + "; ".join(state))
+    return flags
+
+def main(scale="10k", cases=None, repeat=3, corpus=None, seed=13, save_baseline=False, do_compare=False,
+         tolerance=0.15, mem_tolerance=0.25, min_delta=0.25):
+    result = run(scale, cases, repeat, corpus, seed)
+    RESULTS.mkdir(parents=True, exist_ok=True)
+    history = json.loads(HISTORY.read_text()) if HISTORY.exists() else []
+    history.append(result)
+    HISTORY.write_text(json.dumps(history, indent=1))
+    print("Appended to", HISTORY)
+    if save_baseline:
+        BASELINE.write_text(json.dumps(result, indent=1))
+        print("Saved baseline", BASELINE)
+    if do_compare:
+        if not BASELINE.exists():
+            print("No baseline; run with --save-baseline first")
+            return 1
+        flags = compare(result, json.loads(BASELINE.read_text()), tolerance, mem_tolerance, min_delta)
+        for f in flags:
+            print("[regression]", f)
+        return 1 if flags else 0
+    return 0
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--scale", choices=list(corpora.SCALES), default="10k")
+    ap.add_argument("--cases", default=None, help=f"Comma-separated subset of: {', '.join(CASES)}")
+    ap.add_argument("--repeat", type=int, default=3, help="Runs per case (best time is kept)")
+    ap.add_argument("--corpus", default=None, help="Corpus directory (reused across runs)")
+    ap.add_argument("--seed", type=int, default=13)
+    ap.add_argument("--save-baseline", action="store_true")
+    ap.add_argument("--compare", action="store_true", help="Flag regressions against the baseline")
+    ap.add_argument("--tolerance", type=float, default=0.15, help="Allowed slowdown (0.15 = 15%%)")
+    ap.add_argument("--mem-tolerance", type=float, default=0.25, help="Allowed peak RSS growth")
+    ap.add_argument("--min-delta", type=float, default=0.25, help="Ignore slowdowns below this many seconds")
+    args = ap.parse_args()
+    sys.exit(main(args.scale, args.cases.split(",") if args.cases else None, args.repeat, args.corpus, args.seed,
+                  args.save_baseline, args.compare, args.tolerance, args.mem_tolerance, args.min_delta))
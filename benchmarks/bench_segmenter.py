@@ -0,0 +1,95 @@
+"""
+Throughput benchmark for the PDF sentence segmenter (src/data/segmenter.py).
+
+Usage:
+  python benchmarks/bench_segmenter.py [--pages 500] [--repeat 3] [--keep PATH]
+
+Generates a PDF fixture (PyMuPDF) with a running header, a "Page i of N"
+footer and requirement sentences that cross page breaks, then times
+  - baseline: the old per-page re.split + per-part re.sub splitter
+  - streaming: strip_running + iter_sentences over the same page texts
+and reports pages/s, MB/s, sentence counts, header/footer leaks and how many
+of the page-spanning requirements come out whole.
+"""
+import argparse, re, sys, tempfile, time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "src" / "data"))
+import segmenter
+
+HEADER = "ACME Avionics - Flight Control SRS FC-0042 Rev 3"
+FOOTER = "Company Confidential - Page {i} of {n}"
+SPAN = "The {unit} software shall switch to the backup channel within 50 ms of a detected {unit} fault."
+UNITS = ["flight control", "autopilot", "air data", "engine monitor", "fuel management", "display", "navigation"]
+
+def make_fixture(path, pages=500, lines_per_page=40):
+    """Write the fixture PDF; returns the number of page-spanning requirements planted."""
+    import fitz
+    words = ("the system shall record each event and the operator should confirm the alarm "
+             "before the controller must restore nominal mode").split()
+    doc = fitz.open()
+    spans = 0
+    for i in range(pages):
+        body = []
+        for j in range(lines_per_page - 1):
+            k = (i * lines_per_page + j) % len(words)
+            body.append(f"Req {i}.{j}: " + " ".join(words[k:] + words[:k])[:70] + ".")
+        if i < pages - 1:
+            body.append(SPAN.format(unit=UNITS[i % len(UNITS)]).split(" within")[0])   # continues on the next page
+            spans += 1
+        if i > 0:
+            body.insert(0, "within" + SPAN.format(unit=UNITS[(i - 1) % len(UNITS)]).split(" within")[1])
+        page = doc.new_page()
+        y = 30
+        page.insert_text((40, y), HEADER, fontsize=8)
+        for line in body:
+            y += 18
+            page.insert_text((40, y), line, fontsize=7)
+        page.insert_text((40, 820), FOOTER.format(i=i + 1, n=pages), fontsize=8)
+    doc.save(path)
+    return spans
+
+def baseline(pages):
+    out = []
+    for txt in pages:
+        parts = re.split(r'(?<=[.?!])\s+(?=[A-Z0-9])', txt)
+        out.extend(re.sub(r'\s+', ' ', p).strip() for p in parts if p and len(p.strip()) > 0)
+    return out
+
+def streaming(pages):
+    return list(segmenter.segment_pages(pages))
+
+def _time(fn, pages, repeat):
+    best, out = None, None
+    for _ in range(repeat):
+        t = time.perf_counter(); out = fn(pages); dt = time.perf_counter() - t
+        best = dt if best is None or dt < best else best
+    return best, out
+
+def main(pages=500, repeat=3, keep=None):
+    import fitz
+    tmp = Path(keep) if keep else Path(tempfile.mkdtemp()) / "fixture.pdf"
+    spans = make_fixture(tmp, pages)
+    t = time.perf_counter()
+    with fitz.open(tmp) as doc:
+        texts = [p.get_text("text") for p in doc]
+    t_extract = time.perf_counter() - t
+    mb = sum(map(len, texts)) / 1e6
+    spans_text = {SPAN.format(unit=u) for u in UNITS}
+    print(f"Fixture: {tmp} pages={pages} text={mb:.1f}MB extract={t_extract:.2f}s")
+    for name, fn in (("baseline", baseline), ("streaming", streaming)):
+        dt, sents = _time(fn, texts, repeat)
+        leaks = sum(1 for s in sents if "ACME Avionics" in s or "Company Confidential" in s)
+        whole = sum(1 for s in sents if s in spans_text)
+        print(f"{name:10s} {pages / dt:10.0f} pages/s {mb / dt:7.1f} MB/s  sentences={len(sents)} "
+              f"header/footer leaks={leaks} spanning whole={whole}/{spans}")
+    return 0
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pages", type=int, default=500)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--keep", default=None, help="Write the fixture PDF here instead of a temp dir")
+    args = ap.parse_args()
+    sys.exit(main(args.pages, args.repeat, args.keep))
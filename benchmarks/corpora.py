@@ -0,0 +1,147 @@
+"""
+Reproducible synthetic corpora for the pipeline benchmarks (benchmarks/bench_pipeline.py).
+
+Every generator is seeded and streams to disk, so the 10M-sentence scale
+never holds the corpus in memory. Layout under the corpus root:
+  xml/raw/t1_pure/*.xml               PURE-like XML (<req><text_body>...)
+  html/raw/t1_pure/*.html             large HTML (<li> requirements, boilerplate <p>)
+  csv/raw/{t1_pure,t2_synthetic,t3_domain}/*.csv   CSV tiers for clean_all
+  pdf/downloads/*.pdf                 multi-page PDFs with running header/footer
+  pool/pool.parquet                   pool-shaped table for the labeler
+"""
+from pathlib import Path
+import json, random
+import pandas as pd
+
+SCALES = {"10k": 10_000, "1m": 1_000_000, "10m": 10_000_000}
+
+SUBJECTS = ["flight control software", "ECU", "infusion pump controller", "interlocking logic", "safety PLC",
+            "operator console", "telemetry service", "braking module", "patient monitor", "SCADA gateway"]
+VERBS = ["log", "validate", "transmit", "compute", "limit", "store", "monitor", "verify", "report", "reject"]
+OBJECTS = ["the braking command", "sensor readings", "alarm events", "the dosage", "route requests",
+           "diagnostic records", "the trip signal", "user credentials", "telemetry packets", "mode transitions"]
+TAILS = ["within {n} ms", "as soon as possible", "when a fault is detected", "in a timely manner",
+         "at an interval of {n} ms", "before {n} retries", "and shall always notify the operator",
+         "if feasible", "faster than the previous release", "after power-on reset"]
+MODALS = ["shall", "shall", "shall", "should", "must", "may"]
+FILLER = ["This section describes the overall architecture.", "See Table {n} for details.",
+          "Revision history is maintained by the configuration manager."]
+
+ROWS_PER_FILE = 50_000      # CSV / XML rows per file
+HTML_PER_FILE = 500_000     # <li> per HTML file
+PDF_LINES = 40              # sentences per PDF page
+PDF_PAGES_PER_FILE = 1000
+
+def sentences(n, seed=13, salt=""):
+    """n requirement-like sentences (~1 in 10 non-requirement filler), deterministic per seed.
+
+    A running number keeps every sentence distinct, like real requirement ids.
+    """
+    rng = random.Random(f"{seed}:{salt}")
+    for i in range(n):
+        if rng.random() < 0.1:
+            yield rng.choice(FILLER).format(n=i)
+            continue
+        tail = rng.choice(TAILS).format(n=rng.choice([5, 10, 50, 100, 500]))
+        yield f"REQ-{i}: The {rng.choice(SUBJECTS)} {rng.choice(MODALS)} {rng.choice(VERBS)} {rng.choice(OBJECTS)} {tail}."
+
+def _split(n, per_file):
+    return [min(per_file, n - i) for i in range(0, n, per_file)]
+
+def write_xml(root, n, seed=13):
+    root.mkdir(parents=True, exist_ok=True)
+    gen, files = sentences(n, seed, "xml"), []
+    for k, m in enumerate(_split(n, ROWS_PER_FILE)):
+        path = root / f"bench_{k:04d}.xml"
+        with open(path, "w", encoding="utf-8") as fh:
+            fh.write('<?xml version="1.0" encoding="UTF-8"?>\n<req_document><title>Bench SRS</title>\n')
+            for j in range(m):
+                s = next(gen).replace("&", "&amp;").replace("<", "&lt;")
+                fh.write(f'<req id="R{j}"><text_body>{s}</text_body><rationale>n/a</rationale></req>\n')
+            fh.write("</req_document>\n")
+        files.append(path)
+    return files
+
+def write_html(root, n, seed=13):
+    root.mkdir(parents=True, exist_ok=True)
+    gen, files = sentences(n, seed, "html"), []
+    for k, m in enumerate(_split(n, HTML_PER_FILE)):
+        path = root / f"bench_{k:04d}.html"
+        with open(path, "w", encoding="utf-8") as fh:
+            fh.write("<html><head><title>Bench</title><style>li{margin:0}</style><script>var x=1;</script></head><body>\n")
+            for j in range(m):
+                if j % 200 == 0:
+                    fh.write(f"<h2>Section {j // 200}</h2><p>Overview of the section.</p><ul>\n")
+                fh.write(f"<li>{next(gen).replace('&', '&amp;').replace('<', '&lt;')}</li>\n")
+                if j % 200 == 199 or j == m - 1:
+                    fh.write("</ul>\n")
+            fh.write("</body></html>\n")
+        files.append(path)
+    return files
+
+def write_csv_tiers(root, n, seed=13):
+    """n sentences split over t1_pure / t2_synthetic / t3_domain CSVs (60/20/20)."""
+    gen, files = sentences(n, seed, "csv"), []
+    for folder, share, col in (("t1_pure", 0.6, "text"), ("t2_synthetic", 0.2, "req_text"), ("t3_domain", 0.2, "sentence")):
+        d = root / folder; d.mkdir(parents=True, exist_ok=True)
+        for k, m in enumerate(_split(int(n * share), ROWS_PER_FILE)):
+            path = d / f"bench_{k:04d}.csv"
+            pd.DataFrame({col: [next(gen) for _ in range(m)]}).to_csv(path, index=False)
+            files.append(path)
+    return files
+
+def write_pdfs(root, n, seed=13):
+    import fitz
+    root.mkdir(parents=True, exist_ok=True)
+    gen, files = sentences(n, seed, "pdf"), []
+    pages = -(-n // PDF_LINES)
+    for k, npages in enumerate(_split(pages, PDF_PAGES_PER_FILE)):
+        path = root / f"bench_{k:04d}.pdf"
+        doc = fitz.open()
+        for i in range(npages):
+            page = doc.new_page()
+            page.insert_text((40, 30), "ACME Bench SRS BX-0001 Rev 2", fontsize=8)
+            y = 30
+            for s in (x for _, x in zip(range(PDF_LINES), gen)):
+                y += 19
+                page.insert_text((40, y), s[:110], fontsize=7)
+            page.insert_text((40, 820), f"Company Confidential - Page {i + 1} of {npages}", fontsize=8)
+        doc.save(path); doc.close()
+        files.append(path)
+    return files
+
+def write_pool(path, n, seed=13):
+    """Pool-shaped Parquet table (labeler input), written in row groups."""
+    import sys
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src" / "data"))
+    import storage
+    gen = sentences(n, seed, "pool")
+    with storage.TableWriter(path) as w:
+        for k, m in enumerate(_split(n, storage.ROW_GROUP)):
+            texts = [next(gen) for _ in range(m)]
+            start = k * storage.ROW_GROUP
+            w.write(pd.DataFrame({"id": [f"BENCH_{start + i:09d}" for i in range(m)], "source": "PURE", "tier": "T1",
+                                  "sector": "general", "document": f"bench_{k:04d}.csv", "req_text": texts,
+                                  **{c: "" for c in ("ambig_presence", "ambig_type", "reg_clause", "severity", "notes")}}))
+    return [Path(path)]
+
+KINDS = {
+    "xml": lambda d, n, seed: write_xml(d / "raw" / "t1_pure", n, seed),
+    "html": lambda d, n, seed: write_html(d / "raw" / "t1_pure", n, seed),
+    "csv": lambda d, n, seed: write_csv_tiers(d / "raw", n, seed),
+    "pdf": lambda d, n, seed: write_pdfs(d / "downloads", n, seed),
+    "pool": lambda d, n, seed: write_pool(d / "pool.parquet", n, seed),
+}
+
+def ensure(root, kind, n, seed=13):
+    """Generate corpus `kind` under root/kind unless the same (n, seed) is already there; returns its files."""
+    d = Path(root) / kind; d.mkdir(parents=True, exist_ok=True)
+    stamp = d / ".corpus.json"
+    want = {"n": n, "seed": seed}
+    if stamp.exists() and json.loads(stamp.read_text()).get("params") == want:
+        files = [Path(f) for f in json.loads(stamp.read_text())["files"]]
+        if all(f.exists() for f in files):
+            return files
+    files = KINDS[kind](d, n, seed)
+    stamp.write_text(json.dumps({"params": want, "files": [str(f) for f in files]}))
+    return files
@@ -0,0 +1,135 @@
+"""
+Load test for tools/score_server.py with pool sentences.
+
+Usage:
+  python benchmarks/load_score_server.py [--spawn] [--url http://127.0.0.1:8765] [--concurrency 64]
+                                         [--duration 15] [--rate 400] [--unique] [--pool PATH]
+
+--spawn starts a server on a free port (extra server flags after "--", e.g.
+"-- --max-batch 128 --cache-size 0"). Each of --concurrency clients keeps one
+keep-alive connection and posts one sentence per request: back to back, or
+paced so that all clients together offer --rate requests/s. --unique makes
+every text distinct (suffix) to measure the uncached path. Prints achieved
+requests/s, client-side latency percentiles, errors and the server's /stats.
+"""
+import argparse, asyncio, json, socket, subprocess, sys, time
+from pathlib import Path
+from urllib.parse import urlparse
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+HERE = Path(__file__).resolve().parent
+POOL = ROOT / "data" / "processed" / "regulqa_ambig_pool.parquet"
+
+def load_sentences(pool=POOL, n=50_000):
+    sys.path.insert(0, str(ROOT / "src" / "data"))
+    import storage
+    if storage.resolve(pool) is not None:
+        texts = storage.read_table(pool, columns=["req_text"])["req_text"].astype(str).tolist()[:n]
+        if texts:
+            return texts
+    sys.path.insert(0, str(HERE))
+    import corpora
+    return list(corpora.sentences(n))
+
+async def _request(reader, writer, host, body):
+    writer.write((f"POST /score HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                  f"Content-Length: {len(body)}\r\n\r\n").encode("latin-1") + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    n = 0
+    while True:
+        h = await reader.readline()
+        if h in (b"\r\n", b""):
+            break
+        k, _, v = h.decode("latin-1").partition(":")
+        if k.lower() == "content-length":
+            n = int(v)
+    await reader.readexactly(n)
+    return status
+
+async def _client(k, host, port, texts, deadline, interval, unique, lat, errors):
+    reader, writer = await asyncio.open_connection(host, port)
+    i, nxt = k, time.monotonic()
+    try:
+        while time.monotonic() < deadline:
+            if interval:
+                nxt += interval
+                await asyncio.sleep(max(0, nxt - time.monotonic()))
+            text = texts[i % len(texts)] + (f" [{k}-{i}]" if unique else "")
+            i += 1
+            t = time.perf_counter()
+            try:
+                status = await _request(reader, writer, host, json.dumps({"text": text}).encode("utf-8"))
+            except (ConnectionError, asyncio.IncompleteReadError):
+                errors.append("conn"); reader, writer = await asyncio.open_connection(host, port); continue
+            if status == 200:
+                lat.append(time.perf_counter() - t)
+            else:
+                errors.append(status)
+    finally:
+        writer.close()
+
+def _get(host, port, path):
+    import urllib.request
+    with urllib.request.urlopen(f"http://{host}:{port}{path}", timeout=10) as r:
+        return json.loads(r.read())
+
+async def run(host, port, texts, concurrency=64, duration=15.0, rate=0.0, unique=False):
+    lat, errors = [], []
+    deadline = time.monotonic() + duration
+    interval = concurrency / rate if rate else 0.0
+    t0 = time.perf_counter()
+    await asyncio.gather(*(_client(k, host, port, texts, deadline, interval, unique, lat, errors)
+                           for k in range(concurrency)))
+    wall = time.perf_counter() - t0
+    ms = np.array(lat) * 1000 if lat else np.zeros(1)
+    return {"requests": len(lat), "errors": len(errors), "seconds": round(wall, 2),
+            "requests_per_s": round(len(lat) / wall, 1), **{f"latency_ms_p{p}": round(float(np.percentile(ms, p)), 2)
+                                                            for p in (50, 95, 99)}}
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def main(url=None, spawn=False, concurrency=64, duration=15.0, rate=0.0, unique=False, pool=POOL, server_args=()):
+    proc = None
+    if spawn:
+        host, port = "127.0.0.1", _free_port()
+        proc = subprocess.Popen([sys.executable, str(ROOT / "tools" / "score_server.py"), "--port", str(port),
+                                 *server_args])
+        for _ in range(100):
+            try:
+                _get(host, port, "/health"); break
+            except Exception:
+                time.sleep(0.1)
+    else:
+        u = urlparse(url or "http://127.0.0.1:8765")
+        host, port = u.hostname, u.port or 80
+    try:
+        texts = load_sentences(pool)
+        print(f"Load: {concurrency} clients, {duration:g} s, {'rate ' + str(rate) + '/s' if rate else 'closed loop'}, "
+              f"{len(texts)} sentences{' (unique)' if unique else ''}")
+        res = asyncio.run(run(host, port, texts, concurrency, duration, rate, unique))
+        print(json.dumps(res, indent=1))
+        print("server:", json.dumps(_get(host, port, "/stats"), indent=1))
+        return res
+    finally:
+        if proc is not None:
+            proc.terminate(); proc.wait()
+
+if __name__ == "__main__":
+    argv = sys.argv[1:]
+    extra = argv[argv.index("--") + 1:] if "--" in argv else []
+    argv = argv[:argv.index("--")] if "--" in argv else argv
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--url", default=None)
+    ap.add_argument("--spawn", action="store_true", help="Start tools/score_server.py on a free port")
+    ap.add_argument("--concurrency", type=int, default=64)
+    ap.add_argument("--duration", type=float, default=15.0)
+    ap.add_argument("--rate", type=float, default=0.0, help="Offered requests/s over all clients (0 = closed loop)")
+    ap.add_argument("--unique", action="store_true", help="Distinct texts (no cache hits)")
+    ap.add_argument("--pool", default=str(POOL))
+    args = ap.parse_args(argv)
+    main(args.url, args.spawn, args.concurrency, args.duration, args.rate, args.unique, args.pool, extra)
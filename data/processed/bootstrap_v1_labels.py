@@ -3,41 +3,38 @@ Bootstrap weak labels for RegulQA-Ambig dataset (Phase 1)
 
 
 Purpose:
-  - Load regulqa_ambig_pool_capped.csv
+  - Load regulqa_ambig_pool_capped (.parquet, or a legacy .csv)
   - Apply heuristic rules to auto-label 'ambig_presence', 'ambig_type', 'reg_clause', 'severity'
-  - Save a cleaned and labeled file regulqa_ambig_v1.csv
+  - Save a cleaned and labeled file regulqa_ambig_v11.parquet
+
+Importable engine:
+  label_batch(texts) -> DataFrame with the five label columns, one row per text.
+  Each sentence is tokenized once and all heuristic patterns plus the severity
+  terms are evaluated from that token set (see scan()); the columns are then
+  filled by looking up each distinct rule-hit combination.
+
+main() takes the rule hits of rows with an id from the per-rule cache
+(src/data/rule_cache.py), so after a pattern edit only that rule is re-run;
+`python src/data/rule_cache.py whatif ...` previews which rows an edit flips.
 """
 
-import re
+import hashlib, re, sys
+import numpy as np
 import pandas as pd
 from pathlib import Path
 
 
-INPUT_FILE = r"/Users/amarachi/Documents/AQA/Dataset_T1/RegulQA-Phase1/data/processed/regulqa_ambig_pool_capped.csv"
-OUTPUT_FILE = r"/Users/amarachi/Documents/AQA/Dataset_T1/RegulQA-Phase1/data/processed/regulqa_ambig_v11.csv"
-
-
-# 2. LOAD DATASET
-
-print("Loading dataset...")
-
-for enc in ("utf-8", "utf-8-sig", "latin1"):
-    try:
-        df = pd.read_csv(INPUT_FILE, encoding=enc)
-        break
-    except Exception as e:
-        last_err = e
+HERE = Path(__file__).resolve().parent
+INPUT_FILE = HERE / "regulqa_ambig_pool_capped.parquet"
+OUTPUT_FILE = HERE / "regulqa_ambig_v11.parquet"
 
-if df is None:
-    raise RuntimeError(f"❌ Failed to read {INPUT_FILE}: {last_err}")
+sys.path.insert(0, str(HERE.parents[1] / "src" / "data"))
+import metrics, storage, pool_profile, rule_cache
 
-print(f"✅ Loaded {df.shape[0]} rows and {df.shape[1]} columns.")
+LABEL_COLS = ["ambig_presence", "ambig_type", "reg_clause", "severity", "notes"]
 
-if "req_text" not in df.columns:
-    raise ValueError(f"❌ 'req_text' column missing. Found: {list(df.columns)}")
 
-
-# 3. DEFINE HEURISTICS AND CLAUSE MAPPING
+# 1. DEFINE HEURISTICS AND CLAUSE MAPPING
 
 heuristics = {
     "vague_term": (r"\b(as soon as possible|as appropriate|as far as possible|as necessary|if feasible|"
@@ -51,6 +48,9 @@ heuristics = {
     "anaphora": (r"^(it|they|this|that)\b", "semantic"),
 }
 
+severity_terms = (r"\b(brake|emergency|shutdown|stop|hazard|fault|safety|alarm|ventilator|infusion|dose|"
+                  r"radiation|landing|autopilot|airbag)\b")
+
 compiled = {k: (re.compile(pat, re.IGNORECASE), typ) for k, (pat, typ) in heuristics.items()}
 
 clause_map = {
@@ -62,85 +62,257 @@ clause_map = {
     "anaphora": ["ISO 29148 §5.2.3"],
 }
 
+HIGH = "high_term"          # pseudo-rule for the severity terms
+RULES = list(heuristics) + [HIGH]
+
+# Token sets for the single-pass scanner (section 2), declared with the patterns above:
+#   digest   – pattern_digest() of the pattern the sets were written for
+#   words    – complete one-token matches (the token alone is a rule hit)
+#   triggers – first tokens of multi-token or ^-anchored matches (the rule's regex confirms)
+# Together they must cover every match of the pattern. Editing a pattern makes the
+# import fail until its sets and digest are updated; _check_plan() then also compares
+# the scan with re.search on sentences made of the tokens and the pattern's literals.
+scan_tokens = {
+    "vague_term": ("1306b8a2",
+                   {"sufficient", "adequate", "optimal", "userfriendly", "appropriate", "relevant", "quickly", "fast",
+                    "minimise", "minimize", "maximise", "maximize", "soon", "frequently", "periodically", "regularly",
+                    "robust", "reliable", "secure", "safe", "safely", "intuitive", "efficient", "effective"},
+                   {"as", "if", "user"}),
+    "comparative": ("5d4e6de3", {"better", "faster", "higher", "lower", "best", "worst", "least", "most",
+                                 "improve", "improved", "improvement"}, set()),
+    "modal_vague": ("97166695", {"should", "may", "could", "might"}, set()),
+    "passive": ("fecfe8e9", set(), {"shall", "must", "will", "to"}),
+    "unbounded": ("7dce9576", {"always", "never", "asap"}, set()),
+    "anaphora": ("081e1d26", set(), {"it", "they", "this", "that"}),
+    HIGH: ("60c483b2", {"brake", "emergency", "shutdown", "stop", "hazard", "fault", "safety", "alarm", "ventilator",
+                        "infusion", "dose", "radiation", "landing", "autopilot", "airbag"}, set()),
+}
 
-# 4. APPLY HEURISTICS
 
-ambig_presence, ambig_type, reg_clause, severity, notes = [], [], [], [], []
+# 2. SINGLE-PASS SCANNER
+#
+# Each sentence is tokenized once (lower-cased \w+ runs) and each rule is
+# decided from its scan_tokens: a word hit is a rule hit, a trigger hit runs
+# the rule's regex. A rule without token sets (an edited pattern, e.g. from
+# rule_cache.whatif) runs its regex on every sentence, and so do non-ASCII
+# sentences, so results equal re.search() per rule.
+
+_WORD = re.compile(r"\w+")
+_SAMPLES = ["The system shall be user friendly and respond as soon as possible.",
+            "It shall stop the pump if feasible; the user-friendly alarm must be adequate.",
+            "That value will be improved to be faster than before, as appropriate.",
+            "The ventilator should never exceed the dose.", "They may minimise the shutdown time.",
+            "The operator shall confirm each alarm within 2 s."]
+
+def _phrases(pattern, cap=256):
+    """Literal strings a rule pattern spells out, for _check_plan: alternatives, (groups), [classes] and ?/*/+
+    expanded, anchors dropped. Rough (character ranges give their ends), but needs no regex internals."""
+    def alts(p, i):
+        out, cur = [], [""]
+        while i < len(p) and p[i] != ")":
+            c = p[i]
+            if c == "|":
+                out += cur; cur = [""]; i += 1; continue
+            if c == "(":
+                opts, i = alts(p, i + 3 if p.startswith("?:", i + 1) else i + 1)
+                i += 1
+            elif c == "[":
+                j = p.index("]", i + 1)
+                opts, i = [x for x in p[i + 1:j] if x not in "-^\\"] or [""], j + 1
+            elif c == "\\":
+                opts, i = ([""] if p[i + 1] in "bBAZ" else [" " if p[i + 1] == "s" else p[i + 1]]), i + 2
+            elif c in "^$":
+                opts, i = [""], i + 1
+            else:
+                opts, i = [c], i + 1
+            if i < len(p) and p[i] in "?*+":
+                opts = opts + [""] if p[i] != "+" else opts
+                i += 1
+            cur = [a + b for a in cur for b in opts][:cap]
+        return out + cur, i
+    return alts(pattern, 0)[0]
+
+def pattern_digest(pattern):
+    return hashlib.blake2b(pattern.encode("utf-8"), digest_size=4).hexdigest()
+
+def _check_plan(plan):
+    """Raise ValueError if a rule's scan_tokens were written for another pattern or disagree with re.search
+    on sample sentences built from the sets and the pattern; returns the plan."""
+    for name, bit, words, triggers, rx in plan:
+        digest = scan_tokens.get(name, ("",))[0]
+        if digest != pattern_digest(rx.pattern):
+            raise ValueError(f"scan_tokens[{name!r}] was written for another pattern: update its words/triggers "
+                             f"for the edited pattern and set its digest to {pattern_digest(rx.pattern)!r}")
+        phrases = sorted(words | triggers) + _phrases(rx.pattern)
+        texts = _SAMPLES + [s for t in phrases
+                            for s in (f"{t} the unit", f"The unit {t}.", f"The unit {t} be ok", f"{t.upper()}-based")]
+        got = _scan(texts, [(name, 1, words, triggers, rx)]).astype(bool)
+        bad = [t for g, t in zip(got, texts) if g != (rx.search(t) is not None)]
+        if bad:
+            raise ValueError(f"scan_tokens[{name!r}] disagree with its pattern, e.g. on {bad[0]!r}")
+    return plan
+
+def compile_rules(rules=None, high=None):
+    """Scan plan: [(name, bit, words, triggers, compiled regex)], bit i = RULES[i].
+
+    Rules whose pattern is not the stock one (e.g. a rule_cache whatif edit) get no token
+    sets (words = triggers = None) and run their regex on every sentence.
+    """
+    rules = heuristics if rules is None else rules
+    stock = {**{name: pat for name, (pat, _) in heuristics.items()}, HIGH: severity_terms}
+    pats = [(name, pat) for name, (pat, _) in rules.items()] + [(HIGH, severity_terms if high is None else high)]
+    plan = []
+    for i, (name, pat) in enumerate(pats):
+        words, triggers = scan_tokens.get(name, (None, None, None))[1:] if pat == stock.get(name) else (None, None)
+        plan.append((name, 1 << i, None if words is None else frozenset(words),
+                     None if triggers is None else frozenset(triggers), re.compile(pat, re.IGNORECASE)))
+    return plan
+
+def scan(texts, plan=None):
+    """Rule-hit bitmask per text (bit i = RULES[i]) as a uint16 array."""
+    plan = PLAN if plan is None else plan
+    if metrics.enabled():
+        return _scan_timed(texts, plan)
+    return _scan(texts, plan)
+
+def _scan(texts, plan):
+    out = np.zeros(len(texts), dtype=np.uint16)
+    findall = _WORD.findall
+    for i, txt in enumerate(texts):
+        m = 0
+        if txt.isascii():
+            toks = set(findall(txt.lower()))
+            for _, bit, words, triggers, rx in plan:
+                if words is None:
+                    if rx.search(txt): m |= bit
+                elif not words.isdisjoint(toks) or (not triggers.isdisjoint(toks) and rx.search(txt)):
+                    m |= bit
+        else:
+            for _, bit, _, _, rx in plan:
+                if rx.search(txt): m |= bit
+        out[i] = m
+    return out
 
-for txt in df["req_text"].astype(str):
-    flags, types, matched_clauses, local_notes = [], set(), set(), []
+PLAN = _check_plan(compile_rules())        # checked at import; whatif plans differ only in edited (regex-only) rules
 
-    for name, (pat, typ) in compiled.items():
-        if pat.search(txt):
-            flags.append(name)
-            types.add(typ)
-            for c in clause_map.get(name, []):
-                matched_clauses.add(c)
-            local_notes.append(name)
+def _scan_timed(texts, plan):
+    """scan() with per-rule regex telemetry and hit counters (metrics enabled)."""
+    timed = [(name, bit, words, triggers, metrics.pattern(f"label.{name}", rx)) for name, bit, words, triggers, rx in plan]
+    with metrics.span("label.scan") as sp:
+        out = _scan(texts, timed)
+        sp.add(sentences=len(texts), bytes=sum(map(len, texts)))
+    for name, n in hit_counts(out).items():
+        metrics.count("label.hits", n, rule=name)
+    return out
 
-    # Label assignment
-    if flags:
-        ambig_presence.append("ambiguous")
-        ambig_type.append(";".join(sorted(types)))
-        reg_clause.append("; ".join(sorted(matched_clauses)))
+def _labels_for(mask, rules=None):
+    """(ambig_presence, ambig_type, reg_clause, severity, notes) for one bitmask."""
+    rules = heuristics if rules is None else rules
+    flags = [name for i, name in enumerate(rules) if mask >> i & 1]
+    has_high_term = bool(mask >> len(rules) & 1)
+    if not flags:
+        return ("clear", "", "", "", "")
+    types = sorted({rules[f][1] for f in flags})
+    clauses = sorted({c for f in flags for c in clause_map.get(f, [])})
+    if any(f in ("vague_term", "unbounded", "modal_vague") for f in flags) and has_high_term:
+        sev = "high"
+    elif "passive" in flags and not has_high_term:
+        sev = "low"
     else:
-        ambig_presence.append("clear")
-        ambig_type.append("")
-        reg_clause.append("")
-
-    # Severity logic
-    has_high_term = bool(re.search(
-        r"\b(brake|emergency|shutdown|stop|hazard|fault|safety|alarm|ventilator|infusion|dose|radiation|landing|autopilot|airbag)\b",
-        txt, re.IGNORECASE
-    ))
-
-    if flags:
-        if any(f in ("vague_term", "unbounded", "modal_vague") for f in flags) and has_high_term:
-            sev = "high"
-        elif "passive" in flags and not has_high_term:
-            sev = "low"
-        else:
-            sev = "medium"
-    else:
-        sev = ""
-    severity.append(sev)
-    notes.append(", ".join(local_notes))
+        sev = "medium"
+    return ("ambiguous", ";".join(types), "; ".join(clauses), sev, ", ".join(flags))
+
+def labels_from_masks(masks, rules=None):
+    """Expand bitmasks to the label columns (one lookup per distinct mask)."""
+    masks = np.asarray(masks)
+    uniq, inv = np.unique(masks, return_inverse=True)
+    table = np.array([_labels_for(int(m), rules) for m in uniq], dtype=object).reshape(len(uniq), len(LABEL_COLS))
+    return pd.DataFrame({c: table[inv, j] for j, c in enumerate(LABEL_COLS)})
+
+def label_batch(texts):
+    """Weak labels for a batch of sentences → DataFrame[LABEL_COLS] aligned to `texts`."""
+    index = texts.index if isinstance(texts, pd.Series) else None
+    texts = [str(t) for t in texts]
+    out = labels_from_masks(scan(texts))
+    if index is not None:
+        out.index = index
+    return out
+
+def hit_counts(masks):
+    """Rows hit per rule for a mask array."""
+    masks = np.asarray(masks)
+    return {name: int(((masks >> i) & 1).sum()) for i, name in enumerate(RULES)}
 
 # Attach columns (don’t overwrite if filled)
-def prefer_new(old_series, new_list):
+def prefer_new(old_series, new_values):
     if old_series is None:
-        return new_list
-    out = []
-    for old, new in zip(old_series, new_list):
-        if pd.isna(old) or str(old).strip() == "":
-            out.append(new)
-        else:
-            out.append(old)
-    return out
+        return new_values
+    old = pd.Series(old_series).reset_index(drop=True).astype(object)
+    new = pd.Series(new_values).reset_index(drop=True)
+    filled = old.notna() & old.astype(str).str.strip().ne("")
+    return old.where(filled, new).tolist()
+
+def apply_labels(df, labels=None):
+    """Fill empty label columns of df from label_batch(df['req_text'])."""
+    labels = label_batch(df["req_text"].astype(str)) if labels is None else labels
+    for col in LABEL_COLS:
+        df[col] = prefer_new(df[col] if col in df.columns else None, labels[col].tolist())
+    return df
+
+
+# 3. LOAD DATASET
+
+def load(path=INPUT_FILE):
+    found = storage.resolve(path)
+    if found is None:
+        raise RuntimeError(f"❌ Failed to read {path}: no .parquet or .csv found")
+    df, last_err = None, None
+    if found.suffix == ".parquet":
+        df = storage.read_table(found)
+    else:
+        for enc in ("utf-8", "utf-8-sig", "latin1"):
+            try:
+                df = pd.read_csv(found, encoding=enc)
+                break
+            except Exception as e:
+                last_err = e
+
+    if df is None:
+        raise RuntimeError(f"❌ Failed to read {path}: {last_err}")
+
+    print(f"✅ Loaded {df.shape[0]} rows and {df.shape[1]} columns.")
+
+    if "req_text" not in df.columns:
+        raise ValueError(f"❌ 'req_text' column missing. Found: {list(df.columns)}")
+    return df
+
 
-for col, new_vals in {
-    "ambig_presence": ambig_presence,
-    "ambig_type": ambig_type,
-    "reg_clause": reg_clause,
-    "severity": severity,
-    "notes": notes
-}.items():
-    df[col] = prefer_new(df[col] if col in df.columns else [None]*len(new_vals), new_vals)
+def main(input_file=INPUT_FILE, output_file=OUTPUT_FILE):
+    print("Loading dataset...")
+    df = load(input_file)
 
+    # 4. APPLY HEURISTICS (cached per rule and row id)
+    texts = df["req_text"].astype(str).tolist()
+    masks = rule_cache.RuleCache().masks(df["id"], texts) if "id" in df.columns else scan(texts)
+    apply_labels(df, labels_from_masks(masks))
 
-# 5. QUALITY SUMMARY
-print("\n=== QUALITY SUMMARY ===")
-print("Total rows:", len(df))
-print("\nambig_presence distribution:\n", df["ambig_presence"].value_counts())
-print("\nTop ambig_type (ambiguous only):\n",
-      df.loc[df["ambig_presence"] == "ambiguous", "ambig_type"].value_counts().head(10))
-print("\nDuplicate req_text entries:", df.duplicated(subset=["req_text"]).sum())
+    # 5. QUALITY SUMMARY (one pass over all columns, see src/data/pool_profile.py)
+    print("\n=== QUALITY SUMMARY ===")
+    print(pool_profile.format_report(pool_profile.Profile().update(df, masks).report()))
+    print("\nDuplicate req_text entries:", df.duplicated(subset=["req_text"]).sum())
 
+    # 6. SAVE FINAL LABELED DATA
+    storage.write_table(df, output_file)
 
-# 6. SAVE FINAL LABELED DATA
+    print(f"\n✅ Labeled dataset written to:\n{output_file}")
+    print("You can now proceed to Phase 2: Pre-processing & Feature Extraction.")
+    return df
 
-Path(OUTPUT_FILE).parent.mkdir(parents=True, exist_ok=True)
-df.to_csv(OUTPUT_FILE, index=False, encoding="utf-8")
 
-print(f"\n✅ Labeled dataset written to:\n{OUTPUT_FILE}")
-print("You can now proceed to Phase 2: Pre-processing & Feature Extraction.")
\ No newline at end of file
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--input", default=str(INPUT_FILE))
+    ap.add_argument("--output", default=str(OUTPUT_FILE))
+    args = ap.parse_args()
+    main(args.input, args.output)
@@ -0,0 +1,187 @@
+"""
+Stratified, capped annotation batch from the unified pool → regulqa_ambig_pool_capped.parquet.
+
+Usage:
+  python src/data/cap_pool.py [--size 2500] [--per-document 150] [--strata tier,source,sector]
+                              [--label-ratio ambiguous=0.5,clear=0.5] [--by-label] [--seed 13]
+
+One streaming pass over the pool (storage.iter_batches). Every row gets a
+pseudo-random key from blake2b(seed, id), so the sample doesn't depend on row
+order and stays largely stable as the pool grows. Each stratum has one
+reservoir holding its `size` smallest-key rows, with at most `per_document`
+from any one document (per-document heaps; a document at its cap swaps out
+its largest key), so memory is bounded by size × strata, not by the pool or
+the number of documents. At the end `size` rows are allocated to the strata
+in proportion to what they hold, and each stratum contributes its
+smallest-key rows, still keeping the document cap across strata.
+
+--label-ratio adds the weak label (the pool's ambig_presence if filled, else
+bootstrap_v1_labels) to the strata and fixes the share of each label; if a
+label can't fill its share the batch shrinks so the ratio still holds.
+--by-label stratifies on the label without fixing ratios.
+"""
+from pathlib import Path
+from collections import Counter
+import hashlib, heapq, sys
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import rule_cache, storage
+
+ROOT = Path(__file__).resolve().parents[2]
+PROCESSED = ROOT / "data" / "processed"
+POOL = PROCESSED / "regulqa_ambig_pool.parquet"
+OUT = PROCESSED / "regulqa_ambig_pool_capped.parquet"
+
+STRATA = ["tier", "source", "sector"]
+LABEL = "ambig_presence"
+
+def row_key(seed, rid):
+    return int.from_bytes(hashlib.blake2b(f"{seed}:{rid}".encode("utf-8"), digest_size=8).digest(), "big")
+
+def _weak_labels(df):
+    """ambig_presence per row: the pool's value when filled, else the weak labeler's."""
+    have = df[LABEL].astype(object).fillna("").astype(str).str.strip() if LABEL in df.columns else pd.Series("", index=df.index)
+    todo = have.eq("")
+    if todo.any():
+        have = have.copy()
+        have[todo] = rule_cache.labeler().label_batch(df.loc[todo, "req_text"].astype(str))[LABEL].values
+    return have
+
+class _Reservoir:
+    """The `size` smallest-key rows offered so far, at most `per_doc` from any one document."""
+    def __init__(self, size, per_doc=None):
+        self.size, self.per_doc = size, per_doc
+        self.rows = {}          # seq → (key, doc, row)
+        self.heap = []          # max-heap (-key, seq); rows swapped out by a document cap linger until popped
+        self.docs = {}          # document → max-heap (-key, seq) of its held rows
+
+    def _top(self):
+        while self.heap[0][1] not in self.rows:
+            heapq.heappop(self.heap)
+        return self.heap[0]
+
+    def _hold(self, k, seq, doc, row):
+        self.rows[seq] = (k, doc, row)
+        heapq.heappush(self.heap, (-k, seq))
+        if len(self.heap) > 2 * self.size + 64:
+            self.heap = [(-key, s) for s, (key, _, _) in self.rows.items()]
+            heapq.heapify(self.heap)
+
+    def offer(self, k, seq, doc, row):
+        d = self.docs.get(doc) if self.per_doc else None
+        if d is not None and len(d) >= self.per_doc:
+            if k < -d[0][0]:                                # same count, smaller key: swap within the document
+                del self.rows[heapq.heapreplace(d, (-k, seq))[1]]
+                self._hold(k, seq, doc, row)
+            return
+        if len(self.rows) >= self.size and (not self.rows or k >= -self._top()[0]):
+            return
+        self._hold(k, seq, doc, row)
+        if self.per_doc:
+            heapq.heappush(self.docs.setdefault(doc, []), (-k, seq))
+        if len(self.rows) > self.size:                      # the largest key overall is also its document's largest
+            _, old = self._top()
+            heapq.heappop(self.heap)
+            _, odoc, _ = self.rows.pop(old)
+            if self.per_doc:
+                heapq.heappop(self.docs[odoc])
+                if not self.docs[odoc]:
+                    del self.docs[odoc]
+
+    def items(self):
+        return [(k, seq, doc, row) for seq, (k, doc, row) in self.rows.items()]
+
+def allocate(total, avail):
+    """Split `total` over keys in proportion to avail[key], never above avail (largest remainder, water-filling)."""
+    alloc = {k: 0 for k in avail}
+    left, open_ = min(total, sum(avail.values())), [k for k in avail if avail[k] > 0]
+    while left > 0 and open_:
+        weight = sum(avail[k] - alloc[k] for k in open_)
+        share = {k: left * (avail[k] - alloc[k]) / weight for k in open_}
+        base = {k: min(int(share[k]), avail[k] - alloc[k]) for k in open_}
+        given = sum(base.values())
+        for k in sorted(open_, key=lambda k: (-(share[k] - int(share[k])), str(k)))[:left - given]:
+            if base[k] < avail[k] - alloc[k]:
+                base[k] += 1
+        for k in open_:
+            alloc[k] += base[k]
+        left -= sum(base.values())
+        open_ = [k for k in open_ if alloc[k] < avail[k]]
+        if not sum(base.values()):
+            break
+    return alloc
+
+def _parse_ratio(spec):
+    if not spec:
+        return None
+    if isinstance(spec, dict):
+        ratio = {str(k): float(v) for k, v in spec.items()}
+    else:
+        ratio = {k.strip(): float(v) for k, v in (p.split("=") for p in spec.split(","))}
+    s = sum(ratio.values())
+    return {k: v / s for k, v in ratio.items()}
+
+def cap_pool(pool=POOL, out=OUT, size=2500, per_document=None, strata=STRATA, label_ratio=None,
+             by_label=False, seed=13, batch_size=100_000):
+    ratio = _parse_ratio(label_ratio)
+    use_label = bool(ratio) or by_label
+    res, cols, seq = {}, None, 0           # stratum → _Reservoir
+    for df in storage.iter_batches(pool, batch_size=batch_size):
+        df = df.reset_index(drop=True)
+        cols = cols or list(df.columns)
+        keys_s = [tuple(x) for x in df[list(strata)].astype(object).fillna("").astype(str).itertuples(index=False)]
+        labels = list(_weak_labels(df)) if use_label else [None] * len(df)
+        docs = df["document"].astype(str) if per_document else [None] * len(df)
+        rows = df.itertuples(index=False, name=None)
+        for rid, sk, lab, doc, row in zip(df["id"].astype(str), keys_s, labels, docs, rows):
+            stratum = sk + ((lab,) if use_label else ())
+            r = res.get(stratum)
+            if r is None:
+                r = res[stratum] = _Reservoir(size, per_document)
+            r.offer(row_key(seed, rid), seq, doc, row)
+            seq += 1
+    if cols is None:
+        print("Pool is empty:", pool)
+        return None
+
+    by_stratum = {s: r.items() for s, r in res.items() if r.rows}
+    avail = {s: len(v) for s, v in by_stratum.items()}
+    if ratio:
+        lab_avail = {l: sum(n for s, n in avail.items() if s[-1] == l) for l in ratio}
+        feasible = min([size] + [lab_avail[l] / r for l, r in ratio.items() if r > 0])
+        if feasible < size:
+            print(f"[warn] label ratio {ratio} limits the batch to {int(feasible)} rows (available: {lab_avail})")
+        targets = {}
+        for l, n_l in allocate(int(feasible), {l: int(round(feasible * r)) for l, r in ratio.items()}).items():
+            targets.update(allocate(n_l, {s: n for s, n in avail.items() if s[-1] == l}))
+    else:
+        targets = allocate(size, avail)
+
+    picked, left, per_doc = [], dict(targets), Counter()
+    for k, sq, doc, row, s in sorted((t + (s,) for s, items in by_stratum.items() for t in items),
+                                     key=lambda t: t[0]):                # smallest keys first
+        if left.get(s, 0) > 0 and (not per_document or per_doc[doc] < per_document):
+            picked.append((sq, row)); left[s] -= 1; per_doc[doc] += 1
+    picked.sort(key=lambda t: t[0])                                     # pool order
+    sample = pd.DataFrame([row for _, row in picked], columns=cols)
+    storage.write_table(sample, out)
+    print("Wrote", out, "rows:", len(sample), "from strata:", len(by_stratum), "held:", sum(avail.values()))
+    if use_label:
+        print(_weak_labels(sample).value_counts().to_string())
+    return sample
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pool", default=str(POOL))
+    ap.add_argument("--out", default=str(OUT))
+    ap.add_argument("--size", type=int, default=2500)
+    ap.add_argument("--per-document", type=int, default=None, help="Max rows from any one document")
+    ap.add_argument("--strata", default=",".join(STRATA))
+    ap.add_argument("--label-ratio", default=None, help="e.g. ambiguous=0.5,clear=0.5 (weak labels)")
+    ap.add_argument("--by-label", action="store_true", help="Stratify on the weak label too")
+    ap.add_argument("--seed", type=int, default=13)
+    args = ap.parse_args()
+    cap_pool(args.pool, args.out, args.size, args.per_document, args.strata.split(","), args.label_ratio,
+             args.by_label, args.seed)
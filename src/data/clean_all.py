@@ -1,24 +1,34 @@
 """
 Normalize & unify T1/T2/T3 into an annotation-ready pool with sector inference.
+
+The pool is written as Parquet (data/processed/regulqa_ambig_pool.parquet, see
+storage.py); pass fmt="csv" / --fmt csv for a CSV pool, or use
+storage.export_csv() to produce the Label Studio import file.
+
+Row ids are content-addressed (<PREFIX>_<12 hex of blake2b(req_text)>) and
+kept in a collision-checked registry next to the pool
+(regulqa_ambig_pool_ids.sqlite), so a rebuild never renumbers existing rows.
+Each build carries labels of the previous pool over by id and writes the rows
+seen for the first time to regulqa_ambig_pool_new.parquet, which is all that
+has to be imported into Label Studio; merge_labels() folds an annotation export
+back into the pool by id.
 """
 from pathlib import Path
-import pandas as pd, re, yaml
+import sys
+import pandas as pd, re, yaml, hashlib
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import storage, metrics, readers
+from sectors import SECTOR_HINTS, SECTOR_PATTERNS
 
 ROOT = Path(__file__).resolve().parents[2]
 RAW = ROOT / "data" / "raw"
 INTERIM = ROOT / "data" / "interim"
 PROCESSED = ROOT / "data" / "processed"
 INTERIM.mkdir(parents=True, exist_ok=True); PROCESSED.mkdir(parents=True, exist_ok=True)
-
-SECTOR_HINTS = {
-    "automotive": ["automotive","vehicle","car","iso 26262","ecu","autonomous"],
-    "medical": ["medical","health","patient","device","iec 62304","hl7","fhir"],
-    "aerospace": ["aerospace","space","nasa","avionics","do-178c","aircraft"],
-    "rail": ["rail","train","signaling","ertms"],
-    "finance": ["bank","finance","trading","payment","pci"],
-    "defense": ["defense","military","weapon"],
-    "energy": ["grid","energy","power plant","scada"],
-}
+POOL = PROCESSED / "regulqa_ambig_pool.parquet"
+DELTA = PROCESSED / "regulqa_ambig_pool_new.parquet"
+REGISTRY = PROCESSED / "regulqa_ambig_pool_ids.sqlite"
 
 def _normalize_text(s: str) -> str:
     s = re.sub(r"\s+", " ", (s or "").strip())
@@ -33,70 +43,348 @@ def _infer_sector(row, overrides):
     if row.get("source") == "NASA_TRICK_SRS":
         return "aerospace"
     s = (str(row.get("document","")) + " " + str(row.get("req_text",""))).lower()
-    for sector, keys in SECTOR_HINTS.items():
-        if any(k in s for k in keys):
+    for sector, pat in SECTOR_PATTERNS.items():
+        if pat.search(s):
             return sector
     return "general"
 
-def _read_any_csv(path):
-    try:
-        return pd.read_csv(path)
-    except Exception:
-        try:
-            return pd.read_csv(path, sep=None, engine="python")
-        except Exception:
-            return None
+def infer_sectors(df, overrides=None):
+    """Column-wise _infer_sector: returns DataFrame(sector, sector_hint) aligned to df.
+
+    sector_hint is the keyword that fired, "override" or "source" (empty for general).
+    Each sector pattern runs once over the rows still unassigned, in SECTOR_HINTS order.
+    """
+    doc = df["document"].astype(str)
+    text = (doc + " " + df["req_text"].astype(str)).str.lower()
+    sector = pd.Series("general", index=df.index, dtype=object)
+    hint = pd.Series("", index=df.index, dtype=object)
+    todo = pd.Series(True, index=df.index)
+    if overrides:
+        ov = doc.str.strip().map({str(k): str(v).strip() for k, v in overrides.items()})
+        m = ov.notna()
+        sector[m] = ov[m]; hint[m] = "override"; todo &= ~m
+    m = todo & (df["source"] == "NASA_TRICK_SRS")
+    sector[m] = "aerospace"; hint[m] = "source"; todo &= ~m
+    for name, pat in SECTOR_PATTERNS.items():
+        if not todo.any(): break
+        hit = text[todo].str.extract(pat, expand=False).dropna()
+        sector[hit.index] = name; hint[hit.index] = hit; todo[hit.index] = False
+    return pd.DataFrame({"sector": sector, "sector_hint": hint})
+
+def _write_hint_counts(counts):
+    """Which keyword assigned how many rows to each sector → data/interim/sector_hint_counts.csv."""
+    if counts is None or counts.empty: return
+    counts = counts.groupby(["sector","sector_hint"]).sum().sort_values(ascending=False)
+    counts.rename("rows").reset_index().to_csv(INTERIM / "sector_hint_counts.csv", index=False)
+
+TIERS = [("t1_pure","PURE"),("t1_promise_exp","PROMISE_EXP"),("t1_nasa_srs","NASA_TRICK_SRS"),
+         ("t2_synthetic","SYNTHETIC"),("t3_domain","DOMAIN")]
+ID_PREFIX = {"PURE":"PURE","PROMISE_EXP":"PROM","NASA_TRICK_SRS":"NASA","SYNTHETIC":"SYN","DOMAIN":"DOM"}
+ANNOT_COLS = ["ambig_presence","ambig_type","reg_clause","severity","notes"]
+POOL_COLS = ["id","source","tier","sector","document","req_text"] + ANNOT_COLS
+
+def _iter_sources():
+    """(file, source, tier) for every raw file with a reader (readers.READERS: CSV, XLSX, ARFF), in pool order."""
+    for folder, source in TIERS:
+        tier = "T1" if folder.startswith("t1_") else ("T2" if folder.startswith("t2_") else "T3")
+        for f in (RAW/folder).rglob("*"):
+            if f.suffix.lower() in readers.READERS and f.is_file():
+                yield f, source, tier
+
+def _load_overrides():
+    ov_path = ROOT / "config" / "sector_overrides.yaml"
+    return (yaml.safe_load(ov_path.read_text()) or {}) if ov_path.exists() else {}
+
+ID_HEX = 12
+
+class IdRegistry:
+    """Persistent text → id map (SQLite) with collision-checked content-addressed ids.
+
+    The key is a 128-bit blake2b of the normalized req_text (the pool's dedup
+    key), so an id never depends on row position or on which source won the
+    dedup. A new text gets <prefix>_<first ID_HEX hex digits of the key>; if that
+    id is already taken the digest is extended 4 hex digits at a time. Nothing
+    is persisted until commit().
+    """
+    def __init__(self, path=None):
+        import sqlite3
+        self.path = Path(path or REGISTRY); self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(self.path))
+        self.db.execute("CREATE TABLE IF NOT EXISTS ids (key BLOB PRIMARY KEY, id TEXT UNIQUE NOT NULL, source TEXT)")
+        self.db.execute("CREATE TEMP TABLE batch (key BLOB PRIMARY KEY)")
+        self.db.execute("CREATE TEMP TABLE cand (id TEXT PRIMARY KEY)")
+
+    @staticmethod
+    def key(text):
+        return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM ids").fetchone()[0]
+
+    def _taken(self, cur, ids):
+        cur.executemany("INSERT OR IGNORE INTO cand VALUES (?)", ((i,) for i in ids))
+        taken = {i for (i,) in cur.execute("SELECT id FROM cand JOIN ids USING (id)")}
+        cur.execute("DELETE FROM cand")
+        return taken
+
+    def assign(self, texts, sources):
+        """Ids for a batch of texts (sources pick the prefix) → (ids, is_new) lists."""
+        cur = self.db.cursor()
+        keys = [self.key(t) for t in texts]
+        cur.executemany("INSERT OR IGNORE INTO batch VALUES (?)", ((k,) for k in keys))
+        known = dict(cur.execute("SELECT key, id FROM batch JOIN ids USING (key)"))
+        cur.execute("DELETE FROM batch")
+        fresh = {}
+        for k, src in zip(keys, sources):
+            if k not in known and k not in fresh:
+                fresh[k] = (f"{ID_PREFIX.get(src,'UNK')}_", src)
+        if fresh:
+            first = {k: p + k.hex()[:ID_HEX] for k, (p, _) in fresh.items()}
+            taken = self._taken(cur, set(first.values()))
+            used, rows = set(), []
+            for k, (p, src) in fresh.items():
+                n, cand = ID_HEX, first[k]
+                while cand in used or cand in taken:
+                    n += 4; cand = p + k.hex()[:n]
+                    taken |= self._taken(cur, [cand])
+                used.add(cand); known[k] = cand; rows.append((k, cand, src))
+            cur.executemany("INSERT INTO ids VALUES (?,?,?)", rows)
+        return [known[k] for k in keys], [k in fresh for k in keys]
+
+    def commit(self):
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+def _prior_labels(path=None, chunksize=storage.ROW_GROUP):
+    """Annotated rows (any non-empty ANNOT_COLS value) of the previous pool, indexed by id.
 
-def build_pool():
+    Only id + ANNOT_COLS are read, in batches, so memory follows the number of labelled rows.
+    """
+    path = path or POOL
+    have = storage.columns_of(path)
+    cols = [c for c in ANNOT_COLS if c in have]
+    if "id" not in have or not cols:
+        return None
+    keep = []
+    for chunk in storage.iter_batches(path, columns=["id"] + cols, batch_size=chunksize):
+        filled = chunk[cols].astype(object).fillna("").astype(str).apply(lambda c: c.str.strip().ne("")).any(axis=1)
+        if filled.any():
+            keep.append(chunk.loc[filled])
+    if not keep:
+        return pd.DataFrame(columns=["id"] + cols).set_index("id")
+    return pd.concat(keep, ignore_index=True).set_index("id")
+
+def merge_labels(df, labels, key="id", cols=ANNOT_COLS, overwrite=False):
+    """Fill df's annotation columns from `labels` (DataFrame or table path) matched on `key`.
+
+    Empty label values never overwrite; existing values are kept unless
+    overwrite=True. Returns (df, rows updated).
+    """
+    if labels is None:
+        return df, 0
+    if not isinstance(labels, pd.DataFrame):
+        labels = storage.read_table(labels)
+    lab = labels.reset_index() if key not in labels.columns and labels.index.name == key else labels
+    lab = lab.drop_duplicates(subset=[key], keep="last")
+    lab.index = lab[key].astype(str).values
+    ids = df[key].astype(str)
+    changed = pd.Series(False, index=df.index)
+    for c in cols:
+        if c not in lab.columns: continue
+        new = ids.map(lab[c].astype(object)).fillna("").astype(str)
+        old = df[c].astype(object).fillna("").astype(str) if c in df.columns else pd.Series("", index=df.index)
+        take = new.str.strip().ne("") & (old.str.strip().eq("") | overwrite) & new.ne(old)
+        df[c] = old.where(~take, new)
+        changed |= take
+    return df, int(changed.sum())
+
+def _write_delta(new_rows, out=DELTA):
+    """Rows first seen in this build → regulqa_ambig_pool_new (removed when there are none)."""
+    out = Path(out)
+    if new_rows is None or new_rows.empty:
+        if out.exists(): out.unlink()
+        return 0
+    storage.write_table(new_rows, out)
+    print("New rows:", len(new_rows), "→", out)
+    return len(new_rows)
+
+def _finish(df, overrides):
+    """Add sector + empty annotation columns; returns (pool-ordered frame, sector/hint counts)."""
+    sec = infer_sectors(df, overrides)
+    df["sector"] = sec["sector"]
+    for c in ANNOT_COLS:
+        df[c] = ""
+    return df[POOL_COLS], sec.value_counts()
+
+def build_pool(stream=False, chunksize=100_000, fmt="parquet"):
+    if stream:
+        return build_pool_streaming(chunksize, fmt)
+    with metrics.span("build_pool", mode="memory") as sp:
+        df = _build_pool(fmt)
+        sp.add(sentences=0 if df is None else len(df))
+    return df
+
+def _build_pool(fmt):
     frames = []
     # Load sector overrides if provided
-    ov_path = ROOT / "config" / "sector_overrides.yaml"
-    overrides = yaml.safe_load(ov_path.read_text()) if ov_path.exists() else {}
-
-    # T1: PURE, PROMISE, NASA Trick
-    for folder, source in [("t1_pure","PURE"),("t1_promise_exp","PROMISE_EXP"),("t1_nasa_srs","NASA_TRICK_SRS"),
-                           ("t2_synthetic","SYNTHETIC"),("t3_domain","DOMAIN") ]:
-        for f in (RAW/folder).rglob("*.csv"):
-            df = _read_any_csv(f)
-            if df is None or df.empty: continue
-            # find text column
-            textcol = next((c for c in df.columns if c.lower() in {"text","sentence","req_text","requirement","requirements"}), None)
-            if textcol is None and "req_text" in df.columns: textcol = "req_text"
-            if not textcol: continue
+    overrides = _load_overrides()
+
+    # T1: PURE, PROMISE, NASA Trick; T2 synthetic; T3 domain
+    for f, source, tier in _iter_sources():
+        # text column found per file / sheet by the format reader
+        for document, texts in readers.iter_texts(f):
             tmp = pd.DataFrame({
                 "source": source,
-                "tier": "T1" if folder.startswith("t1_") else ("T2" if folder.startswith("t2_") else "T3"),
-                "document": f.name,
-                "req_text": df[textcol].astype(str).map(_normalize_text)
+                "tier": tier,
+                "document": document,
+                "req_text": texts.astype(str).map(_normalize_text).values
             })
             frames.append(tmp)
+            metrics.count("build_pool.rows_in", len(tmp), source=source)
 
     if not frames:
         print("No raw files found. Download or add T2/T3 first.")
         return None
 
     all_df = pd.concat(frames, ignore_index=True)
-    all_df = all_df[all_df["req_text"].str.len()>5].drop_duplicates(subset=["req_text"]).reset_index(drop=True)
-
-    # ids
-    def make_id(i,row):
-        prefix = {"PURE":"PURE","PROMISE_EXP":"PROM","NASA_TRICK_SRS":"NASA","SYNTHETIC":"SYN","DOMAIN":"DOM"}.get(row["source"],"UNK")
-        return f"{prefix}_{i:06d}"
-    all_df["id"] = [make_id(i,r) for i,r in enumerate(all_df.to_dict("records"))]
-
-    # sector
-    all_df["sector"] = [ _infer_sector(r, overrides) for r in all_df.to_dict("records") ]
-
-    # empty annotation cols
-    for c in ["ambig_presence","ambig_type","reg_clause","severity","notes"]:
-        all_df[c] = ""
-
-    cols = ["id","source","tier","sector","document","req_text","ambig_presence","ambig_type","reg_clause","severity","notes"]
-    all_df = all_df[cols]
-    out = PROCESSED / "regulqa_ambig_pool.csv"
-    all_df.to_csv(out, index=False)
-    print("Wrote", out, "rows:", len(all_df))
+    n_in = len(all_df)
+    all_df = all_df[all_df["req_text"].str.len()>5]
+    metrics.count("build_pool.dropped", n_in - len(all_df), reason="length")
+    n_in = len(all_df)
+    all_df = all_df.drop_duplicates(subset=["req_text"]).reset_index(drop=True)
+    metrics.count("build_pool.dropped", n_in - len(all_df), reason="dedup")
+
+    # ids (stable across rebuilds)
+    out = POOL.with_suffix("." + fmt)
+    prior = _prior_labels(out)
+    reg = IdRegistry()
+    try:
+        ids, is_new = reg.assign(all_df["req_text"].tolist(), all_df["source"].tolist())
+        all_df["id"] = ids
+        metrics.count("build_pool.new_ids", int(sum(is_new)))
+
+        # sector + annotation cols (labels of the previous pool carried over by id)
+        all_df, hints = _finish(all_df, overrides)
+        all_df, kept = merge_labels(all_df, prior)
+        _write_hint_counts(hints)
+        storage.write_table(all_df, out)
+        _write_delta(all_df[is_new], DELTA.with_suffix("." + fmt))
+        reg.commit()
+    finally:
+        reg.close()
+    print("Wrote", out, "rows:", len(all_df), "labels kept:", kept)
     return all_df
 
+class SeenSet:
+    """On-disk set of 64-bit text digests (SQLite), so dedup memory stays flat.
+
+    A 64-bit blake2b digest makes a false "duplicate" vanishingly unlikely
+    (~1e-5 at 10^7 distinct texts).
+    """
+    def __init__(self, path):
+        import sqlite3
+        self.path = Path(path)
+        if self.path.exists(): self.path.unlink()
+        self.db = sqlite3.connect(str(self.path))
+        self.db.execute("PRAGMA journal_mode=OFF"); self.db.execute("PRAGMA synchronous=OFF")
+        self.db.execute("CREATE TABLE seen (h INTEGER PRIMARY KEY)")
+        self.db.execute("CREATE TEMP TABLE batch (h INTEGER PRIMARY KEY)")
+
+    @staticmethod
+    def digest(s):
+        return int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big", signed=True)
+
+    def add_new(self, digests):
+        """Insert a batch of distinct digests; return the subset that was not seen before."""
+        cur = self.db.cursor()
+        cur.executemany("INSERT INTO batch VALUES (?)", ((h,) for h in digests))
+        old = {h for (h,) in cur.execute("SELECT h FROM batch JOIN seen USING (h)")}
+        cur.execute("INSERT OR IGNORE INTO seen SELECT h FROM batch")
+        cur.execute("DELETE FROM batch")
+        return [h for h in digests if h not in old]
+
+    def close(self):
+        self.db.close()
+        if self.path.exists(): self.path.unlink()
+
+def build_pool_streaming(chunksize=100_000, fmt="parquet"):
+    """Same pool as build_pool(), built chunk by chunk with bounded memory.
+
+    Rows are normalized, length-filtered and deduplicated (first occurrence wins)
+    against an on-disk digest set, get their id/sector as they flow through and
+    are appended to the output table.
+    """
+    with metrics.span("build_pool", mode="stream") as sp:
+        out = _build_pool_streaming(chunksize, fmt, sp)
+    return out
+
+def _build_pool_streaming(chunksize, fmt, sp):
+    overrides = _load_overrides()
+    out, delta = POOL.with_suffix("." + fmt), DELTA.with_suffix("." + fmt)
+    prior = _prior_labels(out, chunksize)
+    writer, new_writer = storage.TableWriter(out), storage.TableWriter(delta)
+    seen = SeenSet(INTERIM / "pool_seen.sqlite")
+    reg = IdRegistry()
+    n, kept, hints = 0, 0, []
+    try:
+        for f, source, tier in _iter_sources():
+            for document, texts in readers.iter_texts(f, chunksize):
+                txt = texts.astype(str).map(_normalize_text)
+                metrics.count("build_pool.rows_in", len(txt), source=source)
+                n_in = len(txt)
+                txt = txt[txt.str.len()>5]
+                metrics.count("build_pool.dropped", n_in - len(txt), reason="length")
+                n_in = len(txt)
+                txt = txt.drop_duplicates()
+                if txt.empty:
+                    metrics.count("build_pool.dropped", n_in, reason="dedup"); continue
+                hashes = [SeenSet.digest(t) for t in txt]
+                keep = set(seen.add_new(hashes))
+                txt = txt[[h in keep for h in hashes]]
+                metrics.count("build_pool.dropped", n_in - len(txt), reason="dedup")
+                if txt.empty: continue
+                tmp = pd.DataFrame({"source": source, "tier": tier, "document": document,
+                                    "req_text": txt.values})
+                tmp["id"], is_new = reg.assign(tmp["req_text"].tolist(), [source] * len(tmp))
+                tmp, h = _finish(tmp, overrides)
+                tmp, k = merge_labels(tmp, prior)
+                writer.write(tmp)
+                if any(is_new): new_writer.write(tmp[is_new])
+                metrics.count("build_pool.new_ids", int(sum(is_new)))
+                n += len(tmp); kept += k; hints.append(h)
+        sp.add(sentences=n)
+        writer.close(commit=n > 0)
+        if n == 0:
+            print("No raw files found. Download or add T2/T3 first.")
+            return None
+        new_writer.close(commit=new_writer.rows > 0)
+        if new_writer.rows:
+            print("New rows:", new_writer.rows, "→", delta)
+        elif delta.exists():
+            delta.unlink()
+        _write_hint_counts(pd.concat(hints))
+        reg.commit()
+    finally:
+        seen.close(); reg.close()
+        writer.close(commit=False); new_writer.close(commit=False)
+    print("Wrote", out, "rows:", n, "labels kept:", kept)
+    return out
+
 if __name__ == "__main__":
-    build_pool()
+    import argparse
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--stream", action="store_true", help="Chunked, constant-memory build")
+    ap.add_argument("--chunksize", type=int, default=100_000)
+    ap.add_argument("--fmt", choices=["parquet","csv"], default="parquet")
+    ap.add_argument("--merge-labels", metavar="PATH", help="Merge an annotation export into the pool by id and exit")
+    ap.add_argument("--overwrite", action="store_true", help="With --merge-labels: exported labels replace existing ones")
+    args = ap.parse_args()
+    if args.merge_labels:
+        pool = storage.read_table(POOL.with_suffix("." + args.fmt))
+        pool, k = merge_labels(pool, args.merge_labels, overwrite=args.overwrite)
+        storage.write_table(pool, storage.resolve(POOL.with_suffix("." + args.fmt)))
+        print("Merged labels into", k, "rows")
+    else:
+        build_pool(args.stream, args.chunksize, args.fmt)
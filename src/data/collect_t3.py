@@ -1,31 +1,35 @@
 """
 Helper to aggregate your manually collected T3 (public SRS/manuals) into CSV.
 Usage:
-- Drop any CSVs with a 'req_text' column into data/raw/t3_domain
+- Drop any CSV / XLSX / ARFF with a requirement text column (req_text, text,
+  sentence, ...; see readers.TEXT_COLS) into data/raw/t3_domain
 - Or run this to combine small text lists into a single CSV
 """
 from pathlib import Path
+import sys
 import pandas as pd
 
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import storage, readers
+
 ROOT = Path(__file__).resolve().parents[2]
 T3 = ROOT / "data" / "raw" / "t3_domain"
 OUT = T3 / "domain_collected.csv"
 
-def collect():
-    frames = []
-    for f in T3.rglob("*.csv"):
-        try:
-            df = pd.read_csv(f)
-            if "req_text" in df.columns:
-                frames.append(df[["req_text"]].assign(document=f.name))
-        except Exception:
-            pass
-    if frames:
-        all_df = pd.concat(frames, ignore_index=True)
-        all_df.to_csv(OUT, index=False)
-        print("Collected →", OUT, "rows:", len(all_df))
+def collect(chunksize=100_000):
+    with storage.TableWriter(OUT) as w:
+        for f in sorted(T3.rglob("*")):
+            if f == OUT or f.suffix.lower() not in readers.READERS or not f.is_file():
+                continue
+            try:
+                for document, texts in readers.iter_texts(f, chunksize):
+                    w.write(pd.DataFrame({"req_text": texts.values, "document": document}))
+            except Exception as e:
+                print("Skipped:", f.name, "reason:", e)
+    if w.rows:
+        print("Collected →", OUT, "rows:", w.rows)
     else:
-        print("No CSVs with 'req_text' found in", T3)
+        print("No files with a text column found in", T3)
 
 if __name__ == "__main__":
     collect()
@@ -3,8 +3,10 @@ convert_t1_html_xml.py
 Convert any HTML/XML files found under data/raw/t1_* into CSVs with a 'req_text' column.
 """
 from pathlib import Path
-from bs4 import BeautifulSoup
-import pandas as pd, re, xml.etree.ElementTree as ET
+import pandas as pd, re, sys, xml.etree.ElementTree as ET
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import html_extract, metrics
 
 ROOT = Path(__file__).resolve().parents[2]
 RAW = ROOT / "data" / "raw"
@@ -14,43 +16,127 @@ def _normalize(s: str) -> str:
     import re
     return re.sub(r"\s+", " ", (s or "").strip())
 
+def _select(texts, min_len=6):
+    """Distinct texts (first occurrence) of at least min_len chars that match REQ_PAT."""
+    if not metrics.enabled():
+        return [t for t in dict.fromkeys(texts) if len(t) >= min_len and REQ_PAT.search(t)]
+    texts = list(texts)
+    uniq, pat = list(dict.fromkeys(texts)), metrics.pattern("convert.REQ_PAT", REQ_PAT)
+    short = [t for t in uniq if len(t) < min_len]
+    out = [t for t in uniq if len(t) >= min_len and pat.search(t)]
+    metrics.count("convert.sentences", len(texts))
+    metrics.count("convert.dropped", len(texts) - len(uniq), reason="dedup")
+    metrics.count("convert.dropped", len(short), reason="length")
+    metrics.count("convert.dropped", len(uniq) - len(short) - len(out), reason="REQ_PAT")
+    return out
+
 def _extract_from_html(path: Path):
-    html = path.read_text(encoding="utf-8", errors="ignore")
-    soup = BeautifulSoup(html, "lxml")
-    cands = []
-    for sel in ["li", "p", "dd"]:
-        for el in soup.select(sel):
-            t = _normalize(el.get_text(" ", strip=True))
-            if len(t) > 5 and REQ_PAT.search(t):
-                cands.append(t)
-    cands = list(dict.fromkeys(cands))
+    cands = _select(html_extract.iter_blocks(path, ("li", "p", "dd")))
     if not cands: 
         return None
     out = path.with_suffix(".csv")
     pd.DataFrame({"document":[path.name]*len(cands),"req_text":cands}).to_csv(out, index=False)
     return out
 
+# PURE block elements hold text; a tag naming a requirement/spec (e.g. <requirement>) is a block too,
+# but may also be a container (PURE's <req_document>, <specs>), so its children keep their own rows
+PURE_BLOCKS = {"req", "text_body", "item", "p", "title"}
+
+def _block_kind(tag):
+    if tag in PURE_BLOCKS:
+        return "text"
+    return "named" if "req" in tag or "spec" in tag else None
+
+def _own_row(pending, tail):
+    """Settle a closed non-block element (tag, text, leaf, text before it) once its tail is known:
+    (tag, text) if it stands alone (a leaf or a REQ_PAT match, not inline in mixed content), else None."""
+    tag, text, leaf, before = pending
+    if before or (tail or "").strip():
+        return None
+    return (tag, text) if leaf or REQ_PAT.search(text) else None
+
+class _Frame:
+    """An open element during iter_xml_blocks: `parts` collects the text attributed to it, `last` is
+    its most recent closed child (still attached, for its tail), `pending` that child's own text while
+    it waits on the tail to decide whether it stands alone (see _own_row)."""
+    __slots__ = ("node", "tag", "block", "parts", "last", "inside", "leaf", "before", "pending")
+
+    def __init__(self, node, tag, block, parts, inside, before):
+        self.node, self.tag, self.block, self.parts = node, tag, block, parts
+        self.inside, self.before = inside, before
+        self.last = self.pending = None
+        self.leaf = True
+
+def iter_xml_blocks(path):
+    """Stream (tag, text) for every block element of an XML file, in document order.
+
+    Each text node is attributed once, to its innermost enclosing block, so
+    nested blocks are never re-joined into their ancestors. Outside PURE's
+    text blocks (generic spec dumps: <section><para>…), an element is a row
+    of its own when it is a leaf or its own text matches REQ_PAT, unless it
+    is inline markup within running text (<para>… <b>each</b> …</para>);
+    otherwise its text passes up to its parent (a named block keeps and
+    emits it). Text that would reach the root is emitted per top-level
+    child instead (loose text directly under the root as tag ""), so no row
+    spans the whole document. Finished children are dropped as the parse
+    moves on, keeping memory flat for any document size.
+    """
+    frames = []
+
+    def settle(top):
+        """Attribute the text before the next child / the end: parent.text or the last child's tail."""
+        text = top.last.tail if top.last is not None else top.node.text
+        rows = []
+        if top.pending is not None:
+            row = _own_row(top.pending, text)
+            if row is None and top is frames[0] and top.block != "text":
+                row = top.pending[:2]
+            if row is None:
+                top.parts.append(top.pending[1])
+            rows.append(row)
+            top.pending = None
+        if top is frames[0] and top.block != "text":
+            rows.append(("", _normalize(text)))
+        else:
+            top.parts.append(text)
+        return [r for r in rows if r and r[1]]
+
+    for ev, el in ET.iterparse(str(path), events=("start", "end")):
+        if ev == "start":
+            tag = el.tag.rsplit("}", 1)[-1].lower() if isinstance(el.tag, str) else ""
+            inside = before = False
+            if frames:
+                top = frames[-1]
+                yield from settle(top)
+                if top.last is not None:
+                    top.node.remove(top.last)
+                top.leaf = False
+                inside = top.block == "text" or top.inside
+                before = bool(top.parts and (top.parts[-1] or "").strip())
+            block = _block_kind(tag)
+            parts = frames[-1].parts if inside and not block else []
+            frames.append(_Frame(el, tag, block, parts, inside, before))
+        else:
+            top = frames[-1]
+            yield from settle(top)
+            frames.pop()
+            node = top.node
+            del node[:]; node.text = None
+            if frames:
+                frames[-1].last = node
+            text = _normalize(" ".join(p for p in top.parts if p))
+            if top.block and (frames or text):
+                yield top.tag, text
+            elif not top.inside and text and frames:
+                frames[-1].pending = (top.tag, text, top.leaf, top.before)
+
 def _extract_from_xml(path: Path):
     try:
-        tree = ET.parse(path); root = tree.getroot()
-    except Exception:
+        texts = [t for _, t in iter_xml_blocks(path)]
+    except ET.ParseError:
         return _extract_from_html(path)
 
-    texts = []
-    for el in root.iter():
-        tag = (el.tag or "").lower()
-        txt = _normalize(" ".join(el.itertext()))
-        if len(txt) < 6: 
-            continue
-        if ("req" in tag or "requirement" in tag or "spec" in tag or REQ_PAT.search(txt)):
-            texts.append(txt)
-    uniq = []
-    seen = set()
-    for t in texts:
-        if t in seen: continue
-        seen.add(t)
-        if REQ_PAT.search(t):
-            uniq.append(t)
+    uniq = _select(texts)
     if not uniq: return None
     out = path.with_suffix(".csv")
     pd.DataFrame({"document":[path.name]*len(uniq),"req_text":uniq}).to_csv(out, index=False)
@@ -65,10 +151,12 @@ def convert_all():
         for ext in ("*.html","*.htm","*.xml","*.xhtml"):
             for f in r.rglob(ext):
                 try:
-                    if f.suffix.lower() in [".html",".htm",".xhtml"]:
-                        out = _extract_from_html(f)
-                    else:
-                        out = _extract_from_xml(f)
+                    with metrics.span("convert.file", kind=f.suffix.lower().lstrip(".")) as sp:
+                        if f.suffix.lower() in [".html",".htm",".xhtml"]:
+                            out = _extract_from_html(f)
+                        else:
+                            out = _extract_from_xml(f)
+                        sp.add(docs=1, bytes=f.stat().st_size)
                     if out:
                         print("Converted:", f.name, "→", out.name)
                         converted.append(str(out))
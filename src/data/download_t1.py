@@ -1,90 +1,238 @@
 """
 T1 download helpers (robust to different file types on Zenodo).
+
+Zenodo records are resolved through the records API (file list with md5
+checksums; the JSON itself is fetched with If-None-Match). Files are streamed
+to a content-addressed cache (data/interim/download_cache/blobs/<sha256>) and
+reused while the record's checksum is unchanged, so a rerun downloads nothing.
+Archives are read from disk and only the members we consume (XML/CSV, no
+__MACOSX / dotfiles) are extracted, member by member in parallel, skipping
+members whose CRC matches the last extraction. PURE, Promise+ and Trick are
+resolved concurrently. If the API is unreachable the cached record is used,
+and without one the record's HTML page is scraped as before.
+
+The record pages are module constants; point them (or the page_url argument)
+at a local HTTP server serving /records/<id> and /api/records/<id> to run offline.
 """
 from pathlib import Path
-import requests, zipfile, io, re
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+import requests, zipfile, re, sys, os, json, hashlib, shutil, threading
 import pandas as pd
 from bs4 import BeautifulSoup
 
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import html_extract
+
 DATA = Path(__file__).resolve().parents[2] / "data" / "raw"
+CACHE = DATA.parent / "interim" / "download_cache"
 
 PURE_RECORD_PAGE = "https://zenodo.org/records/1414117"        # PURE
 PROMISE_PLUS_PAGE = "https://zenodo.org/records/12805484"       # Promise+ (PROMISE_exp expansion)
 TRICK_SRS_URL = "https://nasa.github.io/trick/documentation/software_requirements_specification/SRS.html"
 
-def _download(url: str, timeout=120) -> bytes:
-    r = requests.get(url, timeout=timeout)
-    r.raise_for_status()
-    return r.content
+CHUNK = 1 << 20
+MEMBER_EXTS = (".xml", ".csv")      # archive members convert_t1 / clean_all consume
 
-def _download_first_matching_from_record(page_url: str, exts=("zip",)):
-    """
-    Parse a Zenodo record HTML page and download the first file whose href ends with
-    one of the given extensions (case-insensitive). Returns (filename, bytes).
+_lock = threading.Lock()
+
+def _index():
+    p = CACHE / "index.json"
+    try:
+        return json.loads(p.read_text())
+    except Exception:
+        return {"records": {}, "blobs": {}, "urls": {}}
+
+def _update_index(section, key, value):
+    """Set index[section][key] = value (read-modify-write under a lock, atomic rename)."""
+    with _lock:
+        idx = _index()
+        idx.setdefault(section, {})[key] = value
+        CACHE.mkdir(parents=True, exist_ok=True)
+        tmp = CACHE / "index.json.part"
+        tmp.write_text(json.dumps(idx, indent=1)); tmp.replace(CACHE / "index.json")
+
+def _blob(sha):
+    return CACHE / "blobs" / sha
+
+def _stream(url, headers=None, timeout=120, checksum=None):
+    """GET url streamed into the blob cache → (sha256, response headers), or (None, headers) on 304.
+
+    checksum ("md5:<hex>", as listed by Zenodo) is verified before the blob is kept.
     """
+    (CACHE / "blobs").mkdir(parents=True, exist_ok=True)
+    with requests.get(url, headers=headers or {}, timeout=timeout, stream=True) as r:
+        if r.status_code == 304:
+            return None, r.headers
+        r.raise_for_status()
+        tmp = CACHE / "blobs" / f".{threading.get_ident()}.part"
+        sha, md5 = hashlib.sha256(), hashlib.md5()
+        try:
+            with open(tmp, "wb") as fh:
+                for block in r.iter_content(chunk_size=CHUNK):
+                    fh.write(block); sha.update(block); md5.update(block)
+            algo, _, want = (checksum or "").partition(":")
+            if algo == "md5" and want and md5.hexdigest() != want:
+                raise RuntimeError(f"Checksum mismatch for {url}: md5 {md5.hexdigest()} != {want}")
+            os.replace(tmp, _blob(sha.hexdigest()))
+        finally:
+            if tmp.exists():
+                tmp.unlink()
+        return sha.hexdigest(), r.headers
+
+def _fetch_file(url, checksum=None):
+    """Blob path for a record file, downloaded only if no cached blob has this checksum."""
+    if checksum:
+        sha = _index()["blobs"].get(checksum)
+        if sha and _blob(sha).exists():
+            print(f"[cached] {url.split('/files/')[-1]}")
+            return _blob(sha), False
+    sha, _ = _stream(url, checksum=checksum)
+    if checksum:
+        _update_index("blobs", checksum, sha)
+    return _blob(sha), True
+
+def _fetch_url(url, timeout=60):
+    """Blob path for a plain URL, revalidated with the stored ETag / Last-Modified."""
+    prev = _index()["urls"].get(url) or {}
+    hdr = {}
+    if prev.get("sha256") and _blob(prev["sha256"]).exists():
+        if prev.get("etag"): hdr["If-None-Match"] = prev["etag"]
+        if prev.get("last_modified"): hdr["If-Modified-Since"] = prev["last_modified"]
+    sha, headers = _stream(url, hdr, timeout)
+    if sha is None:
+        return _blob(prev["sha256"]), False
+    _update_index("urls", url, {"sha256": sha, "etag": headers.get("ETag"), "last_modified": headers.get("Last-Modified")})
+    return _blob(sha), sha != prev.get("sha256")
+
+def _api_url(page_url):
+    u = urlparse(page_url)
+    return f"{u.scheme}://{u.netloc}/api/records/{u.path.rstrip('/').rsplit('/', 1)[-1]}"
+
+def _scrape_record(page_url):
+    """[(filename, url, None)] from the record's HTML page (fallback when the API is unavailable)."""
     html = requests.get(page_url, timeout=60)
     html.raise_for_status()
-    soup = BeautifulSoup(html.text, "html.parser")
-    # File rows are anchor tags in the "Files" section
-    for a in soup.find_all("a", href=True):
+    u = urlparse(page_url)
+    files = []
+    for a in BeautifulSoup(html.text, "html.parser").find_all("a", href=True):
         href = a["href"]
-        # normalize to absolute
         if href.startswith("//"):
-            href_norm = "https:" + href
+            href = u.scheme + ":" + href
         elif href.startswith("/"):
-            href_norm = "https://zenodo.org" + href
-        else:
-            href_norm = href
-
-        # skip non-file links
-        if "/files/" not in href_norm:
+            href = f"{u.scheme}://{u.netloc}{href}"
+        if "/files/" not in href:
             continue
+        if "download=1" not in href:
+            href += ("&" if "?" in href else "?") + "download=1"
+        files.append((href.split("/files/")[-1].split("?")[0], href, None))
+    return files
 
-        # extension check
-        for ext in exts:
-            if href_norm.lower().endswith(f".{ext}") or f".{ext}?" in href_norm.lower():
-                # add ?download=1 if missing (zenodo supports both)
-                if "download=1" not in href_norm:
-                    sep = "&" if "?" in href_norm else "?"
-                    href_norm = href_norm + f"{sep}download=1"
-                content = _download(href_norm)
-                # try to get a sane filename from the URL tail
-                fname = href_norm.split("/files/")[-1].split("?")[0]
-                return fname, content
+def _record_files(page_url):
+    """[(filename, url, checksum)] of a Zenodo record, via the API (cached by ETag)."""
+    api = _api_url(page_url)
+    prev = _index()["records"].get(api)
+    try:
+        hdr = {"Accept": "application/json"}
+        if prev and prev.get("etag"):
+            hdr["If-None-Match"] = prev["etag"]
+        r = requests.get(api, headers=hdr, timeout=60)
+        if r.status_code == 304 and prev:
+            return prev["files"]
+        r.raise_for_status()
+        files = []
+        for f in r.json().get("files", []):
+            links = f.get("links", {})
+            url = links.get("content") or links.get("self") or links.get("download")
+            if url and f.get("key"):
+                files.append((f["key"], url, f.get("checksum")))
+        _update_index("records", api, {"etag": r.headers.get("ETag"), "files": files})
+        return files
+    except Exception as e:
+        if prev:
+            print(f"[warn] {api}: {e}; using cached record")
+            return prev["files"]
+        print(f"[warn] {api}: {e}; scraping {page_url}")
+        return _scrape_record(page_url)
 
+def _download_first_matching_from_record(page_url: str, exts=("zip",)):
+    """
+    Resolve a Zenodo record and fetch the first file whose name ends with one of
+    the given extensions (case-insensitive). Returns (filename, cached path, changed).
+    """
+    for fname, url, checksum in _record_files(page_url):
+        name = fname.lower()
+        if any(name.endswith(f".{ext}") for ext in exts):
+            return (fname, *_fetch_file(url, checksum))
     raise RuntimeError(f"No file with extensions {exts} found on {page_url}")
 
-def download_pure(outdir=DATA / "t1_pure"):
+def _wanted(info, exts):
+    parts = Path(info.filename).parts
+    return (not info.is_dir() and info.filename.lower().endswith(exts)
+            and not any(p == "__MACOSX" or p.startswith(".") for p in parts))
+
+def _extract_one(archive, info, outdir):
+    target = (outdir / info.filename).resolve()
+    if outdir.resolve() not in target.parents:
+        raise RuntimeError(f"Unsafe member path: {info.filename}")
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_name(target.name + ".part")
+    with zipfile.ZipFile(archive) as zf, zf.open(info) as src, open(tmp, "wb") as dst:
+        shutil.copyfileobj(src, dst, CHUNK)
+    tmp.replace(target)
+
+def extract_members(archive, outdir, exts=MEMBER_EXTS, workers=4):
+    """Extract the archive members ending in `exts`, streamed and in parallel; unchanged members
+    (same CRC as recorded in outdir/.extracted.json and still on disk) are skipped. Returns #extracted."""
+    outdir = Path(outdir); outdir.mkdir(parents=True, exist_ok=True)
+    state_path = outdir / ".extracted.json"
+    state = json.loads(state_path.read_text()) if state_path.exists() else {}
+    with zipfile.ZipFile(archive) as zf:
+        members = [i for i in zf.infolist() if _wanted(i, tuple(exts))]
+    todo = [i for i in members if state.get(i.filename) != [i.CRC, i.file_size]
+            or not (outdir / i.filename).exists()]
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+        list(ex.map(lambda i: _extract_one(archive, i, outdir), todo))
+    state = {i.filename: [i.CRC, i.file_size] for i in members}
+    state_path.write_text(json.dumps(state, indent=1))
+    return len(todo)
+
+def download_pure(outdir=DATA / "t1_pure", page_url=PURE_RECORD_PAGE, workers=4):
     outdir.mkdir(parents=True, exist_ok=True)
     print("Resolving PURE (requirements.zip or requirements-xml.zip)…")
     # PURE offers .zip files → prefer zips
-    fname, content = _download_first_matching_from_record(PURE_RECORD_PAGE, exts=("zip",))
-    with zipfile.ZipFile(io.BytesIO(content)) as zf:
-        zf.extractall(outdir)
-    print(f"PURE → {outdir} (extracted from {fname})")
+    fname, archive, changed = _download_first_matching_from_record(page_url, exts=("zip",))
+    n = extract_members(archive, outdir, workers=workers)
+    print(f"PURE → {outdir} ({n} members extracted from {fname}{'' if changed else ', cached'})")
 
-def download_promise_plus(outdir=DATA / "t1_promise_exp"):
+def download_promise_plus(outdir=DATA / "t1_promise_exp", page_url=PROMISE_PLUS_PAGE):
     outdir.mkdir(parents=True, exist_ok=True)
     print("Resolving Promise+ (may be .arff/.xlsx)…")
     # Promise+ provides .arff and .xlsx (no zip); accept either
-    fname, content = _download_first_matching_from_record(PROMISE_PLUS_PAGE, exts=("arff","xlsx","csv","zip"))
-    (outdir / fname).write_bytes(content)
-    print(f"Promise+ → {outdir/fname}")
+    fname, blob, changed = _download_first_matching_from_record(page_url, exts=("arff","xlsx","csv","zip"))
+    out = outdir / fname
+    if changed or not out.exists() or out.stat().st_size != blob.stat().st_size:
+        tmp = out.with_name(out.name + ".part")
+        shutil.copyfile(blob, tmp); tmp.replace(out)
+    print(f"Promise+ → {out}")
 
-def scrape_trick_srs(outdir=DATA / "t1_nasa_srs"):
-    import re
-    from bs4 import BeautifulSoup
+def scrape_trick_srs(outdir=DATA / "t1_nasa_srs", url=TRICK_SRS_URL):
     outdir.mkdir(parents=True, exist_ok=True)
     print("Scraping NASA Trick SRS…")
-    html = _download(TRICK_SRS_URL).decode("utf-8", errors="ignore")
-    soup = BeautifulSoup(html, "html.parser")
-    lines = []
-    for li in soup.select("li"):
-        t = re.sub(r"\s+", " ", li.get_text(" ", strip=True))
-        if re.search(r"\bshall\b", t, flags=re.I):
-            lines.append(t)
+    shall = re.compile(r"\bshall\b", flags=re.I)
+    page, _ = _fetch_url(url)
+    lines = [t for t in html_extract.iter_blocks(page, ("li",)) if shall.search(t)]
     pd.DataFrame({"document": "TRICK_SRS", "req_text": lines}).to_csv(outdir / "trick_srs_requirements.csv", index=False)
     print(f"NASA Trick SRS → {outdir/'trick_srs_requirements.csv'} (rows={len(lines)})")
 
+def main():
+    with ThreadPoolExecutor(max_workers=3) as ex:
+        futs = [ex.submit(f) for f in (download_pure, download_promise_plus, scrape_trick_srs)]
+        errors = [f.exception() for f in futs if f.exception()]
+    for e in errors:
+        print("[fail]", e)
+    if errors:
+        raise errors[0]
+
 if __name__ == "__main__":
-    download_pure(); download_promise_plus(); scrape_trick_srs()
\ No newline at end of file
+    main()
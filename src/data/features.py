@@ -0,0 +1,213 @@
+"""
+Feature store for Phase 2 (ambiguity detection): one sparse CSR matrix over the pool, keyed by row id.
+
+Usage:
+  python src/data/features.py [--pool PATH] [--bits 18] [--rebuild]
+
+  fs = features.load()                 # memory-mapped, nothing is copied
+  X = fs.csr()                         # scipy.sparse.csr_matrix over the mmaps (needs scipy)
+  X = fs.csr(ids)                      # rows for the given pool ids, in that order
+  fs.columns()                         # names of the cue columns (after the 2**bits hash columns)
+
+Each text is tokenized once (lower-cased \\w+ runs, as in the labeler) and gives
+- hashed word uni- and bigram counts in 2**bits columns (pandas' hash_array),
+- cue columns: the labeler's rule hits (bootstrap_v1_labels.scan), modal verb
+  counts, "be + participle" passive markers, token and character length, and
+  sector one-hots.
+Zero entries are not stored.
+
+Layout (data/interim/features/): data.bin (float32), indices.bin and indptr.bin are raw
+little-endian arrays opened with np.memmap, ids.txt holds one row id per line
+and meta.json the row/nnz counts, parameters and a signature of the feature
+definitions. A rebuild appends only rows whose id is not in the store yet;
+meta.json is rewritten last, so an interrupted append is truncated away on the
+next run. A changed signature (bits, rules, version) starts the store over.
+Indices switch to int64 once nnz outgrows int32.
+"""
+from pathlib import Path
+import hashlib, json, re, sys
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import rule_cache, storage
+from sectors import SECTOR_HINTS
+
+ROOT = Path(__file__).resolve().parents[2]
+INTERIM = ROOT / "data" / "interim"
+PROCESSED = ROOT / "data" / "processed"
+POOL = PROCESSED / "regulqa_ambig_pool.parquet"
+STORE = INTERIM / "features"
+
+VERSION = 1
+BITS = 18
+MODALS = ["shall", "must", "will", "should", "may", "can", "could", "might", "would"]
+SECTORS = ["general"] + list(SECTOR_HINTS)
+_WORD = re.compile(r"\w+")
+_PASSIVE = re.compile(r"\b(?:am|is|are|was|were|be|been|being)\s+(?:\w+ly\s+)?\w+(?:ed|en)\b", re.I)
+_INT32_MAX = np.iinfo(np.int32).max
+
+def cue_columns():
+    lab = rule_cache.labeler()
+    return ([f"rule:{r}" for r in lab.RULES] + [f"modal:{m}" for m in MODALS] + ["passive_be_participle"]
+            + ["n_tokens", "n_chars"] + [f"sector:{s}" for s in SECTORS])
+
+def _signature(bits):
+    lab = rule_cache.labeler()
+    rules = json.dumps([lab.heuristics, lab.severity_terms], sort_keys=True)
+    return {"version": VERSION, "bits": bits, "pandas": pd.__version__, "columns": cue_columns(),
+            "rules": hashlib.blake2b(rules.encode("utf-8"), digest_size=8).hexdigest()}
+
+def featurize(texts, sectors=None, bits=BITS):
+    """CSR pieces (data float32, indices int64, indptr int64) for a batch; column space 2**bits + len(cue_columns())."""
+    texts = [str(t) for t in texts]
+    n, width = len(texts), 1 << bits
+    toks = [_WORD.findall(t.lower()) for t in texts]
+    grams, rows = [], []
+    for i, tk in enumerate(toks):
+        g = tk + [f"{a} {b}" for a, b in zip(tk, tk[1:])]
+        grams.extend(g); rows.extend([i] * len(g))
+    rows = np.asarray(rows, dtype=np.int64)
+    cols = (pd.util.hash_array(np.asarray(grams, dtype=object)) & np.uint64(width - 1)).astype(np.int64) \
+        if grams else np.zeros(0, dtype=np.int64)
+    # cue block: one dense column per cue, zeros dropped below
+    lab = rule_cache.labeler()
+    masks = lab.scan(texts)
+    cues = [((masks >> i) & 1).astype(np.float32) for i in range(len(lab.RULES))]
+    cues += [np.fromiter((tk.count(m) for tk in toks), dtype=np.float32, count=n) for m in MODALS]
+    cues.append(np.fromiter((len(_PASSIVE.findall(t)) for t in texts), dtype=np.float32, count=n))
+    cues.append(np.fromiter(map(len, toks), dtype=np.float32, count=n))
+    cues.append(np.fromiter(map(len, texts), dtype=np.float32, count=n))
+    sec = pd.Series(sectors if sectors is not None else ["general"] * n, dtype=object).astype(str)
+    cues += [sec.eq(s).to_numpy(dtype=np.float32) for s in SECTORS]
+    dense = np.stack(cues, axis=1)
+    r2, c2 = np.nonzero(dense)
+    # sum duplicate (row, col) pairs: the n-gram counts
+    keys = np.concatenate([rows * (width + dense.shape[1]) + cols, r2 * (width + dense.shape[1]) + width + c2])
+    vals = np.concatenate([np.ones(len(rows), dtype=np.float32), dense[r2, c2]])
+    order = np.argsort(keys, kind="stable")
+    keys, vals = keys[order], vals[order]
+    uniq, start = np.unique(keys, return_index=True)
+    data = np.add.reduceat(vals, start) if len(vals) else vals
+    row_of, indices = np.divmod(uniq, width + dense.shape[1])
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(row_of, minlength=n), out=indptr[1:])
+    return data.astype(np.float32), indices, indptr
+
+class FeatureStore:
+    """Memory-mapped CSR rows + ids; see load()."""
+
+    def __init__(self, path, meta):
+        self.path, self.meta = Path(path), meta
+        n, nnz, dt = meta["rows"], meta["nnz"], np.dtype(meta["index_dtype"])
+        self.shape = (n, meta["n_features"])
+        self.data = self._map("data.bin", np.float32, nnz)
+        self.indices = self._map("indices.bin", dt, nnz)
+        self.indptr = self._map("indptr.bin", dt, n + 1)
+        ids = (self.path / "ids.txt").read_text(encoding="utf-8").split("\n")[:n] if n else []
+        self.ids = pd.Index(ids)
+
+    def _map(self, name, dtype, count):
+        if count == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(self.path / name, dtype=dtype, mode="r", shape=(count,))
+
+    def __len__(self):
+        return self.shape[0]
+
+    def columns(self):
+        return list(self.meta["columns"])
+
+    def positions(self, ids):
+        pos = self.ids.get_indexer(pd.Index([str(i) for i in ids]))
+        if (pos < 0).any():
+            raise KeyError(f"{int((pos < 0).sum())} ids not in the feature store (run src/data/features.py)")
+        return pos
+
+    def csr(self, ids=None):
+        """scipy CSR view over the memmaps (rows of `ids` are gathered, i.e. copied)."""
+        from scipy.sparse import csr_matrix
+        X = csr_matrix((self.data, self.indices, self.indptr), shape=self.shape, copy=False)
+        return X if ids is None else X[self.positions(ids)]
+
+def _meta(path):
+    p = Path(path) / "meta.json"
+    return json.loads(p.read_text()) if p.exists() else None
+
+def load(path=STORE):
+    meta = _meta(path)
+    if meta is None:
+        raise FileNotFoundError(f"No feature store at {path}; run src/data/features.py")
+    return FeatureStore(path, meta)
+
+def _truncate(path, meta):
+    """Drop bytes past what meta.json records (an interrupted append)."""
+    dt = np.dtype(meta["index_dtype"])
+    sizes = {"data.bin": meta["nnz"] * 4, "indices.bin": meta["nnz"] * dt.itemsize,
+             "indptr.bin": (meta["rows"] + 1) * dt.itemsize}
+    for name, size in sizes.items():
+        with open(path / name, "r+b") as fh:
+            fh.truncate(size)
+    ids = (path / "ids.txt").read_text(encoding="utf-8").split("\n")[:meta["rows"]]
+    (path / "ids.txt").write_text("".join(i + "\n" for i in ids), encoding="utf-8")
+
+def _widen(path, meta):
+    """Rewrite indices/indptr as int64 (nnz no longer fits int32)."""
+    for name in ("indices.bin", "indptr.bin"):
+        arr = np.fromfile(path / name, dtype=np.int32).astype("<i8")
+        tmp = path / (name + ".part"); arr.tofile(tmp); tmp.replace(path / name)
+    meta["index_dtype"] = "<i8"
+
+def _write_meta(path, meta):
+    tmp = path / "meta.json.part"
+    tmp.write_text(json.dumps(meta, indent=1)); tmp.replace(path / "meta.json")
+
+def build(pool=POOL, path=STORE, bits=BITS, rebuild=False, chunksize=storage.ROW_GROUP):
+    """Featurize pool rows not yet in the store and append them; returns the FeatureStore."""
+    path = Path(path); path.mkdir(parents=True, exist_ok=True)
+    sig, meta = _signature(bits), _meta(path)
+    if meta is not None and not rebuild and meta.get("signature") != sig:
+        print("Feature definitions changed → rebuilding store"); meta = None
+    if meta is None or rebuild:
+        meta = {"signature": sig, "rows": 0, "nnz": 0, "index_dtype": "<i4", "bits": bits,
+                "n_features": (1 << bits) + len(sig["columns"]), "columns": sig["columns"]}
+        for name in ("data.bin", "indices.bin", "indptr.bin", "ids.txt"):
+            (path / name).write_bytes(b"")
+        np.zeros(1, dtype="<i4").tofile(path / "indptr.bin")
+    else:
+        _truncate(path, meta)
+    known = set(load(path).ids) if meta["rows"] else set()
+    cols = ["id", "req_text", "sector"]
+    added = 0
+    for chunk in storage.iter_batches(pool, columns=cols, batch_size=chunksize):
+        chunk = chunk[~chunk["id"].astype(str).isin(known)].drop_duplicates(subset=["id"])
+        if chunk.empty: continue
+        data, indices, indptr = featurize(chunk["req_text"].astype(str).tolist(),
+                                          chunk["sector"].astype(str).tolist(), bits)
+        if meta["nnz"] + len(data) > _INT32_MAX and meta["index_dtype"] == "<i4":
+            _widen(path, meta)
+        dt = np.dtype(meta["index_dtype"])
+        with open(path / "data.bin", "ab") as fh:
+            data.astype("<f4").tofile(fh)
+        with open(path / "indices.bin", "ab") as fh:
+            indices.astype(dt).tofile(fh)
+        with open(path / "indptr.bin", "ab") as fh:
+            (indptr[1:] + meta["nnz"]).astype(dt).tofile(fh)
+        with open(path / "ids.txt", "a", encoding="utf-8") as fh:
+            fh.write("".join(f"{i}\n" for i in chunk["id"].astype(str)))
+        known.update(chunk["id"].astype(str))
+        meta["rows"] += len(chunk); meta["nnz"] += len(data); added += len(chunk)
+    _write_meta(path, meta)
+    print("Feature store:", meta["rows"], "rows (+%d new)," % added, "nnz:", meta["nnz"],
+          "features:", meta["n_features"], "→", path)
+    return load(path)
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pool", default=str(POOL))
+    ap.add_argument("--out", default=str(STORE))
+    ap.add_argument("--bits", type=int, default=BITS, help="log2 of the hashed n-gram columns")
+    ap.add_argument("--rebuild", action="store_true", help="Start the store over")
+    args = ap.parse_args()
+    build(args.pool, args.out, args.bits, args.rebuild)
@@ -0,0 +1,73 @@
+"""
+Shared HTML requirement-block extraction (lxml).
+
+One document-order walk over lxml's C tree: every text node is attributed to
+its innermost enclosing block element (li, p, dd by default), so nested blocks
+(li > p) are emitted once each instead of once per ancestor. Blocks are yielded
+leaf-first, as they close. script/style content is skipped.
+
+Used by convert_t1_html_xml (T1), tools/extract_to_csv.py (T3) and
+download_t1.scrape_trick_srs.
+"""
+from pathlib import Path
+import re
+
+BLOCK_TAGS = ("li", "p", "dd")
+SKIP_TAGS = {"script", "style", "noscript", "template"}
+_WS = re.compile(r"\s+")
+
+def _normalize(s):
+    return _WS.sub(" ", s).strip()
+
+def parse(source):
+    """lxml root for a Path, bytes or markup str (bytes are decoded as UTF-8, undecodable bytes dropped)."""
+    import lxml.html
+    if isinstance(source, Path):
+        source = source.read_bytes()
+    if isinstance(source, bytes):
+        source = source.decode("utf-8", errors="ignore")
+    data = source.encode("utf-8")
+    if not data.strip():
+        return None
+    return lxml.html.document_fromstring(data, parser=lxml.html.HTMLParser(encoding="utf-8"))
+
+def iter_blocks(source, tags=BLOCK_TAGS):
+    """Yield the normalized, non-empty text of each block element (leaf-first, no text repeated)."""
+    from lxml import etree
+    root = parse(source)
+    if root is None:
+        return
+    tags = set(tags)
+    stack = []                         # (element, parts) for open blocks
+    skip = 0
+    for ev, el in etree.iterwalk(root, events=("start", "end")):
+        tag = el.tag if isinstance(el.tag, str) else None      # comments / PIs have no str tag
+        if ev == "start":
+            if tag in SKIP_TAGS:
+                skip += 1
+            elif tag in tags and not skip:
+                stack.append((el, []))
+            if tag and not skip and stack and el.text:
+                stack[-1][1].append(el.text)
+        else:
+            if tag in SKIP_TAGS:
+                skip -= 1
+            elif stack and stack[-1][0] is el:
+                text = _normalize(" ".join(stack.pop()[1]))
+                if text:
+                    yield text
+            if not skip and stack and el.tail:
+                stack[-1][1].append(el.tail)
+
+def iter_text(source):
+    """Every non-empty text node (outside script/style), normalized — the fallback for block-less pages."""
+    root = parse(source)
+    if root is None:
+        return
+    for el in root.iter():
+        if isinstance(el.tag, str) and el.tag not in SKIP_TAGS and el.text:
+            t = _normalize(el.text)
+            if t: yield t
+        if el.tail:
+            t = _normalize(el.tail)
+            if t: yield t
@@ -0,0 +1,274 @@
+"""
+Label Studio hand-off: chunked task export with weak-label predictions, and bulk import of annotations.
+
+Usage:
+  python src/data/labelstudio.py export [--input data/processed/regulqa_ambig_pool.parquet]
+                                        [--predictions data/processed/regulqa_ambig_v11.parquet]
+                                        [--limit 2000] [--chunk 500] [--fmt json|jsonl]
+  python src/data/labelstudio.py import EXPORT.json [EXPORT2.json ...] [--overwrite]
+
+export streams the input table and writes Label Studio tasks to
+data/processed/labelstudio/<batch>_NNNN.json. Each task holds the row metadata
+(the pool id as data.pool_id) and one prediction with the
+annotation/labelstudio/regulqa_label_config.xml choices preselected. The label
+choices come from the labeler output (--predictions, matched by id), or from
+bootstrap_v1_labels.label_batch for rows it doesn't cover; sector is
+preselected from the pool row. Ids already in the
+ledger (labelstudio/exported.sqlite) are skipped, so each run only exports
+new tasks.
+
+import reads Label Studio exports (JSON, JSON-MIN or CSV), takes the latest
+non-cancelled annotation per task and merges it into the pool by id in one
+streaming pass (clean_all.merge_labels; --overwrite replaces existing labels).
+An annotated sector always replaces the pool's sector (it is a correction of
+a value every row already has).
+"""
+from pathlib import Path
+from datetime import datetime, timezone
+import json, re, sqlite3, sys
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import rule_cache, storage
+
+ROOT = Path(__file__).resolve().parents[2]
+PROCESSED = ROOT / "data" / "processed"
+POOL = PROCESSED / "regulqa_ambig_pool.parquet"
+PREDICTIONS = PROCESSED / "regulqa_ambig_v11.parquet"
+OUT = PROCESSED / "labelstudio"
+LEDGER = OUT / "exported.sqlite"
+CONFIG = ROOT / "annotation" / "labelstudio" / "regulqa_label_config.xml"
+
+DATA_COLS = ["source", "tier", "sector", "document", "req_text"]
+LABEL_COLS = ["ambig_presence", "ambig_type", "reg_clause", "severity", "notes"]
+ANNOTATED_COLS = LABEL_COLS + ["sector"]        # controls read back from an export
+MODEL_VERSION = "bootstrap_v1"
+# labeler clause text → config choice; the first match wins, so the specific regulations come before ISO 29148
+CLAUSES = [("26262", "ISO_26262"), ("178", "DO_178C"), ("62304", "IEC_62304"), ("SWEHB", "NASA_SWEHB"),
+           ("29148", "ISO_29148")]
+
+def load_config(path=CONFIG):
+    """{control name: (tag, to_name, multiple, choice values)} for the Choices/TextArea controls."""
+    from lxml import etree
+    out = {}
+    for el in etree.parse(str(path)).iter("Choices", "TextArea"):
+        values = [c.get("value") for c in el.iter("Choice")]
+        out[el.get("name")] = (el.tag, el.get("toName"), el.get("choice") == "multiple", values)
+    return out
+
+def _choices(name, value, values):
+    value = str(value or "").strip()
+    if not value:
+        return []
+    if value in values:
+        return [value]
+    if name == "reg_clause":
+        for needle, choice in CLAUSES:
+            if needle in value and choice in values:
+                return [choice]
+        return []
+    return [v for v in dict.fromkeys(p.strip() for p in re.split(r"[;,]", value)) if v in values]
+
+def prediction(row, config):
+    """Label Studio prediction result for one row (dict of control name → label value)."""
+    result = []
+    for name, (tag, to_name, multiple, values) in config.items():
+        if tag == "TextArea":
+            text = str(row.get(name) or "").strip()
+            if text:
+                result.append({"from_name": name, "to_name": to_name, "type": "textarea", "value": {"text": [text]}})
+            continue
+        picked = _choices(name, row.get(name), values)
+        if picked:
+            result.append({"from_name": name, "to_name": to_name, "type": "choices",
+                           "value": {"choices": picked if multiple else picked[:1]}})
+    return {"model_version": MODEL_VERSION, "result": result}
+
+class Ledger:
+    """Ids already exported (and when their annotations came back), in SQLite."""
+
+    def __init__(self, path=LEDGER):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(path))
+        self.db.execute("CREATE TABLE IF NOT EXISTS exported (id TEXT PRIMARY KEY, batch TEXT, file TEXT, "
+                        "exported_at TEXT, annotated_at TEXT)")
+
+    def known(self, ids):
+        out = set()
+        for i in range(0, len(ids), 900):
+            part = ids[i:i + 900]
+            q = f"SELECT id FROM exported WHERE id IN ({','.join('?' * len(part))})"
+            out.update(r[0] for r in self.db.execute(q, part))
+        return out
+
+    def add(self, rows):
+        self.db.executemany("INSERT OR IGNORE INTO exported (id, batch, file, exported_at) VALUES (?, ?, ?, ?)", rows)
+
+    def annotated(self, ids, when):
+        self.db.executemany("UPDATE exported SET annotated_at = ? WHERE id = ?", ((when, i) for i in ids))
+
+    def commit(self):
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+def _load_predictions(path):
+    if not path or storage.resolve(path) is None:
+        return None
+    df = storage.read_table(path)
+    cols = [c for c in LABEL_COLS if c in df.columns]
+    if "id" not in df.columns or not cols:
+        return None
+    return df[["id"] + cols].astype(object).fillna("").astype(str).drop_duplicates("id", keep="last").set_index("id")
+
+def _write_chunk(tasks, path, fmt):
+    tmp = path.with_name(path.name + ".part")
+    with open(tmp, "w", encoding="utf-8") as fh:
+        if fmt == "jsonl":
+            fh.writelines(json.dumps(t, ensure_ascii=False) + "\n" for t in tasks)
+        else:
+            json.dump(tasks, fh, ensure_ascii=False)
+    tmp.replace(path)
+
+def export_tasks(input=POOL, predictions=PREDICTIONS, out_dir=OUT, limit=None, chunk=500, fmt="json",
+                 ledger=LEDGER, config=CONFIG, batch_size=storage.ROW_GROUP):
+    """Write not-yet-exported rows of `input` as chunked task files; returns the files written."""
+    out_dir = Path(out_dir); out_dir.mkdir(parents=True, exist_ok=True)
+    conf, preds = load_config(config), _load_predictions(predictions)
+    batch = datetime.now(timezone.utc).strftime("tasks_%Y%m%dT%H%M%SZ")
+    led, files, tasks, ids, n = Ledger(ledger), [], [], [], 0
+
+    def flush():
+        path = out_dir / f"{batch}_{len(files):04d}.{fmt}"
+        _write_chunk(tasks, path, fmt)
+        now = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        led.add((i, batch, path.name, now) for i in ids)
+        led.commit()
+        files.append(path); tasks.clear(); ids.clear()
+
+    try:
+        for df in storage.iter_batches(input, batch_size=batch_size):
+            df = df.astype(object).where(df.notna(), "")
+            df["id"] = df["id"].astype(str)
+            df = df[~df["id"].isin(led.known(df["id"].tolist()))].drop_duplicates("id")
+            if limit is not None:
+                df = df.iloc[:max(0, limit - n)]
+            if df.empty:
+                continue
+            labels = preds.reindex(df["id"]) if preds is not None else pd.DataFrame(index=df["id"], columns=LABEL_COLS)
+            todo = labels["ambig_presence"].isna().to_numpy() if "ambig_presence" in labels else [True] * len(df)
+            if any(todo):
+                weak = rule_cache.labeler().label_batch(df.loc[todo, "req_text"].astype(str))
+                weak.index = df.loc[todo, "id"].values
+                labels = labels.reindex(columns=LABEL_COLS).astype(object)
+                labels.loc[weak.index, LABEL_COLS] = weak[LABEL_COLS].values
+            for rec, lab in zip(df.to_dict("records"), labels.to_dict("records")):
+                data = {"pool_id": rec["id"], **{c: str(rec[c]) for c in DATA_COLS if c in rec}}
+                tasks.append({"data": data, "predictions": [prediction({**lab, "sector": rec.get("sector", "")}, conf)]})
+                ids.append(rec["id"])
+                if len(tasks) >= chunk:
+                    flush()
+            n += len(df)
+            if limit is not None and n >= limit:
+                break
+        if tasks:
+            flush()
+    finally:
+        led.close()
+    print("Wrote", len(files), "task files to", out_dir, "tasks:", n)
+    return files
+
+def _read_export(path):
+    """Label Studio export → list of (pool id, {annotated col: value}, updated_at)."""
+    path = Path(path)
+    if path.suffix == ".csv":
+        recs = pd.read_csv(path, dtype=str, keep_default_na=False).to_dict("records")
+    else:
+        text = path.read_text(encoding="utf-8")
+        recs = json.loads(text) if text.lstrip().startswith("[") else [json.loads(l) for l in text.splitlines() if l.strip()]
+    out = []
+    for r in recs:
+        if "annotations" in r:                                  # full JSON export
+            data = r.get("data", {})
+            anns = [a for a in r["annotations"] if not a.get("was_cancelled")]
+            if not anns:
+                continue
+            ann = max(anns, key=lambda a: a.get("updated_at") or a.get("created_at") or "")
+            labels = {}
+            for item in ann.get("result", []):
+                v = item.get("value", {})
+                if "choices" in v:
+                    labels[item["from_name"]] = ";".join(v["choices"])
+                elif "text" in v:
+                    labels[item["from_name"]] = "\n".join(v["text"])
+            out.append((data.get("pool_id") or data.get("id"), labels, ann.get("updated_at") or ""))
+        else:                                                   # JSON-MIN / CSV: one flat record per annotation
+            pid = r.get("pool_id")
+            if not pid:
+                continue
+            labels = {}
+            for c in ANNOTATED_COLS:
+                v = r.get(c)
+                if isinstance(v, dict):
+                    v = v.get("choices", v.get("text", ""))
+                if isinstance(v, list):
+                    v = ";".join(map(str, v))
+                if v not in (None, ""):
+                    labels[c] = str(v)
+            out.append((pid, labels, str(r.get("updated_at", ""))))
+    return out
+
+def read_annotations(paths):
+    """Latest annotation per pool id across one or more exports → DataFrame[id + ANNOTATED_COLS]."""
+    latest = {}
+    for p in paths:
+        for pid, labels, when in _read_export(p):
+            if pid and (pid not in latest or when >= latest[pid][1]):
+                latest[pid] = (labels, when)
+    rows = [{"id": str(pid), **{c: labels.get(c, "") for c in ANNOTATED_COLS}} for pid, (labels, _) in latest.items()]
+    return pd.DataFrame(rows, columns=["id"] + ANNOTATED_COLS)
+
+def import_annotations(paths, pool=POOL, overwrite=False, ledger=LEDGER, batch_size=storage.ROW_GROUP):
+    """Merge completed annotations into the pool by id, streaming the pool once."""
+    from clean_all import merge_labels
+    labels = read_annotations(paths)
+    if labels.empty:
+        print("No completed annotations in", [str(p) for p in paths])
+        return 0
+    found = storage.resolve(pool)
+    n = moved = 0
+    with storage.TableWriter(found) as w:
+        for df in storage.iter_batches(found, batch_size=batch_size):
+            sub = labels[labels["id"].isin(df["id"].astype(str))]
+            if len(sub):
+                df, k = merge_labels(df, sub, cols=LABEL_COLS, overwrite=overwrite)
+                df, m = merge_labels(df, sub, cols=["sector"], overwrite=True)
+                n += k; moved += m
+            w.write(df)
+    led = Ledger(ledger)
+    led.annotated(labels["id"].tolist(), datetime.now(timezone.utc).isoformat(timespec="seconds"))
+    led.commit(); led.close()
+    print("Merged", len(labels), "annotations into", found, "rows updated:", n, "sector corrections:", moved)
+    return n
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    ex = sub.add_parser("export", help="Write new tasks as chunked Label Studio JSON")
+    ex.add_argument("--input", default=str(POOL))
+    ex.add_argument("--predictions", default=str(PREDICTIONS), help="Labeled table to preselect choices from")
+    ex.add_argument("--out", default=str(OUT))
+    ex.add_argument("--limit", type=int, default=None, help="Max tasks in this export")
+    ex.add_argument("--chunk", type=int, default=500, help="Tasks per file")
+    ex.add_argument("--fmt", choices=["json", "jsonl"], default="json")
+    im = sub.add_parser("import", help="Merge Label Studio exports back into the pool")
+    im.add_argument("exports", nargs="+")
+    im.add_argument("--pool", default=str(POOL))
+    im.add_argument("--overwrite", action="store_true", help="Annotations replace existing labels")
+    args = ap.parse_args()
+    if args.cmd == "export":
+        export_tasks(args.input, args.predictions, args.out, args.limit, args.chunk, args.fmt)
+    else:
+        import_annotations(args.exports, args.pool, args.overwrite)
@@ -0,0 +1,220 @@
+"""
+Lightweight metrics for the pipeline stages: spans, counters and regex telemetry.
+
+Off unless REGULQA_METRICS is set ("1" → data/interim/metrics, or a directory)
+or enable() is called. When off, span() returns a shared no-op, count() returns
+at once and pattern() hands back the compiled regex itself, so instrumented
+code keeps its uninstrumented speed.
+
+  with metrics.span("extract.file", file=name) as sp:     # wall/CPU time, peak RSS
+      ...; sp.add(docs=1, sentences=n, bytes=size)        # → docs/s, sentences/s, bytes/s
+  metrics.count("extract.dropped", n, reason="length")
+  rx = metrics.pattern("extract.rx_req", rx)              # per-pattern calls, matches, seconds
+
+Output (per run, shared by worker processes through the environment):
+- metrics.jsonl: one JSON line per closed span, plus counter/regex deltas on flush()
+- <component>.prom: Prometheus textfile written by the process that enabled
+  metrics, summing every line of its run (node_exporter textfile collector)
+Worker entry points call flush() before returning, because pool workers skip atexit.
+"""
+from pathlib import Path
+import atexit, json, os, sys, threading, time, uuid
+
+ROOT = Path(__file__).resolve().parents[2]
+DEFAULT_DIR = ROOT / "data" / "interim" / "metrics"
+ENV, RUN_ENV = "REGULQA_METRICS", "REGULQA_METRICS_RUN"
+
+_on = False
+_dir = None
+_run = None
+_owner = False
+_component = None
+_lock = threading.Lock()
+_counters = {}              # (name, labels) → value
+_regex = {}                 # name → [calls, matches, seconds]
+
+def _peak_rss_mb(children=False):
+    """Peak RSS of this process in MiB (or of its largest waited-for child, if bigger, with children=True)."""
+    import resource
+    scale = 1 if sys.platform == "darwin" else 1024      # ru_maxrss is bytes on macOS, KiB on Linux
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if children:
+        peak = max(peak, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return round(peak * scale / 2**20, 1)
+
+def enabled():
+    return _on
+
+def enable(out_dir=None, component=None):
+    """Turn metrics on for this process and (via the environment) its workers."""
+    global _on, _dir, _run, _owner, _component
+    if _on:
+        return
+    _dir = Path(out_dir or DEFAULT_DIR); _dir.mkdir(parents=True, exist_ok=True)
+    _component = component or Path(sys.argv[0] or "python").stem or "python"
+    _run = os.environ.get(RUN_ENV)
+    if not _run:
+        _run = uuid.uuid4().hex[:12]
+        os.environ[RUN_ENV] = _run
+        _owner = True
+    os.environ[ENV] = str(_dir)
+    _on = True
+    atexit.register(_at_exit)
+
+def _labels(kw):
+    return tuple(sorted((k, str(v)) for k, v in kw.items()))
+
+def _emit(rec):
+    line = json.dumps({"run": _run, "pid": os.getpid(), "component": _component, "t": round(time.time(), 3), **rec})
+    with _lock, open(_dir / "metrics.jsonl", "a", encoding="utf-8") as fh:
+        fh.write(line + "\n")
+
+class _Noop:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def add(self, **kw):
+        pass
+
+_NOOP = _Noop()
+
+class Span:
+    def __init__(self, name, labels):
+        self.name, self.labels, self.items = name, labels, {}
+
+    def add(self, **kw):
+        for k, v in kw.items():
+            self.items[k] = self.items.get(k, 0) + v
+
+    def __enter__(self):
+        self.t0, self.c0 = time.perf_counter(), time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self.t0
+        rec = {"type": "span", "name": self.name, "labels": dict(self.labels), "wall_s": round(wall, 6),
+               "cpu_s": round(time.process_time() - self.c0, 6), "peak_rss_mb": _peak_rss_mb(), "items": self.items,
+               "rates": {f"{k}_per_s": round(v / wall, 1) for k, v in self.items.items() if wall > 0}}
+        if exc_type is not None:
+            rec["error"] = exc_type.__name__
+        _emit(rec)
+        return False
+
+def span(name, **labels):
+    return Span(name, _labels(labels)) if _on else _NOOP
+
+def count(name, n=1, **labels):
+    if not _on or not n:
+        return
+    key = (name, _labels(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + n
+
+class TimedPattern:
+    """Compiled-regex proxy that counts calls/matches and accumulates match time."""
+
+    def __init__(self, name, rx):
+        self.name, self.rx = name, rx
+        with _lock:
+            self.stats = _regex.setdefault(name, [0, 0, 0.0])
+
+    def _timed(self, fn, *args):
+        t = time.perf_counter()
+        m = fn(*args)
+        st = self.stats
+        st[0] += 1; st[2] += time.perf_counter() - t
+        if m:
+            st[1] += 1
+        return m
+
+    def search(self, *args):
+        return self._timed(self.rx.search, *args)
+
+    def match(self, *args):
+        return self._timed(self.rx.match, *args)
+
+    def fullmatch(self, *args):
+        return self._timed(self.rx.fullmatch, *args)
+
+    def __getattr__(self, attr):
+        return getattr(self.rx, attr)
+
+def pattern(name, rx):
+    return TimedPattern(name, rx) if _on else rx
+
+def flush():
+    """Write counter/regex deltas accumulated in this process to metrics.jsonl."""
+    if not _on:
+        return
+    with _lock:
+        counters = dict(_counters)
+        _counters.clear()
+        regex = {k: v[:] for k, v in _regex.items() if v[0]}
+        for v in _regex.values():
+            v[0] = v[1] = 0; v[2] = 0.0
+    for (name, labels), value in counters.items():
+        _emit({"type": "counter", "name": name, "labels": dict(labels), "value": value})
+    for name, (calls, matches, secs) in regex.items():
+        _emit({"type": "regex", "name": name, "calls": calls, "matches": matches, "seconds": round(secs, 6)})
+
+def _esc(v):
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+def _fmt(metric, labels, value):
+    lab = ",".join(f'{k}="{_esc(v)}"' for k, v in sorted(labels.items()))
+    return f"{metric}{{{lab}}} {value}"
+
+def write_prom(path=None, run=None):
+    """Aggregate all metrics.jsonl lines of `run` into a Prometheus textfile; returns its path."""
+    run = run or _run
+    path = Path(path or _dir / f"{_component}.prom")
+    spans, counters, regex = {}, {}, {}
+    with open(_dir / "metrics.jsonl", encoding="utf-8") as fh:
+        for line in fh:
+            rec = json.loads(line)
+            if rec.get("run") != run:
+                continue
+            if rec["type"] == "span":
+                s = spans.setdefault(rec["name"], {"n": 0, "wall": 0.0, "cpu": 0.0, "rss": 0.0, "items": {}})
+                s["n"] += 1; s["wall"] += rec["wall_s"]; s["cpu"] += rec["cpu_s"]; s["rss"] = max(s["rss"], rec["peak_rss_mb"])
+                for k, v in rec["items"].items():
+                    s["items"][k] = s["items"].get(k, 0) + v
+            elif rec["type"] == "counter":
+                key = (rec["name"], tuple(sorted(rec["labels"].items())))
+                counters[key] = counters.get(key, 0) + rec["value"]
+            elif rec["type"] == "regex":
+                r = regex.setdefault(rec["name"], [0, 0, 0.0])
+                r[0] += rec["calls"]; r[1] += rec["matches"]; r[2] += rec["seconds"]
+    comp = {"component": _component}
+    out = ["# TYPE regulqa_spans_total counter", "# TYPE regulqa_span_wall_seconds_total counter",
+           "# TYPE regulqa_span_cpu_seconds_total counter", "# TYPE regulqa_span_peak_rss_bytes gauge",
+           "# TYPE regulqa_span_items_total counter"]
+    for name, s in sorted(spans.items()):
+        lab = {**comp, "span": name}
+        out += [_fmt("regulqa_spans_total", lab, s["n"]), _fmt("regulqa_span_wall_seconds_total", lab, round(s["wall"], 6)),
+                _fmt("regulqa_span_cpu_seconds_total", lab, round(s["cpu"], 6)),
+                _fmt("regulqa_span_peak_rss_bytes", lab, int(s["rss"] * 2**20))]
+        out += [_fmt("regulqa_span_items_total", {**lab, "unit": k}, v) for k, v in sorted(s["items"].items())]
+    out.append("# TYPE regulqa_events_total counter")
+    out += [_fmt("regulqa_events_total", {**comp, "name": name, **dict(labels)}, v) for (name, labels), v in sorted(counters.items())]
+    out += ["# TYPE regulqa_regex_calls_total counter", "# TYPE regulqa_regex_matches_total counter",
+            "# TYPE regulqa_regex_seconds_total counter"]
+    for name, (calls, matches, secs) in sorted(regex.items()):
+        lab = {**comp, "pattern": name}
+        out += [_fmt("regulqa_regex_calls_total", lab, calls), _fmt("regulqa_regex_matches_total", lab, matches),
+                _fmt("regulqa_regex_seconds_total", lab, round(secs, 6))]
+    out += ["# TYPE regulqa_last_run_timestamp_seconds gauge", _fmt("regulqa_last_run_timestamp_seconds", comp, int(time.time()))]
+    tmp = path.with_name(path.name + ".part")
+    tmp.write_text("\n".join(out) + "\n"); tmp.replace(path)
+    return path
+
+def _at_exit():
+    flush()
+    if _owner:
+        write_prom()
+
+if os.environ.get(ENV):
+    enable(None if os.environ[ENV] == "1" else os.environ[ENV])
@@ -0,0 +1,360 @@
+"""
+Near-duplicate detection for the unified pool (shingling → MinHash → LSH).
+
+Usage:
+  python src/data/near_dup.py [--threshold 0.8] [--rebuild]
+
+Texts are normalized (case-folded, digits folded to 0, punctuation/hyphens and
+whitespace collapsed; letters of any script are kept) and cut into character
+k-gram shingles (of the UTF-8 bytes). Each text gets a
+MinHash signature (one-permutation hashing: each shingle is hashed once and
+binned, empty bins are filled by rotation densification), so signing costs one
+sort per batch instead of num_perm hash passes. LSH banding proposes candidate pairs, which are kept only if
+the signature agreement (estimated Jaccard) reaches the threshold. Accepted
+pairs are merged with union-find, the earliest inserted row of a cluster being
+its canonical representative. Each band bucket keeps only the first row that
+landed in it, and a new row is compared with that row alone: a row similar
+to a later member of the bucket but not to its first one is not merged
+through that bucket (it usually still meets the cluster through another
+band). Texts that normalize to nothing (punctuation only) stay singletons.
+
+The index is incremental: near_dup_index.npz keeps the band tables and the
+union-find forest, and the signatures sit in a memory-mapped file next to it
+(near_dup_index.<token>.sigs, grown by doubling), so a rebuild only hashes rows
+whose id is new and RAM does not scale with the signature matrix. Each band
+table is a few sorted runs merged log-structured style, so a batch costs its own
+size times log n rather than a re-sort of the whole table. Rows that
+left the pool stay indexed but are left out of the cluster table; a cluster
+whose canonical row left is re-rooted at its earliest remaining member.
+Output: data/interim/near_dup_clusters.parquet (id, cluster_id, canonical_id, is_canonical).
+"""
+from pathlib import Path
+import re, sys, uuid
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import storage
+
+ROOT = Path(__file__).resolve().parents[2]
+INTERIM = ROOT / "data" / "interim"
+PROCESSED = ROOT / "data" / "processed"
+POOL = PROCESSED / "regulqa_ambig_pool.parquet"
+INDEX = INTERIM / "near_dup_index.npz"
+CLUSTERS = INTERIM / "near_dup_clusters.parquet"
+VERSION = 3                 # bump when normalize()/signatures/layout change; a stored index of another version is rebuilt
+
+_EMPTY = np.uint32(0xFFFFFFFF)
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+_NON_WORD = re.compile(r"[\W_]+")
+_DIGITS = re.compile(r"\d+")
+
+def normalize(text):
+    """Fold case, numbers, punctuation/hyphens and whitespace so trivial variants collide."""
+    s = _DIGITS.sub("0", str(text).casefold())
+    return _NON_WORD.sub(" ", s).strip()
+
+def _shingle_ids(texts, k=5):
+    """Character k-grams (k <= 8) of normalize(text) as exact 64-bit ids, for a whole batch.
+
+    Returns (ids, counts): ids of text i are the next counts[i] entries. Texts
+    shorter than k are space-padded to one shingle. Ids may repeat within a
+    text, which doesn't change a MinHash minimum.
+    """
+    enc = [normalize(t).ljust(k).encode("utf-8") for t in texts]
+    lens = np.fromiter(map(len, enc), dtype=np.int64, count=len(enc))
+    buf = np.frombuffer(b"".join(enc), dtype=np.uint8).astype(np.uint64)
+    n = len(buf) - k + 1
+    x = buf[:n].copy()
+    for j in range(1, k):
+        x = (x << np.uint64(8)) | buf[j:j + n]
+    counts = lens - k + 1
+    ends = np.cumsum(counts)
+    starts = np.cumsum(lens) - lens
+    pos = np.repeat(starts, counts) + np.arange(ends[-1] if len(ends) else 0) - np.repeat(ends - counts, counts)
+    return x[pos], counts
+
+def shingles(text, k=5):
+    """Distinct shingle ids of one text."""
+    return np.unique(_shingle_ids([text], k)[0])
+
+def optimal_bands(threshold, num_perm):
+    """(bands, rows) with bands*rows <= num_perm whose S-curve midpoint (1/b)^(1/r) is closest to threshold."""
+    best = None
+    for r in range(1, num_perm + 1):
+        b = num_perm // r
+        err = abs((1.0 / b) ** (1.0 / r) - threshold)
+        if best is None or err < best[0]:
+            best = (err, b, r)
+    return best[1], best[2]
+
+class NearDupIndex:
+    """Incremental MinHash-LSH index with union-find clustering.
+
+    With `store` (the index path) signatures live in a memory-mapped file next to it
+    (<stem>.<token>.sigs, grown geometrically); otherwise in RAM.
+    """
+
+    def __init__(self, threshold=0.8, num_perm=128, k=5, seed=1, store=None):
+        self.threshold, self.num_perm, self.k, self.seed = float(threshold), int(num_perm), int(k), int(seed)
+        if not 1 <= self.k <= 8:
+            raise ValueError("k must be in 1..8 (shingles are packed into 64 bits)")
+        self._bin_bits = self.num_perm.bit_length() - 1
+        if 1 << self._bin_bits != self.num_perm:
+            raise ValueError("num_perm must be a power of two")
+        self._salt = np.random.RandomState(seed).randint(0, 1 << 62, dtype=np.uint64)
+        self.bands, self.rows = optimal_bands(self.threshold, self.num_perm)
+        self._mix = np.uint64(1099511628211) ** np.arange(self.rows, dtype=np.uint64)
+        self.keys, self.version = [], VERSION
+        self._sigs = np.zeros((0, num_perm), dtype=np.uint32)   # capacity rows; the first len(keys) are used
+        self._parent = np.zeros(0, dtype=np.int64)
+        self._file = None
+        if store is not None:
+            self._file = Path(store).with_name(f"{Path(store).stem}.{uuid.uuid4().hex[:8]}.sigs")
+        # per band: sorted runs of (bucket hashes, first item that landed in each bucket); a value is in one run
+        self.tables = [[] for _ in range(self.bands)]
+        self._blank = self._oph([""])[0]            # signature of any text that normalizes to ""
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def sigs(self):
+        return self._sigs[:len(self.keys)]
+
+    @property
+    def parent(self):
+        return self._parent[:len(self.keys)]
+
+    def _reserve(self, n):
+        """Grow signature/parent capacity to at least n rows (doubling)."""
+        cap = len(self._sigs)
+        if n <= cap:
+            return
+        cap = max(n, 2 * cap, 1024)
+        parent = np.zeros(cap, dtype=np.int64); parent[:len(self)] = self.parent
+        self._parent = parent
+        if self._file is None:
+            sigs = np.zeros((cap, self.num_perm), dtype=np.uint32); sigs[:len(self)] = self.sigs
+            self._sigs = sigs
+            return
+        if isinstance(self._sigs, np.memmap):
+            self._sigs.flush()
+        self._sigs = None
+        with open(self._file, "r+b" if self._file.exists() else "w+b") as fh:
+            fh.truncate(cap * self.num_perm * 4)
+        self._sigs = np.memmap(self._file, dtype=np.uint32, mode="r+", shape=(cap, self.num_perm))
+
+    def signatures(self, texts, block=1 << 20):
+        """MinHash signatures (n × num_perm, uint32) for a batch of texts."""
+        texts = list(texts)
+        return np.concatenate([self._oph(texts[i:i + block]) for i in range(0, len(texts), block)]
+                              or [np.zeros((0, self.num_perm), dtype=np.uint32)])
+
+    def _oph(self, texts):
+        ids, counts = _shingle_ids(texts, self.k)
+        n, bits = len(texts), self._bin_bits
+        h = (ids ^ self._salt) * _GOLDEN                      # splitmix64-style finalizer
+        h ^= h >> np.uint64(29); h *= np.uint64(0xBF58476D1CE4E5B9); h ^= h >> np.uint64(32)
+        # one sort key: text (high bits) | bin | 32-bit value → the first of each (text, bin) is its minimum
+        text = np.repeat(np.arange(n, dtype=np.uint64), counts)
+        key = (text << np.uint64(32 + bits)) | ((h >> np.uint64(64 - bits)) << np.uint64(32)) | (h & np.uint64(0xFFFFFFFF))
+        key.sort()
+        cell = key >> np.uint64(32)
+        first = np.ones(len(key), dtype=bool); first[1:] = cell[1:] != cell[:-1]
+        sig = np.full(n * self.num_perm, _EMPTY, dtype=np.uint32)
+        sig[cell[first].astype(np.int64)] = (key[first] & np.uint64(0xFFFFFFFF)).astype(np.uint32)
+        sig = sig.reshape(n, self.num_perm)
+        empty = sig == _EMPTY
+        if empty.any():
+            # rotation densification: an empty bin copies the next non-empty bin (circularly) plus an offset
+            m = self.num_perm
+            col = np.where(~empty, np.arange(m), 2 * m)
+            col = np.concatenate([col, np.where(col < m, col + m, 2 * m)], axis=1)
+            nxt = np.minimum.accumulate(col[:, ::-1], axis=1)[:, ::-1][:, :m]
+            src = np.take_along_axis(sig, nxt % m, axis=1)
+            sig = np.where(empty, src + (nxt - np.arange(m)).astype(np.uint32) * np.uint32(0x9E3779B1), sig)
+        return sig
+
+    def _band_keys(self, sigs):
+        s = sigs[:, :self.bands * self.rows].astype(np.uint64).reshape(len(sigs), self.bands, self.rows)
+        return (s * self._mix).sum(axis=2)          # (n, bands), wrap-around mix
+
+    def _find(self, i):
+        p = self._parent
+        root = i
+        while p[root] != root:
+            root = p[root]
+        while p[i] != root:
+            p[i], i = root, p[i]
+        return root
+
+    def _find_many(self, idx):
+        """Roots of the items in `idx` (vectorized, one parent step per round; the paths are compressed)."""
+        p = self._parent
+        r = p[idx]
+        while True:
+            nxt = p[r]
+            if (nxt == r).all():
+                break
+            r = nxt
+        p[idx] = r
+        return r
+
+    def _union(self, i, j):
+        ri, rj = self._find(i), self._find(j)
+        if ri != rj:
+            # earliest row stays canonical
+            lo, hi = (ri, rj) if ri < rj else (rj, ri)
+            self._parent[hi] = lo
+
+    def _lookup(self, band, values):
+        """(found mask, first item) of sorted unique bucket hashes `values` in a band's runs."""
+        known, rep = np.zeros(len(values), dtype=bool), np.zeros(len(values), dtype=np.int64)
+        for h, f in self.tables[band]:
+            pos = np.minimum(np.searchsorted(h, values), len(h) - 1)
+            hit = h[pos] == values
+            known |= hit; rep[hit] = f[pos[hit]]
+        return known, rep
+
+    def _push(self, band, h, f):
+        """Add a sorted run of new bucket hashes; merge runs while the older one is at most twice as long."""
+        runs = self.tables[band]
+        runs.append((h, f))
+        while len(runs) > 1 and len(runs[-2][0]) <= 2 * len(runs[-1][0]):
+            (ah, af), (bh, bf) = runs[-2], runs.pop()
+            pos = np.searchsorted(ah, bh)
+            runs[-1] = (np.insert(ah, pos, bh), np.insert(af, pos, bf))
+
+    def add(self, keys, texts, block=1 << 16):
+        """Insert a batch; returns the canonical position of every new item.
+
+        Candidates are checked against the first item of each shared band bucket only (module docstring).
+        """
+        keys = list(keys)
+        if not keys:
+            return np.zeros(0, dtype=np.int64)
+        base, n = len(self.keys), len(keys)
+        sigs = self.signatures(texts)
+        self._reserve(base + n)
+        self._sigs[base:base + n] = sigs
+        self._parent[base:base + n] = np.arange(base, base + n)
+        self.keys.extend(keys)
+        bkeys = self._band_keys(sigs)
+        live = np.flatnonzero(~(sigs == self._blank).all(axis=1))     # blank texts never enter the buckets
+        need = self.threshold * self.num_perm
+        for band in range(self.bands):
+            uniq, first_idx, inv = np.unique(bkeys[live, band], return_index=True, return_inverse=True)
+            known, rep = self._lookup(band, uniq)
+            # representative of each bucket value: an existing item, else the batch's first
+            reps = np.where(known, rep, base + live[first_idx])[inv]
+            cand = np.flatnonzero(reps != base + live)
+            for c in range(0, len(cand), block):
+                i, j = live[cand[c:c + block]], reps[cand[c:c + block]]
+                sim = np.count_nonzero(sigs[i] == self._sigs[j], axis=1) >= need
+                for a, b in zip(base + i[sim], j[sim]):
+                    self._union(int(a), int(b))
+            if (~known).any():
+                self._push(band, uniq[~known], base + live[first_idx[~known]])
+        return self._find_many(np.arange(base, base + n))
+
+    def clusters(self, live=None):
+        """DataFrame(id, cluster_id, canonical_id, is_canonical) over everything indexed, or only the ids in `live`.
+
+        A root is the earliest row of its cluster; when it is not live, the earliest live member takes its place.
+        """
+        roots = self.parent.copy()
+        while True:                                 # pointer jumping: every item reaches its root in log(depth) rounds
+            nxt = roots[roots]
+            if (nxt == roots).all():
+                break
+            roots = nxt
+        self._parent[:len(roots)] = roots
+        keys = np.array(self.keys, dtype=object)
+        pos = np.arange(len(keys))
+        if live is not None:
+            keep = np.fromiter((k in live for k in self.keys), dtype=bool, count=len(keys))
+            pos, roots = pos[keep], roots[keep]
+            roots = pd.Series(pos).groupby(roots).transform("min").to_numpy(dtype=np.int64)
+        return pd.DataFrame({"id": keys[pos], "cluster_id": roots, "canonical_id": keys[roots],
+                             "is_canonical": roots == pos})
+
+    def save(self, path=INDEX):
+        """Write the index to `path` (.npz) and its signature file; stale signature files of `path` are removed."""
+        path = Path(path)
+        sig_file = self._file
+        if sig_file is None or sig_file.parent != path.parent or not sig_file.name.startswith(path.stem + "."):
+            sig_file = path.with_name(f"{path.stem}.{uuid.uuid4().hex[:8]}.sigs")
+            self.sigs.tofile(sig_file)
+        elif isinstance(self._sigs, np.memmap):
+            self._sigs.flush()
+        else:
+            sig_file.touch()                        # nothing added yet
+        tables = [(np.concatenate([h for h, _ in runs] or [np.zeros(0, np.uint64)]),
+                   np.concatenate([f for _, f in runs] or [np.zeros(0, np.int64)])) for runs in self.tables]
+        tables = [(h[o], f[o]) for h, f in tables for o in [np.argsort(h, kind="stable")]]
+        self.tables = [[t] if len(t[0]) else [] for t in tables]
+        arrays = {f"h{b}": h for b, (h, _) in enumerate(tables)}
+        arrays.update({f"f{b}": f for b, (_, f) in enumerate(tables)})
+        tmp = path.with_name(path.name + ".tmp.npz")
+        np.savez(tmp, version=np.int64(VERSION), sig_file=np.array(sig_file.name), parent=self.parent,
+                 keys=np.array(self.keys, dtype=str), params=np.array([self.threshold, self.num_perm, self.k, self.seed]),
+                 **arrays)
+        tmp.replace(path)
+        for old in path.parent.glob(f"{path.stem}.*.sigs"):
+            if old.name != sig_file.name:
+                old.unlink()
+
+    @classmethod
+    def load(cls, path=INDEX):
+        path = Path(path)
+        z = np.load(path, allow_pickle=False)
+        threshold, num_perm, k, seed = z["params"]
+        idx = cls(threshold, int(num_perm), int(k), int(seed))
+        idx.version = int(z["version"]) if "version" in z.files else 1
+        if idx.version != VERSION:
+            return idx                              # older layout: the caller rebuilds
+        idx.keys = z["keys"].tolist()
+        idx._file = path.with_name(str(z["sig_file"]))
+        cap = idx._file.stat().st_size // (4 * idx.num_perm)
+        if cap:
+            idx._sigs = np.memmap(idx._file, dtype=np.uint32, mode="r+", shape=(cap, idx.num_perm))
+        idx._parent = np.zeros(cap, dtype=np.int64); idx._parent[:len(idx.keys)] = z["parent"]
+        idx.tables = [[(z[f"h{b}"], z[f"f{b}"])] if len(z[f"h{b}"]) else [] for b in range(idx.bands)]
+        return idx
+
+def cluster_pool(pool=POOL, out=CLUSTERS, index_path=INDEX, threshold=0.8, rebuild=False, chunksize=100_000):
+    """Index (new rows of) the pool and write the cluster table."""
+    idx = None
+    if not rebuild and Path(index_path).exists():
+        idx = NearDupIndex.load(index_path)
+        if abs(idx.threshold - threshold) > 1e-9:
+            print("Threshold changed → rebuilding index"); idx = None
+        elif idx.version != VERSION:
+            print("Index from an older normalization → rebuilding"); idx = None
+    idx = idx or NearDupIndex(threshold, store=index_path)
+    known, live = set(idx.keys), set()
+    added = 0
+    for chunk in storage.iter_batches(pool, columns=["id", "req_text"], batch_size=chunksize):
+        ids = chunk["id"].astype(str)
+        live.update(ids)
+        chunk = chunk[~ids.isin(known)]
+        if chunk.empty: continue
+        idx.add(chunk["id"].astype(str), chunk["req_text"].astype(str))
+        added += len(chunk)
+    idx.save(index_path)
+    df = idx.clusters(live)
+    storage.write_table(df, out)
+    dup = int((~df["is_canonical"]).sum())
+    print("Near-dup index:", len(idx), "rows (+%d new, %d not in the pool)," % (added, len(idx) - len(df)), "clusters:", int(df["is_canonical"].sum()),
+          "near-duplicates:", dup, "→", out)
+    return df
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pool", default=str(POOL))
+    ap.add_argument("--threshold", type=float, default=0.8, help="Jaccard threshold on shingle sets")
+    ap.add_argument("--rebuild", action="store_true", help="Ignore the stored index")
+    args = ap.parse_args()
+    cluster_pool(args.pool, threshold=args.threshold, rebuild=args.rebuild)
@@ -0,0 +1,411 @@
+"""
+Single-pass profile of the pool → data/interim/pool_profile.json.
+
+Usage:
+  python src/data/pool_profile.py [--input data/processed/regulqa_ambig_pool.parquet] [--full] [--top 20]
+
+One scan over storage.iter_batches computes
+- a histogram per column: exact up to MAX_EXACT distinct values, then a
+  Misra-Gries top-k (HIGH_CARD columns such as `id` start there), plus a
+  HyperLogLog distinct count, so `id`/`notes` never become full count tables
+- the cross-tabs in CROSSTABS (sector × ambig_presence, tier × ambig_type)
+- req_text length quantiles from a log-bucket sketch (~1% relative error) and a histogram
+- per-heuristic hit rates (bootstrap_v1_labels.scan)
+Rows whose ambig_presence is empty take the weak labels, so the raw pool
+profiles like the labeled set.
+
+The sketch state is kept in pool_profile_state.json, and what each profiled
+row contributed to the label-side counts (by id: a hash of the row, its rule
+mask, length, weak flag and its LEDGER_COLS values) in
+pool_profile_state.sqlite. A rerun hashes every row but only profiles rows
+whose id is new or whose hash changed (e.g. labels merged back from Label
+Studio), wherever they sit in the table; a changed or departed row first has
+its old contribution subtracted. Subtraction is exact for the LEDGER_COLS
+columns, cross-tabs, hit rates and length quantiles. The other columns (id,
+notes, document, …) are sketch-only: each id counts once, with the values it
+was first profiled with, and departed rows stay in them, as they do in the
+HyperLogLog distinct counts and the length min/max.
+Ids are taken to be unique, as in the pool; tables without an id column are
+rescanned every time (--full forces a rescan).
+"""
+from pathlib import Path
+import base64, json, math, os, sqlite3, sys
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import rule_cache, storage
+
+ROOT = Path(__file__).resolve().parents[2]
+INTERIM = ROOT / "data" / "interim"
+PROCESSED = ROOT / "data" / "processed"
+POOL = PROCESSED / "regulqa_ambig_pool.parquet"
+REPORT = INTERIM / "pool_profile.json"
+STATE = INTERIM / "pool_profile_state.json"
+
+VERSION = 2
+TEXT = "req_text"
+LABEL_COLS = ["ambig_presence", "ambig_type", "reg_clause", "severity", "notes"]
+CROSSTABS = [("sector", "ambig_presence"), ("tier", "ambig_type")]
+HIGH_CARD = ("id",)
+LEDGER_COLS = ["ambig_presence", "ambig_type", "reg_clause", "severity", "sector", "tier"]   # subtractable
+MAX_EXACT = 1000            # distinct values kept exactly before a column falls back to top-k
+TOP_K = 100                 # Misra-Gries counters per high-cardinality column
+HLL_P = 12                  # 4096 registers, ~1.6% standard error
+GAMMA = 1.02                # length sketch bucket ratio
+LEN_BINS = [0, 20, 50, 100, 150, 200, 300, 500, 1000]
+SEP = "\x1f"
+
+def _norm(s):
+    return s.astype(object).fillna("").astype(str).str.strip()
+
+class HLL:
+    def __init__(self, regs=None):
+        self.regs = np.zeros(1 << HLL_P, dtype=np.uint8) if regs is None else regs
+
+    def add(self, values):
+        if not len(values):
+            return
+        h = pd.util.hash_array(np.asarray(values, dtype=object))
+        idx = (h >> np.uint64(64 - HLL_P)).astype(np.int64)
+        rest = h & np.uint64((1 << (64 - HLL_P)) - 1)
+        bits = np.frexp(rest.astype(np.float64))[1]             # bit length (0 for rest == 0)
+        np.maximum.at(self.regs, idx, (64 - HLL_P - bits + 1).astype(np.uint8))
+
+    def count(self):
+        m = len(self.regs)
+        est = 0.7213 / (1 + 1.079 / m) * m * m / np.sum(np.ldexp(1.0, -self.regs.astype(np.int64)))
+        zeros = int((self.regs == 0).sum())
+        if est <= 2.5 * m and zeros:
+            est = m * math.log(m / zeros)
+        return int(round(est))
+
+class Column:
+    """Exact counts until MAX_EXACT distinct values, then Misra-Gries top-k (counts are lower bounds)."""
+
+    def __init__(self, exact=True):
+        self.counts, self.exact, self.err, self.n, self.hll = {}, exact, 0, 0, HLL()
+
+    def update(self, vals, sign=1):
+        """Add (sign=1) or remove (sign=-1) values; removal leaves the HLL as it is."""
+        vc = vals.value_counts(sort=False)
+        self.n += sign * len(vals)
+        if sign < 0:
+            for v, c in vc.items():
+                k = self.counts.get(v, 0) - int(c)
+                if k > 0: self.counts[v] = k
+                else: self.counts.pop(v, None)
+            return
+        self.hll.add(vc.index.to_numpy())
+        for v, c in vc.items():
+            self.counts[v] = self.counts.get(v, 0) + int(c)
+        if self.exact and len(self.counts) > MAX_EXACT:
+            self.exact = False
+        if not self.exact and len(self.counts) > TOP_K:
+            cut = sorted(self.counts.values(), reverse=True)[TOP_K]
+            self.counts = {v: c - cut for v, c in self.counts.items() if c > cut}
+            self.err += cut
+
+    def distinct(self):
+        return len(self.counts) if self.exact else self.hll.count()
+
+    def state(self):
+        return {"counts": self.counts, "exact": self.exact, "err": self.err, "n": self.n,
+                "hll": base64.b64encode(self.hll.regs.tobytes()).decode()}
+
+    @classmethod
+    def from_state(cls, st):
+        col = cls(st["exact"])
+        col.counts, col.err, col.n = st["counts"], st["err"], st["n"]
+        col.hll = HLL(np.frombuffer(base64.b64decode(st["hll"]), dtype=np.uint8).copy())
+        return col
+
+class Lengths:
+    """Log-bucket quantile sketch plus a fixed histogram of text lengths."""
+
+    def __init__(self):
+        self.buckets, self.hist, self.n, self.total, self.min, self.max = {}, [0] * len(LEN_BINS), 0, 0, None, None
+
+    def update(self, lens, sign=1):
+        """Add (sign=1) or remove (sign=-1) lengths; removal keeps min/max as bounds."""
+        if not len(lens):
+            return
+        b = np.where(lens > 0, np.ceil(np.log(np.maximum(lens, 1)) / math.log(GAMMA)), -1).astype(np.int64)
+        for k, c in zip(*np.unique(b, return_counts=True)):
+            n = self.buckets.get(int(k), 0) + sign * int(c)
+            if n > 0: self.buckets[int(k)] = n
+            else: self.buckets.pop(int(k), None)
+        idx = np.searchsorted(LEN_BINS, lens, side="right") - 1
+        for k, c in zip(*np.unique(idx, return_counts=True)):
+            self.hist[int(k)] += sign * int(c)
+        self.n += sign * len(lens); self.total += sign * int(lens.sum())
+        if sign < 0:
+            return
+        lo, hi = int(lens.min()), int(lens.max())
+        self.min = lo if self.min is None else min(self.min, lo)
+        self.max = hi if self.max is None else max(self.max, hi)
+
+    def quantile(self, q):
+        rank, seen = q * (self.n - 1), 0
+        for k in sorted(self.buckets):
+            seen += self.buckets[k]
+            if seen > rank:
+                return 0 if k < 0 else round(2 * GAMMA ** k / (GAMMA + 1), 1)
+        return self.max
+
+    def state(self):
+        return {k: getattr(self, k) for k in ("buckets", "hist", "n", "total", "min", "max")}
+
+    @classmethod
+    def from_state(cls, st):
+        ln = cls()
+        for k, v in st.items():
+            setattr(ln, k, v)
+        ln.buckets = {int(k): v for k, v in st["buckets"].items()}
+        return ln
+
+class Profile:
+    """Mergeable profile state; update() folds in one batch."""
+
+    def __init__(self):
+        self.rows, self.weak, self.any_hit = 0, 0, 0
+        self.cols, self.tabs, self.hits, self.lengths = {}, {f"{a}|{b}": {} for a, b in CROSSTABS}, {}, Lengths()
+
+    def update(self, df, masks=None):
+        """Add a batch; `masks` are bootstrap_v1_labels.scan() bitmasks of its req_text if already computed."""
+        if len(df):
+            self.apply(*self.prepare(df, masks))
+        return self
+
+    def prepare(self, df, masks=None):
+        """What a batch counts as: (column values with weak labels filled in, masks, lengths, weak-labeled rows)."""
+        df = df.reset_index(drop=True)
+        cols = {c: _norm(df[c]) for c in df.columns if c != TEXT}
+        lens, weak = None, np.zeros(len(df), dtype=bool)
+        if TEXT in df.columns:
+            texts = df[TEXT].astype(object).fillna("").astype(str)
+            lab = rule_cache.labeler()
+            masks = lab.scan(texts.tolist()) if masks is None else np.asarray(masks)
+            lens = texts.str.len().to_numpy()
+            empty = cols.get("ambig_presence", pd.Series("", index=df.index)).eq("")
+            if empty.any():
+                filled = lab.labels_from_masks(masks[empty.to_numpy()])
+                for c in LABEL_COLS:
+                    col = cols.get(c, pd.Series("", index=df.index)).copy()
+                    col[empty] = filled[c].to_numpy()
+                    cols[c] = col
+                weak = empty.to_numpy()
+        return cols, (masks if lens is not None else None), lens, weak
+
+    def apply(self, cols, masks, lens, weak, sign=1):
+        """Fold prepare() output in (sign=1) or take it back out (sign=-1)."""
+        if lens is not None:
+            lab = rule_cache.labeler()
+            for name, n in lab.hit_counts(masks).items():
+                self.hits[name] = self.hits.get(name, 0) + sign * n
+            self.any_hit += sign * int((masks & ((1 << len(lab.heuristics)) - 1) != 0).sum())
+            self.lengths.update(lens, sign)
+        self.weak += sign * int(weak.sum())
+        for c, vals in cols.items():
+            if c not in self.cols:
+                self.cols[c] = Column(exact=c not in HIGH_CARD)
+            self.cols[c].update(vals, sign)
+        for a, b in CROSSTABS:
+            if a in cols and b in cols:
+                tab = self.tabs[f"{a}|{b}"]
+                for k, c in (cols[a] + SEP + cols[b]).value_counts(sort=False).items():
+                    n = tab.get(k, 0) + sign * int(c)
+                    if n > 0: tab[k] = n
+                    else: tab.pop(k, None)
+        self.rows += sign * len(weak)
+
+    def report(self, top=20):
+        out = {"rows": self.rows, "weak_labeled_rows": self.weak, "columns": {}, "crosstabs": {}}
+        for c, col in self.cols.items():
+            items = sorted(col.counts.items(), key=lambda kv: (-kv[1], kv[0]))[:top]
+            out["columns"][c] = {"distinct": col.distinct(), "exact": col.exact,
+                                 "top": [[v, n, round(100 * n / max(col.n, 1), 2)] for v, n in items]}
+            if not col.exact:
+                out["columns"][c]["count_error_max"] = col.err
+        for key, tab in self.tabs.items():
+            nested = {}
+            for k, n in sorted(tab.items()):
+                a, b = k.split(SEP, 1)
+                nested.setdefault(a, {})[b] = n
+            out["crosstabs"][key.replace("|", " x ")] = nested
+        ln = self.lengths
+        if ln.n:
+            edges = LEN_BINS + [None]
+            out["req_text_length"] = {
+                "mean": round(ln.total / ln.n, 1), "min": ln.min, "max": ln.max,
+                "quantiles": {f"p{int(q * 100)}": ln.quantile(q) for q in (0.05, 0.25, 0.5, 0.75, 0.95, 0.99)},
+                "histogram": {f"{lo}-{hi}" if hi else f"{lo}+": n for lo, hi, n in zip(edges, edges[1:], ln.hist)},
+            }
+            out["heuristics"] = {"rows_hit": self.any_hit, "rate": round(self.any_hit / self.rows, 4),
+                                 "rules": {k: {"hits": n, "rate": round(n / self.rows, 4)} for k, n in self.hits.items()}}
+        return out
+
+    def state(self):
+        return {"rows": self.rows, "weak": self.weak, "any_hit": self.any_hit, "hits": self.hits, "tabs": self.tabs,
+                "lengths": self.lengths.state(), "cols": {c: col.state() for c, col in self.cols.items()}}
+
+    @classmethod
+    def from_state(cls, st):
+        p = cls()
+        p.rows, p.weak, p.any_hit, p.hits, p.tabs = st["rows"], st["weak"], st["any_hit"], st["hits"], st["tabs"]
+        p.lengths = Lengths.from_state(st["lengths"])
+        p.cols = {c: Column.from_state(s) for c, s in st["cols"].items()}
+        return p
+
+def format_report(rep, top=10):
+    lines = [f"Rows: {rep['rows']} (weak-labeled: {rep['weak_labeled_rows']})"]
+    for c, info in rep["columns"].items():
+        shown = ", ".join(f"{v or '∅'}={n}" for v, n, _ in info["top"][:top])
+        lines.append(f"{c} [{'' if info['exact'] else '~'}{info['distinct']} distinct]: {shown}")
+    for key, tab in rep["crosstabs"].items():
+        lines.append(f"{key}:")
+        lines += [f"  {a or '∅'}: " + ", ".join(f"{b or '∅'}={n}" for b, n in row.items()) for a, row in tab.items()]
+    if "req_text_length" in rep:
+        ln = rep["req_text_length"]
+        lines.append("req_text length: mean {mean} ".format(**ln) + " ".join(f"{k}={v}" for k, v in ln["quantiles"].items()))
+        h = rep["heuristics"]
+        lines.append(f"heuristics: {h['rate']:.1%} of rows hit; " +
+                     ", ".join(f"{k}={v['rate']:.1%}" for k, v in h["rules"].items()))
+    return "\n".join(lines)
+
+def _signature(path):
+    lab = rule_cache.labeler()
+    rules = json.dumps([lab.heuristics, lab.severity_terms], sort_keys=True)
+    return {"version": VERSION, "input": str(Path(path).name), "pandas": pd.__version__,
+            "rules": rule_cache.rule_hash(rules), "max_exact": MAX_EXACT, "top_k": TOP_K}
+
+class RowLedger:
+    """Per-id contribution of the profiled rows (SQLite): row hash, rule mask, text length, weak flag, LEDGER_COLS values."""
+
+    def __init__(self, path, columns):
+        self.columns = [c for c in columns if c in LEDGER_COLS]
+        self.db = sqlite3.connect(str(path))
+        self.db.execute("CREATE TABLE IF NOT EXISTS rows (id TEXT PRIMARY KEY, h INTEGER, mask INTEGER, len INTEGER, "
+                        "weak INTEGER, vals TEXT)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.db.execute("CREATE TEMP TABLE batch (id TEXT PRIMARY KEY, h INTEGER)")
+        self.db.execute("CREATE TEMP TABLE seen (id TEXT PRIMARY KEY)")
+
+    def diff(self, ids, hashes):
+        """Positions of a batch's rows to profile, and the stored rows (ids) to take out first."""
+        self.db.executemany("INSERT OR REPLACE INTO batch VALUES (?, ?)", zip(ids, hashes))
+        self.db.execute("INSERT OR IGNORE INTO seen SELECT id FROM batch")
+        rows = self.db.execute("SELECT b.id, r.h FROM batch b LEFT JOIN rows r USING (id) WHERE r.h IS NOT b.h").fetchall()
+        self.db.execute("DELETE FROM batch")
+        if not rows:
+            return [], []
+        differ = {k for k, _ in rows}
+        return [i for i, k in enumerate(ids) if k in differ], [k for k, h in rows if h is not None]
+
+    def _frame(self, recs, with_text):
+        vals = [r[4].split(SEP) for r in recs]
+        cols = {c: pd.Series([v[j] for v in vals], dtype=object) for j, c in enumerate(self.columns)}
+        masks = np.array([r[1] for r in recs], dtype=np.uint16) if with_text else None
+        lens = np.array([r[2] for r in recs], dtype=np.int64) if with_text else None
+        return cols, masks, lens, np.array([bool(r[3]) for r in recs], dtype=bool)
+
+    def fetch(self, ids, with_text):
+        recs = []
+        for i in range(0, len(ids), 900):
+            part = ids[i:i + 900]
+            recs += self.db.execute(f"SELECT id, mask, len, weak, vals FROM rows WHERE id IN ({','.join('?' * len(part))})",
+                                    part).fetchall()
+        return self._frame(recs, with_text)
+
+    def departed(self, with_text, batch_size):
+        """prepare()-style batches of stored rows whose id was not seen in this run (deleted afterwards)."""
+        cur = self.db.execute("SELECT id, mask, len, weak, vals FROM rows WHERE id NOT IN (SELECT id FROM seen)")
+        while True:
+            recs = cur.fetchmany(batch_size)
+            if not recs:
+                break
+            yield len(recs), self._frame(recs, with_text)
+        self.db.execute("DELETE FROM rows WHERE id NOT IN (SELECT id FROM seen)")
+
+    def put(self, ids, hashes, prepared):
+        cols, masks, lens, weak = prepared
+        n = len(ids)
+        vals = [SEP.join(t) for t in zip(*(cols[c].tolist() for c in self.columns))] if self.columns else [""] * n
+        masks = masks.tolist() if masks is not None else [0] * n
+        lens = lens.tolist() if lens is not None else [0] * n
+        self.db.executemany("INSERT OR REPLACE INTO rows VALUES (?, ?, ?, ?, ?, ?)",
+                            zip(ids, hashes, masks, lens, weak.astype(int).tolist(), vals))
+
+    def token(self):
+        row = self.db.execute("SELECT value FROM meta WHERE key = 'token'").fetchone()
+        return row[0] if row else None
+
+    def close(self, commit=True, token=None):
+        if token is not None:
+            self.db.execute("INSERT OR REPLACE INTO meta VALUES ('token', ?)", (token,))
+        if commit:
+            self.db.commit()
+        self.db.close()
+
+def profile(path=POOL, report=REPORT, state=STATE, full=False, top=20, batch_size=storage.ROW_GROUP):
+    state = Path(state); state.parent.mkdir(parents=True, exist_ok=True)
+    ledger_path = state.with_suffix(".sqlite")
+    sig, columns, prof = _signature(path), storage.columns_of(path), Profile()
+    keyed = "id" in columns
+    st = json.loads(state.read_text()) if not full and keyed and state.exists() and ledger_path.exists() else None
+    ledger = RowLedger(ledger_path, columns) if st else None
+    if st and st.get("signature") == sig and st.get("columns") == columns and st.get("token") == ledger.token():
+        prof = Profile.from_state(st["profile"])
+    else:
+        if ledger is not None: ledger.close(commit=False)
+        ledger_path.unlink(missing_ok=True)
+        ledger = RowLedger(ledger_path, columns) if keyed else None
+    with_text = TEXT in columns
+    added = removed = 0
+    try:
+        for df in storage.iter_batches(path, batch_size=batch_size):
+            df = df.reset_index(drop=True)
+            if ledger is None:
+                prof.update(df); added += len(df)
+                continue
+            ids = df["id"].astype(str).tolist()
+            hashes = pd.util.hash_pandas_object(df, index=False).to_numpy().view(np.int64).tolist()
+            todo, stale = ledger.diff(ids, hashes)
+            if stale:
+                prof.apply(*ledger.fetch(stale, with_text), sign=-1); removed += len(stale)
+            if todo:
+                prepared = prof.prepare(df.iloc[todo], None)
+                cols, masks, lens, weak = prepared
+                new = ~np.isin([ids[i] for i in todo], stale)            # sketch-only columns count an id once
+                prof.apply({c: v if c in ledger.columns else v[new] for c, v in cols.items()}, masks, lens, weak)
+                ledger.put([ids[i] for i in todo], [hashes[i] for i in todo], prepared)
+                added += len(todo)
+        if ledger is not None:
+            for n, old in ledger.departed(with_text, batch_size):
+                prof.apply(*old, sign=-1); removed += n
+    except BaseException:
+        if ledger is not None: ledger.close(commit=False)
+        raise
+    # the state and the ledger share a token; a crash between the two writes shows up as a mismatch → rescan
+    token = os.urandom(8).hex()
+    tmp = state.with_name(state.name + ".part")
+    tmp.write_text(json.dumps({"signature": sig, "columns": columns, "rows": prof.rows, "token": token,
+                               "profile": prof.state()}))
+    if ledger is not None:
+        ledger.close(token=token)
+    tmp.replace(state)
+    rep = {"input": str(path), **prof.report(top)}
+    Path(report).write_text(json.dumps(rep, indent=2, ensure_ascii=False))
+    print("Wrote", report, "rows:", prof.rows, "profiled:", added, "taken out:", removed)
+    return rep
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--input", default=str(POOL))
+    ap.add_argument("--report", default=str(REPORT))
+    ap.add_argument("--state", default=str(STATE))
+    ap.add_argument("--full", action="store_true", help="Ignore the saved state and rescan")
+    ap.add_argument("--top", type=int, default=20, help="Values per column in the report")
+    args = ap.parse_args()
+    print(format_report(profile(args.input, args.report, args.state, args.full, args.top)))
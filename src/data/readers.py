@@ -0,0 +1,234 @@
+"""
+Format readers for raw sources (CSV, XLSX, ARFF), shared by clean_all and collect_t3.
+
+READERS maps a file suffix to reader(path, chunksize) → (part, chunks) pairs:
+a part is one table of the file (an XLSX sheet; None for single-table formats)
+and chunks lazily yields DataFrames of at most `chunksize` rows (chunksize=None:
+one frame per part). New formats plug in with @register(".ext").
+
+- CSV: pandas C parser, falling back to the sniffing parser (as before).
+- XLSX: openpyxl read-only mode, rows streamed with iter_rows(values_only=True);
+  the header is the first non-empty row of each sheet.
+- ARFF: parsed line by line (@attribute header, dense and sparse @data rows,
+  quoted values, "?" as missing).
+
+iter_texts(path) picks the text column per part (text_column) and yields
+(document, texts). Non-CSV sources are converted once and cached as Parquet
+under data/interim/source_cache/<sha256 of content>_v<VERSION>.parquet, so rebuilds never
+reparse an unchanged workbook; the (size, mtime) → digest memo in index.json
+avoids rehashing unchanged files.
+"""
+from pathlib import Path
+import sys, json, re, hashlib
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import storage
+
+ROOT = Path(__file__).resolve().parents[2]
+CACHE = ROOT / "data" / "interim" / "source_cache"
+VERSION = 1                 # bump when a reader's output changes (invalidates the cache)
+
+TEXT_COLS = {"text","sentence","req_text","requirement","requirements","requirementtext"}
+READERS = {}
+
+def register(*exts):
+    def deco(fn):
+        for e in exts:
+            READERS[e.lower()] = fn
+        return fn
+    return deco
+
+def suffixes():
+    return sorted(READERS)
+
+def text_column(columns):
+    """First column whose name (lowercased, separators dropped) is a known text column."""
+    for c in columns:
+        name = str(c).strip().lower()
+        if name in TEXT_COLS or re.sub(r"[\s_\-]+", "", name) in TEXT_COLS:
+            return c
+    return None
+
+def _batches(rows, chunksize):
+    batch = []
+    for r in rows:
+        batch.append(r)
+        if chunksize and len(batch) >= chunksize:
+            yield batch; batch = []
+    if batch:
+        yield batch
+
+# --- CSV ---
+
+def _read_any_csv(path):
+    try:
+        return pd.read_csv(path)
+    except Exception:
+        try:
+            return pd.read_csv(path, sep=None, engine="python")
+        except Exception:
+            return None
+
+def _csv_chunks(path, chunksize):
+    """Chunked counterpart of _read_any_csv (falls back to the sniffing parser if the C parser can't start)."""
+    if not chunksize:
+        df = _read_any_csv(path)
+        if df is not None:
+            yield df
+        return
+    for kw in ({}, {"sep": None, "engine": "python"}):
+        emitted = False
+        try:
+            for chunk in pd.read_csv(path, chunksize=chunksize, **kw):
+                emitted = True
+                yield chunk
+            return
+        except Exception as e:
+            if emitted:
+                print("Truncated:", path.name, "reason:", e)
+                return
+
+@register(".csv")
+def read_csv(path, chunksize=None):
+    yield None, _csv_chunks(Path(path), chunksize)
+
+# --- XLSX ---
+
+def _sheet_chunks(ws, chunksize):
+    rows = ws.iter_rows(values_only=True)
+    header = None
+    for r in rows:
+        if any(v is not None and str(v).strip() for v in r):
+            header = [str(v).strip() if v is not None else f"col{i}" for i, v in enumerate(r)]
+            break
+    if header is None:
+        return
+    width = len(header)
+    body = (list(r[:width]) + [None] * (width - len(r)) for r in rows if any(v is not None for v in r))
+    for batch in _batches(body, chunksize):
+        yield pd.DataFrame(batch, columns=header)
+
+@register(".xlsx", ".xlsm")
+def read_xlsx(path, chunksize=None):
+    from openpyxl import load_workbook
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheets = wb.worksheets
+        for ws in sheets:
+            yield (ws.title if len(sheets) > 1 else None), _sheet_chunks(ws, chunksize)
+    finally:
+        wb.close()
+
+# --- ARFF ---
+
+_ARFF_ATTR = re.compile(r"""@attribute\s+('(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*"|\S+)\s+(.+)$""", re.I)
+_ARFF_VALUE = re.compile(r"""\s*('(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*"|[^,]*)\s*(?:,|$)""")
+_ARFF_SPARSE = re.compile(r"""\s*(\d+)\s+('(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*"|[^,}]*)\s*(?:,|\}|$)""")
+
+def _unquote(v):
+    v = v.strip()
+    if len(v) >= 2 and v[0] == v[-1] and v[0] in "'\"":
+        return re.sub(r"\\(.)", r"\1", v[1:-1])
+    return None if v == "?" else v
+
+def _arff_values(line, width):
+    if line.startswith("{"):
+        row = [None] * width
+        for idx, val in _ARFF_SPARSE.findall(line[1:]):
+            if int(idx) < width:
+                row[int(idx)] = _unquote(val)
+        return row
+    vals, pos = [], 0
+    while pos < len(line) and len(vals) < width:
+        m = _ARFF_VALUE.match(line, pos)
+        if not m or m.end() == pos:
+            break
+        vals.append(_unquote(m.group(1))); pos = m.end()
+    return vals + [None] * (width - len(vals))
+
+def _arff_chunks(fh, names, chunksize):
+    rows = (_arff_values(line.strip(), len(names)) for line in fh if line.strip() and not line.lstrip().startswith("%"))
+    for batch in _batches(rows, chunksize):
+        yield pd.DataFrame(batch, columns=names)
+
+@register(".arff")
+def read_arff(path, chunksize=None):
+    with open(path, encoding="utf-8", errors="replace") as fh:
+        names = []
+        for line in fh:
+            s = line.strip()
+            if not s or s.startswith("%"):
+                continue
+            m = _ARFF_ATTR.match(s)
+            if m:
+                names.append(_unquote(m.group(1)) or m.group(1))
+            elif s.lower().startswith("@data"):
+                break
+        if names:
+            yield None, _arff_chunks(fh, names, chunksize)
+
+# --- text extraction with the conversion cache ---
+
+def _digest(path, memo):
+    st = path.stat()
+    key = str(path.resolve())
+    hit = memo.get(key)
+    if hit and hit[:2] == [st.st_size, st.st_mtime_ns]:
+        return hit[2]
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            h.update(block)
+    memo[key] = [st.st_size, st.st_mtime_ns, h.hexdigest()]
+    return memo[key][2]
+
+def _parts(path, chunksize):
+    """(part, texts) chunks straight from the reader; parts without a text column are skipped."""
+    reader = READERS.get(path.suffix.lower())
+    if reader is None:
+        return
+    for part, chunks in reader(path, chunksize):
+        col = None
+        for df in chunks:
+            col = col or text_column(df.columns)
+            if col is None:
+                print("No text column:", path.name + (f" [{part}]" if part else ""), "columns:", list(df.columns)[:8])
+                break
+            texts = df[col].dropna()
+            if len(texts):
+                yield part, texts
+
+def _document(path, part):
+    return path.name if part is None else f"{path.name}:{part}"
+
+def iter_texts(path, chunksize=None, cache=True):
+    """(document, texts Series) chunks of a raw source; non-CSV sources go through the Parquet cache."""
+    path = Path(path)
+    if path.suffix.lower() == ".csv" or not cache:
+        for part, texts in _parts(path, chunksize):
+            yield _document(path, part), texts
+        return
+    CACHE.mkdir(parents=True, exist_ok=True)
+    index = CACHE / "index.json"
+    memo = json.loads(index.read_text()) if index.exists() else {}
+    out = CACHE / f"{_digest(path, memo)}_v{VERSION}.parquet"
+    index.write_text(json.dumps(memo, indent=1))
+    if out.exists():
+        for b in storage.iter_batches(out, batch_size=chunksize or storage.ROW_GROUP):
+            part = b["part"].astype(str)
+            for p in dict.fromkeys(part):
+                yield _document(path, p or None), b.loc[part.eq(p), "text"].astype(str)
+        return
+    w = storage.TableWriter(out)
+    try:
+        for part, texts in _parts(path, chunksize):
+            texts = texts.astype(str)
+            w.write(pd.DataFrame({"part": part or "", "text": texts.values}))
+            yield _document(path, part), texts
+        if w.rows == 0:
+            storage.write_table(pd.DataFrame({"part": pd.Series([], dtype=str), "text": pd.Series([], dtype=str)}), out)
+        w.close(commit=w.rows > 0)
+        print("Cached", path.name, "→", out.name, "rows:", w.rows)
+    finally:
+        w.close(commit=False)
@@ -0,0 +1,226 @@
+"""
+Per-rule match cache for the bootstrap labeler (bootstrap_v1_labels), keyed by row (id + text hash) and rule pattern.
+
+Usage:
+  python src/data/rule_cache.py update [--input PATH]
+  python src/data/rule_cache.py whatif --rule vague_term --pattern "\\b(soon|fast)\\b" [--input PATH] [--out PATH]
+
+Every rule (heuristics + the severity terms as "high_term") has, per hash of
+its pattern, a pair of packed bitmaps over the cached rows: hit and known
+(evaluated). masks() evaluates only what is unknown: new rows get one scan
+with all rules (one tokenization), and after a pattern edit only that rule
+runs, over the rows at hand. Reverting an edit finds the old bitmaps again.
+The rule bitmasks are then recomposed with shifts/ORs (bit i = RULES[i]) and
+the label columns come from labels_from_masks, i.e. one lookup per distinct
+mask, so the result equals a full scan().
+
+whatif() evaluates an edited pattern for one rule and reports the rows whose
+hit, ambig_presence, ambig_type or severity flips; the edited pattern is not cached.
+
+Layout (data/interim/rule_cache/): ids.txt (one "<row id>\t<text hash>" per
+line, appended as rows arrive; a row whose text changes under the same id is
+a new row, so positional ids like PURE_000123 are safe), <rule>.<hash>.npz
+(packed hit/known bitmaps), meta.json (row count and version; written last,
+so an interrupted update is cut back on the next run, and a version change
+starts the cache over).
+"""
+from pathlib import Path
+import hashlib, json, sys
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import storage
+
+ROOT = Path(__file__).resolve().parents[2]
+INTERIM = ROOT / "data" / "interim"
+PROCESSED = ROOT / "data" / "processed"
+CACHE = INTERIM / "rule_cache"
+INPUT = PROCESSED / "regulqa_ambig_pool_capped.parquet"
+VERSION = 2                 # bump when scan() semantics or the cache layout change
+
+_labeler = None
+
+def labeler():
+    """The bootstrap labeler module (data/processed/bootstrap_v1_labels.py), imported once on first use."""
+    global _labeler
+    if _labeler is None:
+        if str(PROCESSED) not in sys.path:
+            sys.path.insert(0, str(PROCESSED))
+        import bootstrap_v1_labels
+        _labeler = bootstrap_v1_labels
+    return _labeler
+
+def text_hash(text):
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+def rule_hash(pattern):
+    return hashlib.blake2b(f"{VERSION}\x1f{pattern}".encode("utf-8"), digest_size=8).hexdigest()
+
+def _patterns(rules=None, high=None):
+    """{rule name: pattern} in RULES order (HIGH = severity terms)."""
+    lab = labeler()
+    rules = lab.heuristics if rules is None else rules
+    return {**{name: pat for name, (pat, _) in rules.items()}, lab.HIGH: lab.severity_terms if high is None else high}
+
+def _single(plan, name):
+    """One-rule scan plan (bit 1) out of a compiled plan."""
+    for n, _, words, triggers, rx in plan:
+        if n == name:
+            return [(n, 1, words, triggers, rx)]
+    raise KeyError(name)
+
+def compose(hits, names):
+    """uint16 rule bitmask per row from {name: bool array}, bit i = names[i]."""
+    out = None
+    for i, name in enumerate(names):
+        b = hits[name].astype(np.uint16) << np.uint16(i)
+        out = b if out is None else out | b
+    return out
+
+class RuleCache:
+    def __init__(self, path=None):
+        self.path = Path(path or CACHE); self.path.mkdir(parents=True, exist_ok=True)
+        meta = json.loads((self.path / "meta.json").read_text()) if (self.path / "meta.json").exists() else {}
+        ids_file = self.path / "ids.txt"
+        lines = ids_file.read_text(encoding="utf-8").split("\n") if ids_file.exists() else [""]
+        self.rows = meta.get("rows", 0) if meta.get("version") == VERSION and len(lines) > meta.get("rows", 0) else 0
+        if meta and not self.rows:
+            for f in self.path.glob("*.npz"):
+                f.unlink()
+        if len(lines) != self.rows + 1:                  # rows past meta.json are from an interrupted update
+            tmp = self.path / "ids.txt.part"
+            tmp.write_text("".join(k + "\n" for k in lines[:self.rows]), encoding="utf-8"); tmp.replace(ids_file)
+        self.ids = pd.Index(lines[:self.rows])
+
+    def _file(self, name, h):
+        return self.path / f"{name}.{h}.npz"
+
+    def _load(self, name, h):
+        """(hit, known) bool arrays over all cached rows for a rule version (zeros if never seen)."""
+        hit, known = np.zeros(self.rows, dtype=bool), np.zeros(self.rows, dtype=bool)
+        f = self._file(name, h)
+        if f.exists():
+            z = np.load(f)
+            n = min(int(z["n"]), self.rows)
+            hit[:n] = np.unpackbits(z["hit"], count=n, bitorder="little").astype(bool)
+            known[:n] = np.unpackbits(z["known"], count=n, bitorder="little").astype(bool)
+        return hit, known
+
+    def _save(self, name, h, hit, known):
+        f = self._file(name, h)
+        tmp = f.with_name(f.name + ".part.npz")
+        np.savez(tmp, n=np.int64(len(hit)), hit=np.packbits(hit, bitorder="little"),
+                 known=np.packbits(known, bitorder="little"))
+        tmp.replace(f)
+
+    def _positions(self, ids, texts):
+        """Cache rows of (id, text) pairs, appending unseen ones to ids.txt."""
+        keys = pd.Index([f"{i}\t{text_hash(t)}" for i, t in zip(ids, texts)])
+        pos = self.ids.get_indexer(keys)
+        new = pd.Index(keys[pos < 0].unique())
+        if len(new):
+            with open(self.path / "ids.txt", "a", encoding="utf-8") as fh:
+                fh.write("".join(k + "\n" for k in new))
+            self.ids = self.ids.append(new); self.rows = len(self.ids)
+            pos = self.ids.get_indexer(keys)
+        return pos
+
+    def masks(self, ids, texts):
+        """Rule bitmask per row (as scan(texts)), evaluating only rows/rules not cached yet."""
+        lab = labeler()
+        plan = lab.PLAN
+        pats = _patterns()
+        texts = [str(t) for t in texts]
+        pos = self._positions([str(i) for i in ids], texts)
+        state = {name: (rule_hash(pats[name]), *self._load(name, rule_hash(pats[name]))) for name in lab.RULES}
+        need = np.stack([~state[name][2][pos] for name in lab.RULES]) if len(pos) else np.zeros((len(lab.RULES), 0), bool)
+        full = need.all(axis=0)
+        evaluated = {}
+        if full.any():
+            idx = np.flatnonzero(full)
+            m = lab.scan([texts[i] for i in idx], plan)
+            for i, name in enumerate(lab.RULES):
+                evaluated[name] = (idx, (m >> i & 1).astype(bool))
+        for i, name in enumerate(lab.RULES):
+            rest = np.flatnonzero(need[i] & ~full)
+            if len(rest):
+                m = lab.scan([texts[j] for j in rest], _single(plan, name)).astype(bool)
+                if name in evaluated:
+                    idx, hit = evaluated[name]
+                    evaluated[name] = (np.concatenate([idx, rest]), np.concatenate([hit, m]))
+                else:
+                    evaluated[name] = (rest, m)
+        for name, (idx, hit_new) in evaluated.items():
+            h, hit, known = state[name]
+            hit[pos[idx]] = hit_new; known[pos[idx]] = True
+            self._save(name, h, hit, known)
+        if evaluated or len(self.ids):
+            tmp = self.path / "meta.json.part"
+            tmp.write_text(json.dumps({"rows": self.rows, "version": VERSION}, indent=1)); tmp.replace(self.path / "meta.json")
+        n_eval = sum(len(v[0]) for v in evaluated.values())
+        print(f"Rule cache: {len(pos)} rows, {n_eval} rule evaluations "
+              f"({int(full.sum())} new rows, {len(evaluated)} rules touched) → {self.path}")
+        return compose({name: state[name][1][pos] for name in lab.RULES}, lab.RULES)
+
+def _load_input(path):
+    df = storage.read_table(path, columns=["id", "req_text"])
+    return df["id"].astype(str).tolist(), df["req_text"].astype(str).tolist()
+
+def update(input_file=INPUT, path=None):
+    ids, texts = _load_input(input_file)
+    return RuleCache(path).masks(ids, texts)
+
+def whatif(rule, pattern, input_file=INPUT, path=None, out=None, show=10):
+    """Rows whose labels flip if `rule`'s pattern (or the severity terms, rule="high_term") became `pattern`."""
+    lab = labeler()
+    ids, texts = _load_input(input_file)
+    old = RuleCache(path).masks(ids, texts)
+    rules, high = dict(lab.heuristics), None
+    if rule == lab.HIGH:
+        high = pattern
+    elif rule in rules:
+        rules[rule] = (pattern, rules[rule][1])
+    else:
+        raise KeyError(f"Unknown rule {rule!r}; one of {lab.RULES}")
+    plan = lab.compile_rules(rules, high)
+    bit = np.uint16(1 << lab.RULES.index(rule))
+    new_hit = lab.scan(texts, _single(plan, rule)).astype(bool)
+    new = (old & ~bit) | np.where(new_hit, bit, np.uint16(0)).astype(np.uint16)
+    a, b = lab.labels_from_masks(old), lab.labels_from_masks(new)
+    flips = pd.DataFrame({"id": ids, "req_text": texts, "hit_before": (old & bit) > 0, "hit_after": new_hit})
+    for c in ("ambig_presence", "ambig_type", "severity"):
+        flips[f"{c}_before"], flips[f"{c}_after"] = a[c].values, b[c].values
+    changed = flips["hit_before"] != flips["hit_after"]
+    flips = flips[changed].reset_index(drop=True)
+    print(f"What-if {rule}: hits {int(((old & bit) > 0).sum())} → {int(new_hit.sum())} "
+          f"(+{int(flips['hit_after'].sum())} / -{int(flips['hit_before'].sum())} rows)")
+    for c in ("ambig_presence", "ambig_type", "severity"):
+        moved = flips[flips[f"{c}_before"] != flips[f"{c}_after"]]
+        if len(moved):
+            print(f"  {c}:", ", ".join(f"{x}→{y}: {n}" for (x, y), n in
+                                        moved.groupby([f"{c}_before", f"{c}_after"]).size().items()))
+    for r in flips.head(show).itertuples():
+        print(f"  [{'+' if r.hit_after else '-'}] {r.id}: {r.req_text[:100]}")
+    if out:
+        storage.write_table(flips, out)
+        print("Wrote", out, "rows:", len(flips))
+    return flips
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    u = sub.add_parser("update", help="Bring the cache up to date for a table (id, req_text)")
+    u.add_argument("--input", default=str(INPUT))
+    w = sub.add_parser("whatif", help="Rows that flip if a rule's pattern is edited")
+    w.add_argument("--rule", required=True, help="Heuristic name, or high_term for the severity terms")
+    w.add_argument("--pattern", required=True)
+    w.add_argument("--input", default=str(INPUT))
+    w.add_argument("--out", default=None, help="Write the flipped rows (.parquet/.csv)")
+    w.add_argument("--show", type=int, default=10)
+    args = ap.parse_args()
+    if args.cmd == "update":
+        update(args.input)
+    else:
+        whatif(args.rule, args.pattern, args.input, out=args.out, show=args.show)
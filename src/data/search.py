@@ -0,0 +1,213 @@
+"""
+Full-text search over the pool's req_text (SQLite FTS5), with tier/sector/source/ambig_presence filters.
+
+Usage:
+  python src/data/search.py update [--pool PATH]
+  python src/data/search.py query '"shall be" AND brake' [--sector automotive] [--tier T1,T3]
+                                  [--source PURE] [--presence ambiguous] [--limit 20] [--count] [--order rank|pool]
+
+Queries use FTS5 syntax: "phrase", AND / OR / NOT, prefix* and NEAR(a b, 5);
+matching is case- and diacritic-insensitive (unicode61 tokenizer), and 2/3-letter
+prefix indexes keep short prefix queries fast. Words with punctuation must be
+quoted ('"real-time"'); a malformed query raises ValueError.
+
+  hits = search.query('"shall be" AND brake', sector="automotive", limit=50)   # DataFrame
+  n = search.count("minimi*", tier="T3")
+
+The index (data/interim/pool_search.sqlite) is an FTS5 table over a docs table
+holding the pool columns; triggers keep the two in sync. update() streams the
+pool: rows with a new id are inserted, changed filter columns (e.g. labels
+merged back from Label Studio) are updated in place, rows that left the pool
+are deleted, and an unchanged pool file (same size and mtime) is skipped.
+Ids are content hashes, so an indexed text never changes.
+"""
+from pathlib import Path
+import sqlite3, sys, time
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import storage
+
+ROOT = Path(__file__).resolve().parents[2]
+INTERIM = ROOT / "data" / "interim"
+PROCESSED = ROOT / "data" / "processed"
+POOL = PROCESSED / "regulqa_ambig_pool.parquet"
+INDEX = INTERIM / "pool_search.sqlite"
+
+FILTERS = ["tier", "sector", "source", "ambig_presence"]
+COLS = ["id"] + FILTERS + ["document", "req_text"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (rowid INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL, tier TEXT, sector TEXT,
+                                 source TEXT, ambig_presence TEXT, document TEXT, req_text TEXT);
+CREATE INDEX IF NOT EXISTS docs_tier ON docs(tier);
+CREATE INDEX IF NOT EXISTS docs_sector ON docs(sector);
+CREATE INDEX IF NOT EXISTS docs_source ON docs(source);
+CREATE INDEX IF NOT EXISTS docs_presence ON docs(ambig_presence);
+CREATE VIRTUAL TABLE IF NOT EXISTS fts USING fts5(req_text, content='docs', content_rowid='rowid',
+                                                  prefix='2 3', tokenize='unicode61 remove_diacritics 2');
+CREATE TRIGGER IF NOT EXISTS docs_ai AFTER INSERT ON docs BEGIN
+  INSERT INTO fts(rowid, req_text) VALUES (new.rowid, new.req_text);
+END;
+CREATE TRIGGER IF NOT EXISTS docs_ad AFTER DELETE ON docs BEGIN
+  INSERT INTO fts(fts, rowid, req_text) VALUES ('delete', old.rowid, old.req_text);
+END;
+CREATE TRIGGER IF NOT EXISTS docs_au AFTER UPDATE OF req_text ON docs BEGIN
+  INSERT INTO fts(fts, rowid, req_text) VALUES ('delete', old.rowid, old.req_text);
+  INSERT INTO fts(rowid, req_text) VALUES (new.rowid, new.req_text);
+END;
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+def connect(path=None, readonly=False):
+    path = Path(path or INDEX)
+    if readonly:
+        if not path.exists():
+            raise FileNotFoundError(f"No search index at {path}; run src/data/search.py update")
+        return sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    db = sqlite3.connect(str(path))
+    db.execute("PRAGMA journal_mode=WAL")
+    db.executescript(SCHEMA)
+    return db
+
+def _stamp(pool):
+    st = Path(pool).stat()
+    return f"{Path(pool).resolve()}:{st.st_size}:{st.st_mtime_ns}"
+
+def _values(df):
+    out = pd.DataFrame({c: (df[c].astype(object).fillna("").astype(str) if c in df.columns else "") for c in COLS})
+    return out[COLS]
+
+def update(pool=POOL, path=None, chunksize=storage.ROW_GROUP, force=False):
+    """Bring the index in line with the pool; returns (inserted, updated, deleted)."""
+    found = storage.resolve(pool)
+    if found is None:
+        raise FileNotFoundError(pool)
+    db = connect(path)
+    try:
+        stamp = _stamp(found)
+        prev = db.execute("SELECT value FROM meta WHERE key = 'pool'").fetchone()
+        if prev and prev[0] == stamp and not force:
+            print("Search index up to date:", db.execute("SELECT COUNT(*) FROM docs").fetchone()[0], "rows")
+            return 0, 0, 0
+        t0 = time.perf_counter()
+        cur = db.cursor()
+        cur.execute("CREATE TEMP TABLE seen (id TEXT PRIMARY KEY)")
+        cur.execute(f"CREATE TEMP TABLE batch (id TEXT PRIMARY KEY, {', '.join(c + ' TEXT' for c in COLS[1:])})")
+        inserted = updated = 0
+        for chunk in storage.iter_batches(found, columns=COLS, batch_size=chunksize):
+            rows = list(_values(chunk).drop_duplicates(subset=["id"]).itertuples(index=False, name=None))
+            cur.executemany(f"INSERT OR IGNORE INTO batch VALUES ({','.join('?' * len(COLS))})", rows)
+            cur.execute("INSERT OR IGNORE INTO seen SELECT id FROM batch")
+            cur.execute(f"UPDATE docs SET {', '.join(f'{c} = b.{c}' for c in FILTERS + ['document'])} FROM batch b "
+                        f"WHERE docs.id = b.id AND ({' OR '.join(f'docs.{c} IS NOT b.{c}' for c in FILTERS + ['document'])})")
+            updated += cur.rowcount
+            cur.execute(f"INSERT INTO docs ({', '.join(COLS)}) SELECT {', '.join(COLS)} FROM batch "
+                        "WHERE id NOT IN (SELECT id FROM docs)")
+            inserted += cur.rowcount
+            cur.execute("DELETE FROM batch")
+        cur.execute("DELETE FROM docs WHERE id NOT IN (SELECT id FROM seen)")
+        deleted = cur.rowcount
+        cur.execute("INSERT OR REPLACE INTO meta VALUES ('pool', ?)", (stamp,))
+        db.commit()
+        if inserted > 100_000:
+            db.execute("INSERT INTO fts(fts) VALUES ('optimize')"); db.commit()
+        total = db.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+    finally:
+        db.close()
+    print(f"Search index: {total} rows (+{inserted} new, {updated} updated, -{deleted} removed) "
+          f"in {time.perf_counter() - t0:.1f} s → {Path(path or INDEX)}")
+    return inserted, updated, deleted
+
+def _where(match, filters):
+    """(SQL WHERE clause, params) for an optional FTS match plus column filters (value or list of values)."""
+    clauses, params = [], []
+    if match:
+        clauses.append("fts MATCH ?"); params.append(match)
+    for col, val in filters.items():
+        if val is None or val == "":
+            continue
+        vals = [v.strip() for v in val.split(",")] if isinstance(val, str) else [str(v) for v in val]
+        clauses.append(f"d.{col} IN ({','.join('?' * len(vals))})"); params.extend(vals)
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+def _fetch(db, sql, params, match):
+    """Run a search statement; an FTS5 syntax error in `match` becomes a ValueError with a hint."""
+    try:
+        return db.execute(sql, params).fetchall()
+    except sqlite3.OperationalError as e:
+        if not match:
+            raise
+        probe = sqlite3.connect(":memory:")
+        try:
+            probe.execute("CREATE VIRTUAL TABLE q USING fts5(req_text)")
+            probe.execute("SELECT * FROM q WHERE q MATCH ?", (match,)).fetchall()
+        except sqlite3.OperationalError:
+            raise ValueError(f"Bad FTS5 query {match!r} ({e}); quote phrases and words with "
+                             f"punctuation, e.g. query('\"real-time\"')") from None
+        finally:
+            probe.close()
+        raise
+
+def query(match=None, tier=None, sector=None, source=None, ambig_presence=None, limit=20, offset=0,
+          order="rank", path=None):
+    """Matching rows as a DataFrame (best bm25 first, or pool order with order="pool")."""
+    where, params = _where(match, {"tier": tier, "sector": sector, "source": source, "ambig_presence": ambig_presence})
+    cols = "d.id, d.tier, d.sector, d.source, d.ambig_presence, d.document, d.req_text"
+    if match:
+        sql = (f"SELECT {cols}, bm25(fts) AS score, snippet(fts, 0, '[', ']', '…', 16) AS snippet "
+               f"FROM fts JOIN docs d ON d.rowid = fts.rowid{where} ORDER BY {'score' if order == 'rank' else 'fts.rowid'}")
+    else:
+        sql = f"SELECT {cols}, NULL AS score, NULL AS snippet FROM docs d{where} ORDER BY d.rowid"
+    db = connect(path, readonly=True)
+    try:
+        rows = _fetch(db, sql + " LIMIT ? OFFSET ?", params + [int(limit), int(offset)], match)
+    finally:
+        db.close()
+    return pd.DataFrame(rows, columns=COLS[:5] + ["document", "req_text", "score", "snippet"])
+
+def count(match=None, tier=None, sector=None, source=None, ambig_presence=None, path=None):
+    where, params = _where(match, {"tier": tier, "sector": sector, "source": source, "ambig_presence": ambig_presence})
+    src = "fts JOIN docs d ON d.rowid = fts.rowid" if match else "docs d"
+    db = connect(path, readonly=True)
+    try:
+        return _fetch(db, f"SELECT COUNT(*) FROM {src}{where}", params, match)[0][0]
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    u = sub.add_parser("update", help="Index new / changed pool rows")
+    u.add_argument("--pool", default=str(POOL))
+    u.add_argument("--force", action="store_true", help="Re-check every row even if the pool file is unchanged")
+    q = sub.add_parser("query", help="Search req_text (FTS5 syntax)")
+    q.add_argument("match", nargs="?", default=None)
+    q.add_argument("--tier"); q.add_argument("--sector"); q.add_argument("--source")
+    q.add_argument("--presence", help="ambig_presence filter")
+    q.add_argument("--limit", type=int, default=20)
+    q.add_argument("--order", choices=["rank", "pool"], default="rank")
+    q.add_argument("--count", action="store_true", help="Only print the number of matches")
+    args = ap.parse_args()
+    if args.cmd == "update":
+        update(args.pool, force=args.force)
+    elif args.count:
+        t = time.perf_counter()
+        try:
+            n = count(args.match, args.tier, args.sector, args.source, args.presence)
+        except (ValueError, FileNotFoundError) as e:
+            raise SystemExit(str(e))
+        print(n, f"matches ({(time.perf_counter() - t) * 1000:.1f} ms)")
+    else:
+        t = time.perf_counter()
+        try:
+            df = query(args.match, args.tier, args.sector, args.source, args.presence, args.limit, order=args.order)
+        except (ValueError, FileNotFoundError) as e:
+            raise SystemExit(str(e))
+        ms = (time.perf_counter() - t) * 1000
+        for r in df.itertuples(index=False):
+            print(f"{r.id}  [{r.tier}/{r.sector}/{r.source}{'/' + r.ambig_presence if r.ambig_presence else ''}]  "
+                  f"{r.snippet or r.req_text[:160]}")
+        print(f"{len(df)} rows shown ({ms:.1f} ms)")
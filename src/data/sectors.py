@@ -0,0 +1,21 @@
+"""
+Sector keyword hints and their compiled patterns (shared by clean_all and features; no side effects on import).
+"""
+import re
+
+SECTOR_HINTS = {
+    "automotive": ["automotive","vehicle","car","iso 26262","ecu","autonomous"],
+    "medical": ["medical","health","patient","device","iec 62304","hl7","fhir"],
+    "aerospace": ["aerospace","space","nasa","avionics","do-178c","aircraft"],
+    "rail": ["rail","train","signaling","ertms"],
+    "finance": ["bank","finance","trading","payment","pci"],
+    "defense": ["defense","military","weapon"],
+    "energy": ["grid","energy","power plant","scada"],
+}
+
+def _sector_pattern(keys):
+    # word-boundary match (optional plural "s"), longest keyword first so the reported hint is the most specific
+    alts = "|".join(re.escape(k).replace(r"\ ", r"\s+") for k in sorted(keys, key=len, reverse=True))
+    return re.compile(rf"\b({alts})s?\b")
+
+SECTOR_PATTERNS = {sector: _sector_pattern(keys) for sector, keys in SECTOR_HINTS.items()}
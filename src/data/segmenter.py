@@ -0,0 +1,88 @@
+"""
+Streaming sentence segmentation for paged documents (PDF harvesting).
+
+- strip_running(pages): drops running headers/footers, i.e. short lines at
+  the top/bottom edge of a page that recur at the same edge (digits folded, so
+  "Page 3 of 40" matches "Page 4 of 40") on at least `min_repeat` pages of a
+  sliding window. Only about `window` pages are ever held.
+- iter_sentences(chunks): one precompiled boundary scanner over the
+  whitespace-normalized text; the unfinished tail of a chunk is carried into
+  the next one, so sentences crossing a page break come out whole. Sentences
+  are yielded lazily.
+
+Boundary rule (unchanged from the per-page splitter): after . ? or ! followed
+by whitespace and an upper-case letter or digit.
+"""
+from collections import Counter, deque
+import re
+
+_WS = re.compile(r"\s+")
+_BOUNDARY = re.compile(r"[.?!] (?=[A-Z0-9])")
+_DIGITS = re.compile(r"\d+")
+
+MAX_CARRY = 20_000          # flush an unterminated run after this many chars (flat memory)
+
+def _sig(line):
+    return _DIGITS.sub("#", _WS.sub(" ", line).strip().lower())
+
+def _edges(lines, edge, max_len):
+    """{line index: "top"/"bottom"} for the first/last `edge` non-blank, header-length lines."""
+    idx = [i for i, l in enumerate(lines) if l.strip()]
+    out = {i: "bottom" for i in idx[-edge:]}
+    out.update({i: "top" for i in idx[:edge]})
+    return {i: pos for i, pos in out.items() if len(lines[i].strip()) <= max_len}
+
+def strip_running(pages, window=8, min_repeat=4, edge=2, max_len=120):
+    """Yield each page's text with recurring edge lines removed.
+
+    A line is dropped if the same (edge, signature) occurs on at least
+    `min_repeat` of the window+1 pages centred on its page.
+    """
+    look = max(1, window // 2)
+    buf, past = deque(), deque(maxlen=look)
+    counts = Counter()                # (edge, signature) → pages in (past ∪ buf) carrying it
+
+    def release():
+        lines, keys = buf.popleft()
+        drop = {i for i, k in keys.items() if counts[k] >= min_repeat}
+        if len(past) == past.maxlen:
+            for k in past[0]:
+                counts[k] -= 1
+                if counts[k] <= 0: del counts[k]
+        past.append(set(keys.values()))
+        return "\n".join(l for i, l in enumerate(lines) if i not in drop)
+
+    for text in pages:
+        lines = text.splitlines()
+        keys = {i: (pos, _sig(lines[i])) for i, pos in _edges(lines, edge, max_len).items()}
+        counts.update(set(keys.values()))
+        buf.append((lines, keys))
+        if len(buf) > look:
+            yield release()
+    while buf:
+        yield release()
+
+def iter_sentences(chunks, max_carry=MAX_CARRY):
+    """Yield whitespace-normalized sentences from text chunks, joining sentences across chunk ends."""
+    carry = ""
+    for chunk in chunks:
+        text = _WS.sub(" ", chunk).strip()
+        if not text:
+            continue
+        s = f"{carry} {text}" if carry else text
+        start = 0
+        for m in _BOUNDARY.finditer(s):
+            part = s[start:m.start() + 1].strip()
+            if part:
+                yield part
+            start = m.end()
+        carry = s[start:].strip()
+        if len(carry) > max_carry:
+            yield carry
+            carry = ""
+    if carry:
+        yield carry
+
+def segment_pages(pages, strip=True, **kw):
+    """Sentences of a paged document: strip_running (optional) → iter_sentences."""
+    return iter_sentences(strip_running(pages, **kw) if strip else pages)
@@ -0,0 +1,200 @@
+"""
+Columnar storage for data/interim and data/processed (Parquet via pyarrow).
+
+- write_table / read_table: whole tables, with column projection and
+  predicate pushdown (`filters=[("tier", "==", "T3"), ...]`, pyarrow syntax).
+- iter_batches: stream a table in record batches (bounded memory).
+- TableWriter: append DataFrame chunks to one Parquet (or CSV) file.
+- resolve: find a table by path or stem, preferring .parquet over .csv when
+  the exact file is missing, so older CSV artifacts keep loading.
+- export_csv: CSV is only produced as the final Label Studio hand-off.
+
+Annotation columns have an explicit schema; low-cardinality labels (tier,
+sector, source, ambig_* ...) are dictionary-encoded and come back as pandas
+categoricals.
+"""
+from pathlib import Path
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[2]
+INTERIM = ROOT / "data" / "interim"
+PROCESSED = ROOT / "data" / "processed"
+
+ROW_GROUP = 100_000
+
+def _fields():
+    import pyarrow as pa
+    cat = pa.dictionary(pa.int32(), pa.string())
+    return {
+        "id": pa.string(), "source": cat, "tier": cat, "sector": cat, "document": cat,
+        "req_text": pa.string(), "ambig_presence": cat, "ambig_type": cat, "reg_clause": cat,
+        "severity": cat, "notes": pa.string(),
+    }
+
+def schema_for(columns):
+    """Arrow schema for `columns`: known annotation columns get their fixed type, others are inferred (None)."""
+    f = _fields()
+    return {c: f.get(c) for c in columns}
+
+def _to_arrow(df):
+    import pyarrow as pa
+    arrays, names = [], []
+    for c, typ in schema_for(df.columns).items():
+        col = df[c]
+        if typ is not None:
+            if isinstance(col.dtype, pd.CategoricalDtype):
+                col = col.astype(object)
+            col = col.where(col.notna(), None)
+            arrays.append(pa.array(col.astype(object), type=pa.string()).cast(typ) if pa.types.is_dictionary(typ)
+                          else pa.array(col.astype(object), type=typ))
+        else:
+            arrays.append(pa.array(col, from_pandas=True))
+        names.append(str(c))
+    return pa.Table.from_arrays(arrays, names=names)
+
+def resolve(path):
+    """Existing file for `path`; a missing .parquet/.csv path or a bare stem resolves to whichever
+    format exists (parquet wins). None if nothing exists."""
+    path = Path(path)
+    if path.suffix and path.exists():
+        return path
+    stem = path.with_suffix("") if path.suffix.lower() in (".parquet", ".csv") else path
+    for cand in (stem.with_suffix(".parquet"), stem.with_suffix(".csv")):
+        if cand.exists():
+            return cand
+    return None
+
+def _is_parquet(path):
+    return Path(path).suffix.lower() == ".parquet"
+
+def write_table(df, path):
+    """Write df atomically; format follows the suffix (.parquet or .csv)."""
+    path = Path(path); path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".part")
+    if _is_parquet(path):
+        import pyarrow.parquet as pq
+        pq.write_table(_to_arrow(df), tmp, row_group_size=ROW_GROUP, compression="zstd")
+    else:
+        df.to_csv(tmp, index=False)
+    tmp.replace(path)
+    return path
+
+_OPS = {"==": "eq", "=": "eq", "!=": "ne", "<": "lt", "<=": "le", ">": "gt", ">=": "ge"}
+
+def _filter_frame(df, filters):
+    """pyarrow-style filters applied in pandas (CSV fallback)."""
+    for col, op, val in filters or []:
+        if op == "in":
+            df = df[df[col].isin(list(val))]
+        elif op == "not in":
+            df = df[~df[col].isin(list(val))]
+        else:
+            df = df[getattr(df[col], _OPS[op])(val)]
+    return df
+
+def read_table(path, columns=None, filters=None):
+    """Load a table (parquet pushes projection + filters down; CSV filters in pandas)."""
+    found = resolve(path)
+    if found is None:
+        raise FileNotFoundError(path)
+    if _is_parquet(found):
+        return pd.read_parquet(found, columns=columns, filters=filters)
+    usecols = None if columns is None else list(dict.fromkeys(list(columns) + [c for c, _, _ in filters or []]))
+    df = _filter_frame(pd.read_csv(found, usecols=usecols), filters)
+    return (df[list(columns)] if columns is not None else df).reset_index(drop=True)
+
+def iter_batches(path, columns=None, batch_size=ROW_GROUP, filters=None):
+    """Yield DataFrame batches of a table without loading it whole."""
+    found = resolve(path)
+    if found is None:
+        raise FileNotFoundError(path)
+    if _is_parquet(found):
+        import pyarrow.dataset as ds
+        dset = ds.dataset(str(found), format="parquet")
+        expr = None
+        for col, op, val in filters or []:
+            f = ds.field(col)
+            e = f.isin(list(val)) if op == "in" else (~f.isin(list(val)) if op == "not in" else getattr(f, f"__{_OPS[op]}__")(val))
+            expr = e if expr is None else expr & e
+        for rb in dset.to_batches(columns=columns, filter=expr, batch_size=batch_size):
+            if rb.num_rows:
+                yield rb.to_pandas()
+    else:
+        usecols = None if columns is None else list(dict.fromkeys(list(columns) + [c for c, _, _ in filters or []]))
+        for chunk in pd.read_csv(found, usecols=usecols, chunksize=batch_size):
+            chunk = _filter_frame(chunk, filters)
+            if len(chunk):
+                yield chunk[list(columns)] if columns is not None else chunk
+
+def columns_of(path):
+    """Column names of a table (parquet schema / CSV header), or [] if it does not exist."""
+    found = resolve(path)
+    if found is None:
+        return []
+    if _is_parquet(found):
+        import pyarrow.parquet as pq
+        return list(pq.read_schema(found).names)
+    return list(pd.read_csv(found, nrows=0).columns)
+
+def count_rows(path):
+    """Row count (parquet footer metadata; CSV is scanned)."""
+    found = resolve(path)
+    if found is None:
+        return 0
+    if _is_parquet(found):
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(found).metadata.num_rows
+    return sum(len(c) for c in pd.read_csv(found, usecols=[0], chunksize=ROW_GROUP))
+
+class TableWriter:
+    """Append DataFrame chunks to one table file; renamed into place on close()."""
+
+    def __init__(self, path):
+        self.path = Path(path); self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.tmp = self.path.with_name(self.path.name + ".part")
+        self.rows = 0
+        self._w = None
+        self._fh = None
+
+    def write(self, df):
+        if _is_parquet(self.path):
+            import pyarrow.parquet as pq
+            t = _to_arrow(df)
+            if self._w is None:
+                self._w = pq.ParquetWriter(self.tmp, t.schema, compression="zstd")
+            self._w.write_table(t, row_group_size=ROW_GROUP)
+        else:
+            if self._fh is None:
+                self._fh = open(self.tmp, "w", newline="", encoding="utf-8")
+                df.to_csv(self._fh, index=False)
+            else:
+                df.to_csv(self._fh, header=False, index=False)
+        self.rows += len(df)
+
+    def close(self, commit=True):
+        if self._w is not None: self._w.close(); self._w = None
+        if self._fh is not None: self._fh.close(); self._fh = None
+        if commit and self.tmp.exists():
+            self.tmp.replace(self.path)
+        elif self.tmp.exists():
+            self.tmp.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(commit=exc_type is None and self.rows > 0)
+
+def export_csv(src, dst=None, batch_size=ROW_GROUP):
+    """Stream a table to CSV (the Label Studio import format)."""
+    found = resolve(src)
+    if found is None:
+        raise FileNotFoundError(src)
+    dst = Path(dst) if dst else found.with_suffix(".csv")
+    if found == dst:
+        return dst
+    with TableWriter(dst) as w:
+        for b in iter_batches(found, batch_size=batch_size):
+            w.write(b)
+    print("Exported", dst, "rows:", w.rows)
+    return dst
@@ -1,45 +1,169 @@
+"""
+T2 synthetic regulated requirements, sampled without replacement.
+
+Usage:
+  python src/data/synth_t2.py [--n-each 100] [--seed 13] [--ambig-ratio 0.3] [--packs iso26262,do178c]
+                              [--config config/synth_t2.yaml] [--workers N] [--chunksize 100000]
+
+Each pack in config/synth_t2.yaml holds the templates and slot values of one
+regulation. A template and each of its ambiguity rewrites is a variant; every
+variant × combination of the slot values it uses is one point of the pack's
+sample space, so distinct points render distinct sentences. Rows are drawn with
+random.sample over range(space size): no duplicates, reproducible per seed.
+--ambig-ratio sets the share of rows drawn from the ambiguous variants, which
+carry their ground truth (ambig_presence / ambig_type / notes).
+
+Rows are streamed to data/raw/t2_synthetic/synthetic_requirements.csv in
+chunks; with --workers N > 1 each chunk is rendered by a worker process into
+its own shard (synthetic_requirements_0000.csv, ...).
+"""
 from pathlib import Path
-import pandas as pd, random
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+import bisect, random, re, string
+import pandas as pd, yaml
 
 ROOT = Path(__file__).resolve().parents[2]
 OUT = ROOT/'data'/'raw'/'t2_synthetic'; OUT.mkdir(parents=True, exist_ok=True)
+CONF = ROOT/'config'/'synth_t2.yaml'
+
+COLS = ["sector", "document", "regulation", "pack", "template_id", "req_text", "ambig_presence", "ambig_type", "notes"]
+CLEAR = ("clear", "", "")
+
+def _fields(template):
+    return list(dict.fromkeys(f for _, f, _, _ in string.Formatter().parse(template) if f))
+
+class Space:
+    """A list of variants; point k → (variant, slot values) by mixed-radix decoding."""
+
+    def __init__(self, variants, slots):
+        self.variants, self.slots = variants, slots
+        self.digits = [[(f, slots[f]) for f in reversed(_fields(tpl))] for _, tpl, _ in variants]
+        self.ends, total = [], 0
+        for digits in self.digits:
+            n = 1
+            for _, vals in digits:
+                n *= len(vals)
+            total += n; self.ends.append(total)
+        self.size = total
+
+    def render(self, k):
+        v = bisect.bisect_right(self.ends, k)
+        tid, tpl, labels = self.variants[v]
+        k -= self.ends[v - 1] if v else 0
+        vals = {}
+        for f, choices in self.digits[v]:
+            k, r = divmod(k, len(choices))
+            vals[f] = choices[r]
+        return tid, tpl.format(**vals), labels
+
+class Pack:
+    """Sample space of one regulation pack (clear templates and their ambiguous rewrites)."""
+
+    def __init__(self, spec, slots, rewrites):
+        self.name = spec["name"]
+        self.regulation = spec.get("regulation", self.name)
+        self.sector = spec.get("sector", "general")
+        self.document = spec.get("document", f"{self.sector.upper()}_SYNTH")
+        self.slots = {k: [str(v) for v in dict.fromkeys(vals)] for k, vals in slots.items()}
+        clear, ambig, seen = [], [], set()
+        for t, tpl in enumerate(spec["templates"]):
+            tid = f"{self.name}-{t}"
+            variants = [(tpl, CLEAR)]
+            for rw in rewrites:
+                if re.search(rw["find"], tpl):
+                    variants += [(re.sub(rw["find"], rep, tpl, count=1), ("ambiguous", rw.get("type", ""), rw["name"]))
+                                 for rep in rw["replace"]]
+            for text, labels in variants:
+                if text in seen: continue
+                seen.add(text)
+                missing = [f for f in _fields(text) if f not in self.slots]
+                if missing:
+                    raise ValueError(f"pack {self.name}: template uses unknown slot(s) {missing}: {text}")
+                (clear if labels is CLEAR else ambig).append((tid, text, labels))
+        self.spaces = {"clear": Space(clear, self.slots), "ambiguous": Space(ambig, self.slots)}
+
+    def sample(self, n, rng, ambig_ratio=0.0):
+        """[(space key, sampled point indices)] for n rows, ambig_ratio of them ambiguous."""
+        n_amb = round(n * ambig_ratio)
+        out = []
+        for key, k in (("clear", n - n_amb), ("ambiguous", n_amb)):
+            size = self.spaces[key].size
+            if k > size:
+                print(f"[warn] pack {self.name}: only {size} distinct {key} rows (asked {k})")
+                k = size
+            if k:
+                out.append((key, rng.sample(range(size), k)))
+        return out
+
+    def rows(self, key, indices):
+        space = self.spaces[key]
+        recs = []
+        for k in indices:
+            tid, text, (presence, typ, notes) = space.render(k)
+            recs.append((self.sector, self.document, self.regulation, self.name, tid, text, presence, typ, notes))
+        return pd.DataFrame.from_records(recs, columns=COLS)
+
+def load_packs(conf=CONF, names=None):
+    """Packs from the config (shared slots/rewrites merged with per-pack ones), optionally filtered by name."""
+    cfg = yaml.safe_load(Path(conf).read_text()) or {}
+    shared, rewrites = cfg.get("slots", {}), cfg.get("ambiguity", [])
+    packs = [Pack(p, {**shared, **p.get("slots", {})}, rewrites + p.get("ambiguity", []))
+             for p in cfg.get("packs", []) if not names or p["name"] in names]
+    if names and len(packs) != len(set(names)):
+        raise ValueError(f"Unknown pack(s): {sorted(set(names) - {p.name for p in packs})}")
+    return packs
+
+@lru_cache(maxsize=None)
+def _pack(conf, name):
+    return load_packs(conf, [name])[0]
+
+def _write_shard(task):
+    conf, name, key, indices, out = task
+    df = _pack(conf, name).rows(key, indices)
+    tmp = Path(out + ".part")
+    df.to_csv(tmp, index=False); tmp.replace(out)
+    return len(df)
 
-AUTOMOTIVE_TPL = [
-    "Per ISO 26262, the ECU shall {verb} the braking command within {ms} ms under {cond}.",
-    "The vehicle control unit shall {verb} torque request when {cond} in accordance with ISO 26262.",
-    "The autonomous driving stack shall {verb} sensor fusion output within {ms} ms (ISO 26262 ASIL).",
-]
-MEDICAL_TPL = [
-    "As required by IEC 62304, the medical device software shall {verb} patient vitals at an interval of {ms} ms.",
-    "The device shall {verb} alarm when {cond} per IEC 62304 risk control requirements.",
-    "Per IEC 62304, the software shall {verb} dosage calculation when {cond}.",
-]
-AERO_TPL = [
-    "In accordance with DO-178C avionics objectives, the flight SW shall {verb} telemetry packets within {ms} ms after {cond}.",
-    "DO-178C: The system shall {verb} mode transition when {cond}.",
-    "Per DO-178C, the avionics application shall {verb} command dispatch within {ms} ms.",
-]
-
-VERBS = ["log","validate","transmit","compute","limit","store"]
-MSEC = ["10","20","50","100","200"]
-CONDS = ["loss of signal","over-temperature","sensor fault","voltage drop"]
-
-def gen_block(templates, sector, n=100):
-    rows = []
-    for i in range(n):
-        t = random.choice(templates)
-        s = t.format(verb=random.choice(VERBS), ms=random.choice(MSEC), cond=random.choice(CONDS))
-        rows.append({"sector": sector, "document": f"{sector.upper()}_SYNTH", "req_text": s})
-    return pd.DataFrame(rows)
-
-def make_synthetic(n_each=100):
-    df = pd.concat([
-        gen_block(AUTOMOTIVE_TPL,"automotive", n_each),
-        gen_block(MEDICAL_TPL,"medical", n_each),
-        gen_block(AERO_TPL,"aerospace", n_each),
-    ], ignore_index=True)
-    out = OUT/"synthetic_requirements.csv"
-    df.to_csv(out, index=False); print("Synthetic →", out, "rows:", len(df))
+def make_synthetic(n_each=100, seed=13, conf=CONF, packs=None, ambig_ratio=0.0, workers=1,
+                   chunksize=100_000, out_dir=OUT):
+    out_dir = Path(out_dir); out_dir.mkdir(parents=True, exist_ok=True)
+    jobs = []
+    for pack in load_packs(conf, packs):
+        rng = random.Random(f"{seed}:{pack.name}")
+        for key, idx in pack.sample(n_each, rng, ambig_ratio):
+            jobs += [(pack, key, idx[i:i + chunksize]) for i in range(0, len(idx), chunksize)]
+    for f in out_dir.glob("synthetic_requirements*.csv"):
+        f.unlink()
+    n = 0
+    if workers <= 1:
+        out = out_dir/"synthetic_requirements.csv"
+        tmp = out.with_name(out.name + ".part")
+        with open(tmp, "w", newline="", encoding="utf-8") as fh:
+            pd.DataFrame(columns=COLS).to_csv(fh, index=False)
+            for pack, key, idx in jobs:
+                df = pack.rows(key, idx)
+                df.to_csv(fh, header=False, index=False); n += len(df)
+        tmp.replace(out)
+    else:
+        tasks = [(str(conf), pack.name, key, idx, str(out_dir/f"synthetic_requirements_{k:04d}.csv"))
+                 for k, (pack, key, idx) in enumerate(jobs)]
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            n = sum(ex.map(_write_shard, tasks))
+        out = out_dir/"synthetic_requirements_*.csv"
+    print("Synthetic →", out, "rows:", n)
+    return n
 
 if __name__ == "__main__":
-    make_synthetic()
+    import argparse
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n-each", type=int, default=100, help="Rows per pack")
+    ap.add_argument("--seed", type=int, default=13)
+    ap.add_argument("--ambig-ratio", type=float, default=0.0, help="Share of rows with injected ambiguity")
+    ap.add_argument("--packs", default=None, help="Comma-separated pack names (default: all)")
+    ap.add_argument("--config", default=str(CONF))
+    ap.add_argument("--workers", type=int, default=1)
+    ap.add_argument("--chunksize", type=int, default=100_000)
+    args = ap.parse_args()
+    make_synthetic(args.n_each, args.seed, args.config, args.packs.split(",") if args.packs else None,
+                   args.ambig_ratio, args.workers, args.chunksize)
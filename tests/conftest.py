@@ -0,0 +1,93 @@
+"""
+Shared fixtures: import paths for src/data, tools, benchmarks and the labeler,
+and `stand_in`, a local HTTP server standing in for remote sources.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+import sys, threading, time
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+for sub in ("src/data", "tools", "benchmarks", "data/processed"):
+    if str(ROOT / sub) not in sys.path:
+        sys.path.insert(0, str(ROOT / sub))
+
+class StandIn:
+    """Routes request paths to handlers `fn(req) -> (status, headers, body)`; logs every request.
+
+    `body` is bytes, or an iterable of byte blocks streamed lazily with `delay` seconds between
+    them (the route then sets Content-Length itself).
+    """
+    def __init__(self):
+        self.routes, self.log = {}, []
+        self.active = self.peak = 0
+        self.delay = 0.0
+        self._lock = threading.Lock()
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with stand_in._lock:
+                    stand_in.log.append((self.path, dict(self.headers)))
+                    stand_in.active += 1
+                    stand_in.peak = max(stand_in.peak, stand_in.active)
+                try:
+                    fn = stand_in.routes.get(self.path.split("?")[0])
+                    status, headers, body = fn(self) if fn else (404, {}, b"")
+                    blocks = [body] if isinstance(body, bytes) else body
+                    self.send_response(status)
+                    if isinstance(body, bytes):
+                        headers = {"Content-Length": str(len(body)), **headers}
+                    for k, v in headers.items():
+                        self.send_header(k, v)
+                    self.end_headers()
+                    for block in blocks:
+                        time.sleep(stand_in.delay)
+                        self.wfile.write(block); self.wfile.flush()
+                finally:
+                    with stand_in._lock:
+                        stand_in.active -= 1
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def hits(self, path):
+        return sum(1 for p, _ in self.log if p.split("?")[0] == path)
+
+@pytest.fixture
+def stand_in():
+    s = StandIn()
+    s._thread.start()
+    yield s
+    s.server.shutdown(); s.server.server_close()
+
+def write_raw(data, folder, name, texts, col="req_text"):
+    """A raw source CSV under <data>/raw/<folder>/ with one text column."""
+    import pandas as pd
+    p = data / "raw" / folder / name
+    p.parent.mkdir(parents=True, exist_ok=True)
+    pd.DataFrame({col: texts}).to_csv(p, index=False)
+    return p
+
+@pytest.fixture
+def pool_env(tmp_path, monkeypatch):
+    """clean_all (and the reader cache) pointed at <tmp>/data; returns that directory."""
+    import clean_all, readers
+    data = tmp_path / "data"
+    interim, processed = data / "interim", data / "processed"
+    interim.mkdir(parents=True); processed.mkdir(parents=True)
+    for name, val in {"RAW": data / "raw", "INTERIM": interim, "PROCESSED": processed,
+                      "POOL": processed / "regulqa_ambig_pool.parquet",
+                      "DELTA": processed / "regulqa_ambig_pool_new.parquet",
+                      "REGISTRY": processed / "regulqa_ambig_pool_ids.sqlite"}.items():
+        monkeypatch.setattr(clean_all, name, val)
+    monkeypatch.setattr(clean_all, "_load_overrides", lambda: {})
+    monkeypatch.setattr(readers, "CACHE", interim / "source_cache")
+    return data
@@ -0,0 +1,10 @@
+import importlib.util
+import bench_pipeline
+
+def test_pipeline_runs_at_10k(tmp_path):
+    """Every benchmark case runs once on the 10k corpora without error (results are not recorded)."""
+    cases = [c for c in bench_pipeline.CASES if c != "extract_pdf" or importlib.util.find_spec("fitz")]
+    run = bench_pipeline.run("10k", cases, repeat=1, corpus=tmp_path / "corpus")
+    errors = {c: r["error"] for c, r in run["results"].items() if "error" in r}
+    assert not errors, errors
+    assert set(run["results"]) == set(cases) and all(r["items"] > 0 for r in run["results"].values())
@@ -0,0 +1,51 @@
+import random
+import pandas as pd
+import cap_pool, storage
+
+def _greedy(items, size, per_doc):
+    """Reference: smallest keys first, skipping documents at their cap, until `size`."""
+    out, n = [], {}
+    for k, seq, doc in sorted(items):
+        if len(out) < size and n.get(doc, 0) < per_doc:
+            out.append(seq); n[doc] = n.get(doc, 0) + 1
+    return sorted(out)
+
+def test_reservoir_matches_greedy_and_stays_bounded():
+    rng = random.Random(3)
+    items = [(rng.getrandbits(64), i, f"d{rng.randrange(40) if i % 3 else 0}") for i in range(5000)]
+    r = cap_pool._Reservoir(100, per_doc=5)
+    for k, seq, doc in items:
+        r.offer(k, seq, doc, None)
+        assert len(r.rows) <= 100 and len(r.heap) <= 2 * 100 + 65
+    assert sorted(seq for _, seq, _, _ in r.items()) == _greedy(items, 100, 5)
+    r = cap_pool._Reservoir(50)
+    for k, seq, doc in items:
+        r.offer(k, seq, None, None)
+    assert sorted(seq for _, seq, _, _ in r.items()) == _greedy(items, 50, len(items))
+
+def _pool(tmp_path, n=3000):
+    rng = random.Random(5)
+    df = pd.DataFrame({"id": [f"R{i:05d}" for i in range(n)],
+                       "document": [f"doc{rng.randrange(30) if i % 2 else 0}" for i in range(n)],
+                       "tier": [rng.choice(["T1", "T2", "T3"]) for _ in range(n)],
+                       "source": "s", "sector": [rng.choice(["rail", "health"]) for _ in range(n)],
+                       "req_text": [f"The system shall do thing {i}." for i in range(n)],
+                       "ambig_presence": [rng.choice(["ambiguous", "clear"]) for _ in range(n)]})
+    storage.write_table(df, tmp_path / "pool.parquet")
+    return df
+
+def test_sample_is_capped_and_order_independent(tmp_path):
+    df = _pool(tmp_path)
+    kw = dict(size=200, per_document=10, seed=7)
+    a = cap_pool.cap_pool(tmp_path / "pool.parquet", tmp_path / "a.parquet", batch_size=500, **kw)
+    assert len(a) == 200 and a["document"].value_counts().max() <= 10
+    assert list(a["id"]) == sorted(a["id"])                      # pool order
+    storage.write_table(df.sample(frac=1, random_state=1), tmp_path / "shuffled.parquet")
+    b = cap_pool.cap_pool(tmp_path / "shuffled.parquet", tmp_path / "b.parquet", batch_size=700, **kw)
+    assert set(a["id"]) == set(b["id"])
+
+def test_label_ratio(tmp_path):
+    _pool(tmp_path)
+    out = cap_pool.cap_pool(tmp_path / "pool.parquet", tmp_path / "c.parquet", size=100,
+                            label_ratio="ambiguous=0.7,clear=0.3")
+    assert out["ambig_presence"].astype(str).value_counts().to_dict() == {"ambiguous": 70, "clear": 30}
@@ -0,0 +1,17 @@
+import convert_t1_html_xml as conv
+
+def _blocks(tmp_path, xml):
+    p = tmp_path / "doc.xml"
+    p.write_text(xml)
+    return list(conv.iter_xml_blocks(p))
+
+def test_pure_blocks_keep_their_own_rows(tmp_path):
+    rows = _blocks(tmp_path, "<req_document><title>T</title><p>The system shall log <b>each</b> call.</p>"
+                             "<specs><req><text_body>It shall stop.</text_body></req></specs></req_document>")
+    assert ("p", "The system shall log each call.") in rows and ("text_body", "It shall stop.") in rows
+    assert "req_document" not in dict(rows)
+
+def test_loose_text_is_emitted_per_top_level_child(tmp_path):
+    rows = _blocks(tmp_path, "<dump>intro<section>one <b>bold</b> two</section>mid"
+                             "<section>three <i>x</i> four</section></dump>")
+    assert rows == [("", "intro"), ("section", "one bold two"), ("", "mid"), ("section", "three x four")]
@@ -0,0 +1,66 @@
+import hashlib, io, zipfile
+import pytest
+import download_t1
+
+@pytest.fixture(autouse=True)
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(download_t1, "CACHE", tmp_path / "cache")
+    return tmp_path / "cache"
+
+def _zip(members):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zf:
+        for name, data in members.items():
+            zf.writestr(name, data)
+    return buf.getvalue()
+
+MEMBERS = {"req/a.xml": "<req>The system shall log.</req>", "req/b.csv": "req_text\nIt shall stop.\n",
+           "__MACOSX/req/._a.xml": "junk", "req/.hidden.xml": "<x/>", "req/readme.txt": "notes"}
+
+def _record(stand_in, body, md5=None, etag='"r1"'):
+    """A Zenodo-like record 1 listing one zip (served at /files/req.zip); the API honours If-None-Match."""
+    stand_in.routes["/files/req.zip"] = lambda req: (200, {"Content-Type": "application/zip"}, body)
+    checksum = "md5:" + (md5 or hashlib.md5(body).hexdigest())
+    doc = f'{{"files": [{{"key": "req.zip", "checksum": "{checksum}", ' \
+          f'"links": {{"self": "{stand_in.url}/files/req.zip"}}}}]}}'.encode()
+    stand_in.routes["/api/records/1"] = lambda req: ((304, {"ETag": etag}, b"") if req.headers.get("If-None-Match") == etag
+                                                     else (200, {"Content-Type": "application/json", "ETag": etag}, doc))
+    return stand_in.url + "/records/1"
+
+def test_record_etag_is_reused(stand_in):
+    page = _record(stand_in, _zip(MEMBERS))
+    first = download_t1._record_files(page)
+    assert [tuple(f) for f in download_t1._record_files(page)] == first and first[0][0] == "req.zip"
+    assert [h.get("If-None-Match") for p, h in stand_in.log if p == "/api/records/1"] == [None, '"r1"']
+
+def test_url_revalidation_skips_unchanged_page(stand_in):
+    stand_in.routes["/srs.html"] = lambda req: ((304, {}, b"") if req.headers.get("If-None-Match") == '"p1"'
+                                                else (200, {"ETag": '"p1"'}, b"<li>It shall run.</li>"))
+    path, changed = download_t1._fetch_url(stand_in.url + "/srs.html")
+    assert changed and path.read_bytes() == b"<li>It shall run.</li>"
+    assert download_t1._fetch_url(stand_in.url + "/srs.html") == (path, False)
+
+def test_md5_mismatch_is_rejected(stand_in, cache):
+    page = _record(stand_in, _zip(MEMBERS), md5="0" * 32)
+    with pytest.raises(RuntimeError, match="Checksum mismatch"):
+        download_t1._download_first_matching_from_record(page)
+    assert not [p for p in (cache / "blobs").iterdir()]
+
+def test_blob_cache_and_selective_extraction(stand_in, tmp_path):
+    page, out = _record(stand_in, _zip(MEMBERS)), tmp_path / "t1_pure"
+    download_t1.download_pure(out, page, workers=2)
+    got = sorted(str(p.relative_to(out)) for p in out.rglob("*") if p.is_file())
+    assert got == [".extracted.json", "req/a.xml", "req/b.csv"]
+    assert (out / "req" / "a.xml").read_text() == MEMBERS["req/a.xml"]
+    download_t1.download_pure(out, page)
+    assert stand_in.hits("/files/req.zip") == 1                 # blob reused by checksum
+    _, archive, _ = download_t1._download_first_matching_from_record(page)
+    assert download_t1.extract_members(archive, out) == 0        # CRC ledger: nothing changed
+    (out / "req" / "b.csv").unlink()
+    assert download_t1.extract_members(archive, out) == 1
+    changed = _zip({**MEMBERS, "req/a.xml": "<req>The system shall log twice.</req>"})
+    page = _record(stand_in, changed, etag='"r2"')
+    download_t1.download_pure(out, page)
+    assert stand_in.hits("/files/req.zip") == 2 and "twice" in (out / "req" / "a.xml").read_text()
+    assert download_t1.extract_members(download_t1._fetch_file(stand_in.url + "/files/req.zip",
+                                                               "md5:" + hashlib.md5(changed).hexdigest())[0], out) == 0
@@ -0,0 +1,97 @@
+import json, time
+import yaml
+import fetch_sources
+
+PDF = b"%PDF-1.4 body " * 100
+
+def _conf(tmp_path, sources):
+    p = tmp_path / "sources.yaml"
+    p.write_text(yaml.safe_dump({"sources": sources}))
+    return p
+
+def _run(tmp_path, sources, **kw):
+    out = tmp_path / "out"
+    assert fetch_sources.main(conf=_conf(tmp_path, sources), out_dir=out, **kw) == 0
+    return out, json.loads((out / "manifest.json").read_text())["sources"]
+
+def _etag_route(body, etag='"v1"'):
+    def route(req):
+        if req.headers.get("If-None-Match") == etag:
+            return 304, {"ETag": etag}, b""
+        return 200, {"Content-Type": "application/pdf", "ETag": etag}, body
+    return route
+
+def test_conditional_get_returns_unchanged(stand_in, tmp_path):
+    stand_in.routes["/a.pdf"] = _etag_route(PDF)
+    src = [{"name": "A", "url": stand_in.url + "/a.pdf"}]
+    out, man = _run(tmp_path, src)
+    assert (out / "A.pdf").read_bytes() == PDF and man["A"]["etag"] == '"v1"'
+    mtime = (out / "A.pdf").stat().st_mtime_ns
+    _run(tmp_path, src)
+    assert stand_in.log[-1][1].get("If-None-Match") == '"v1"'
+    assert (out / "A.pdf").stat().st_mtime_ns == mtime
+    _run(tmp_path, src, force=True)
+    assert "If-None-Match" not in stand_in.log[-1][1]
+
+def test_skip_existing_makes_no_request(stand_in, tmp_path):
+    stand_in.routes["/a.pdf"] = _etag_route(PDF)
+    src = [{"name": "A", "url": stand_in.url + "/a.pdf"}]
+    _run(tmp_path, src)
+    _run(tmp_path, src, skip_existing=True)
+    assert stand_in.hits("/a.pdf") == 1
+
+def test_failed_download_keeps_previous_file(stand_in, tmp_path, monkeypatch):
+    monkeypatch.setattr(fetch_sources.time, "sleep", lambda s: None)
+    stand_in.routes["/a.pdf"] = lambda req: (200, {"Content-Type": "application/pdf"}, PDF)
+    src = [{"name": "A", "url": stand_in.url + "/a.pdf"}]
+    out, _ = _run(tmp_path, src)
+
+    def truncated(req):
+        req.close_connection = True
+        return 200, {"Content-Type": "application/pdf", "Content-Length": str(10 * len(PDF))}, b"%PDF-2 partial"
+    stand_in.routes["/a.pdf"] = truncated
+    _run(tmp_path, src, force=True)
+    assert (out / "A.pdf").read_bytes() == PDF
+    assert not list(out.glob("*.part"))
+
+def test_body_lands_only_after_rename(stand_in, tmp_path):
+    out, body, seen = tmp_path / "out", PDF * 2000, []
+
+    def blocks():
+        yield body[:fetch_sources.CHUNK]
+        for _ in range(500):            # the client holds the first block: only the .part file exists
+            if (out / "A.pdf.part").exists():
+                break
+            time.sleep(0.01)
+        seen.append(sorted(p.name for p in out.iterdir()))
+        yield body[fetch_sources.CHUNK:]
+    stand_in.routes["/a.pdf"] = lambda req: (200, {"Content-Type": "application/pdf",
+                                                   "Content-Length": str(len(body))}, blocks())
+    _run(tmp_path, [{"name": "A", "url": stand_in.url + "/a.pdf"}])
+    assert seen == [["A.pdf.part"]]
+    assert sorted(p.name for p in out.iterdir()) == ["A.pdf", "manifest.json"]
+    assert (out / "A.pdf").read_bytes() == body
+
+def test_per_host_limit(stand_in, tmp_path):
+    stand_in.delay = 0.1
+    for i in range(6):
+        stand_in.routes[f"/{i}.pdf"] = lambda req: (200, {"Content-Type": "application/pdf"}, PDF)
+    src = [{"name": f"S{i}", "url": f"{stand_in.url}/{i}.pdf"} for i in range(6)]
+    out, man = _run(tmp_path, src, workers=6, per_host=2)
+    assert stand_in.peak == 2 and len(man) == 6
+
+def test_duplicate_names_each_reported(stand_in, tmp_path, capsys):
+    stand_in.routes["/a.pdf"] = lambda req: (200, {"Content-Type": "application/pdf"}, PDF)
+    stand_in.routes["/b.pdf"] = lambda req: (200, {"Content-Type": "application/pdf"}, PDF)
+    _run(tmp_path, [{"name": "A", "url": stand_in.url + "/a.pdf"}, {"name": "A", "url": stand_in.url + "/b.pdf"}])
+    assert stand_in.hits("/a.pdf") == 1 and stand_in.hits("/b.pdf") == 1
+    assert "Downloaded: 2 " in capsys.readouterr().out
+
+def test_type_change_removes_old_file(stand_in, tmp_path):
+    stand_in.routes["/doc"] = lambda req: (200, {"Content-Type": "text/html"}, b"<html><p>x</p></html>")
+    src = [{"name": "A", "url": stand_in.url + "/doc"}]
+    out, _ = _run(tmp_path, src)
+    assert (out / "A.html").exists()
+    stand_in.routes["/doc"] = lambda req: (200, {"Content-Type": "application/pdf"}, PDF)
+    out, man = _run(tmp_path, src)
+    assert (out / "A.pdf").exists() and not (out / "A.html").exists() and man["A"]["file"] == "A.pdf"
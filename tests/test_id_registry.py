@@ -0,0 +1,44 @@
+import hashlib
+import pandas as pd
+import clean_all
+
+def _hex(text):
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+def test_ids_are_content_addressed_and_persist(tmp_path):
+    path = tmp_path / "ids.sqlite"
+    reg = clean_all.IdRegistry(path)
+    ids, new = reg.assign(["a text", "b text", "a text"], ["PURE", "SYNTHETIC", "DOMAIN"])
+    assert ids == ["PURE_" + _hex("a text")[:12], "SYN_" + _hex("b text")[:12], ids[0]]
+    assert new == [True, True, True]
+    reg.commit(); reg.close()
+    reg = clean_all.IdRegistry(path)
+    ids2, new2 = reg.assign(["b text", "c text", "a text"], ["PURE", "PURE", "PURE"])
+    assert ids2 == [ids[1], "PURE_" + _hex("c text")[:12], ids[0]]     # the first source's prefix is kept
+    assert new2 == [False, True, False] and len(reg) == 3
+    reg.close()
+
+def test_uncommitted_ids_are_not_kept(tmp_path):
+    path = tmp_path / "ids.sqlite"
+    reg = clean_all.IdRegistry(path)
+    reg.assign(["a text"], ["PURE"]); reg.close()
+    assert len(clean_all.IdRegistry(path)) == 0
+
+def test_collision_extends_the_digest(tmp_path):
+    reg = clean_all.IdRegistry(tmp_path / "ids.sqlite")
+    taken = "PURE_" + _hex("a text")[:12]
+    reg.db.execute("INSERT INTO ids VALUES (?, ?, ?)", (b"\0" * 16, taken, "PURE"))
+    (got,), _ = reg.assign(["a text"], ["PURE"])
+    assert got == "PURE_" + _hex("a text")[:16]
+    reg.close()
+
+def test_merge_labels_by_id():
+    pool = pd.DataFrame({"id": ["x", "y", "z"], "req_text": ["1", "2", "3"], "ambig_presence": ["", "clear", ""],
+                         "notes": ["", "", "keep"]})
+    labels = pd.DataFrame({"id": ["y", "z", "q"], "ambig_presence": ["ambiguous", "ambiguous", "clear"],
+                           "notes": ["", "new", ""]})
+    out, n = clean_all.merge_labels(pool.copy(), labels, cols=["ambig_presence", "notes"])
+    assert out["ambig_presence"].tolist() == ["", "clear", "ambiguous"] and out["notes"].tolist() == ["", "", "keep"]
+    assert n == 1
+    out, n = clean_all.merge_labels(pool.copy(), labels, cols=["ambig_presence", "notes"], overwrite=True)
+    assert out["ambig_presence"].tolist() == ["", "ambiguous", "ambiguous"] and out["notes"].tolist() == ["", "", "new"]
@@ -0,0 +1,46 @@
+import re
+import numpy as np
+import pytest
+import bootstrap_v1_labels as lab
+
+TEXTS = ["The system shall be user friendly and respond as soon as possible.",
+         "It shall stop the pump if feasible; the user-friendly alarm must be adequate.",
+         "That value will be improved to be faster than before, as appropriate.",
+         "The ventilator should never exceed the dose.", "They may minimise the shutdown time.",
+         "The operator shall confirm each alarm within 2 s.", "Brakes apply within 2 s.",
+         "Die Bremse muss sicher sein – the airbag shall fire SAFELY.", "ASAP", "", "userfriendly UI",
+         "this", "The Ventilator's dose is OPTIMAL."]
+
+def _reference(texts, plan):
+    out = np.zeros(len(texts), dtype=np.uint16)
+    for _, bit, _, _, rx in plan:
+        out |= np.array([bit if rx.search(t) else 0 for t in texts], dtype=np.uint16)
+    return out
+
+def test_scan_equals_per_rule_search():
+    assert (lab.scan(TEXTS) == _reference(TEXTS, lab.PLAN)).all()
+
+def test_label_batch_columns():
+    out = lab.label_batch(TEXTS[:4])
+    assert list(out.columns) == lab.LABEL_COLS and len(out) == 4
+    assert out["ambig_presence"].tolist() == ["ambiguous"] * 4
+    assert out.loc[3, "severity"] == "high"                         # vague (never) + severity term (dose)
+    assert lab.label_batch(["Brakes apply within 2 s."]).iloc[0].tolist() == ["clear", "", "", "", ""]
+
+def test_edited_pattern_runs_regex_only():
+    rules = dict(lab.heuristics)
+    rules["comparative"] = (r"\b(than|before)\b", "lexical")
+    plan = lab.compile_rules(rules)
+    assert plan[1][2] is None and plan[0][2] is not None
+    assert (lab.scan(TEXTS, plan) == _reference(TEXTS, plan)).all()
+
+def test_pattern_edit_without_token_update_fails(monkeypatch):
+    monkeypatch.setitem(lab.heuristics, "unbounded", (r"\b(always|never|asap|forever)\b", "lexical"))
+    with pytest.raises(ValueError, match="unbounded.*another pattern"):
+        lab._check_plan(lab.compile_rules())
+
+def test_stale_token_sets_fail(monkeypatch):
+    digest, words, triggers = lab.scan_tokens["unbounded"]
+    monkeypatch.setitem(lab.scan_tokens, "unbounded", (digest, words - {"asap"}, triggers))
+    with pytest.raises(ValueError, match="disagree"):
+        lab._check_plan(lab.compile_rules())
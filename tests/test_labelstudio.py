@@ -0,0 +1,57 @@
+import json
+import pandas as pd
+import labelstudio, storage
+
+def _pool(tmp_path, n=5):
+    df = pd.DataFrame({"id": [f"R{i}" for i in range(n)], "source": "s", "tier": "T1", "sector": "rail",
+                       "document": "d", "req_text": [f"The system shall respond quickly {i}." for i in range(n)],
+                       **{c: "" for c in labelstudio.LABEL_COLS}})
+    storage.write_table(df, tmp_path / "pool.parquet")
+    return tmp_path / "pool.parquet"
+
+def _export(tmp_path, pool, **kw):
+    return labelstudio.export_tasks(pool, None, tmp_path / "ls", chunk=2, ledger=tmp_path / "ls" / "exported.sqlite", **kw)
+
+def _annotate(task, **choices):
+    """What Label Studio gives back for a task annotated with its prediction, `choices` overriding."""
+    result = [dict(r) for r in task["predictions"][0]["result"] if r["from_name"] not in choices]
+    result += [{"from_name": k, "to_name": "text", "type": "choices", "value": {"choices": [v]}} for k, v in choices.items()]
+    return {"data": task["data"], "annotations": [{"result": result, "updated_at": "2026-01-01T00:00:00Z"},
+                                                   {"result": [], "was_cancelled": True, "updated_at": "2027-01-01"}]}
+
+def test_export_is_chunked_and_incremental(tmp_path):
+    pool = _pool(tmp_path)
+    files = _export(tmp_path, pool)
+    tasks = [t for f in files for t in json.loads(f.read_text())]
+    assert [len(json.loads(f.read_text())) for f in files] == [2, 2, 1]
+    assert [t["data"]["pool_id"] for t in tasks] == [f"R{i}" for i in range(5)]
+    picked = {r["from_name"]: r["value"] for r in tasks[0]["predictions"][0]["result"]}
+    assert picked["sector"] == {"choices": ["rail"]} and picked["ambig_presence"]["choices"][0] in ("clear", "ambiguous")
+    assert _export(tmp_path, pool) == []
+    assert _export(tmp_path, _pool(tmp_path, n=7), limit=1)[0].read_text().count("pool_id") == 1
+
+def test_round_trip_merges_latest_annotation(tmp_path):
+    pool = _pool(tmp_path)
+    tasks = [t for f in _export(tmp_path, pool) for t in json.loads(f.read_text())]
+    export = tmp_path / "export.json"
+    export.write_text(json.dumps([_annotate(tasks[0], ambig_presence="ambiguous", sector="medical"),
+                                  _annotate(tasks[1], ambig_presence="clear", reg_clause="ISO_26262")]))
+    assert labelstudio.import_annotations([export], pool, ledger=tmp_path / "ls" / "exported.sqlite") == 2
+    df = storage.read_table(pool).astype(str).set_index("id")
+    assert df.loc["R0", "ambig_presence"] == "ambiguous" and df.loc["R0", "sector"] == "medical"
+    assert df.loc["R1", "reg_clause"] == "ISO_26262" and df.loc["R2", "ambig_presence"] == ""
+    assert len(df) == 5 and list(df.index) == [f"R{i}" for i in range(5)]
+
+def test_json_min_newer_wins_and_keeps_labels_unless_overwrite(tmp_path):
+    pool = _pool(tmp_path, n=2)
+    old, new = tmp_path / "old.json", tmp_path / "new.json"
+    old.write_text(json.dumps([{"pool_id": "R0", "ambig_presence": "clear", "updated_at": "2026-01-01"}]))
+    new.write_text(json.dumps([{"pool_id": "R0", "ambig_presence": "ambiguous", "ambig_type": ["lexical", "semantic"],
+                                "updated_at": "2026-02-01"}]))
+    labelstudio.import_annotations([new, old], pool, ledger=tmp_path / "l.sqlite")
+    df = storage.read_table(pool).astype(str).set_index("id")
+    assert df.loc["R0", "ambig_presence"] == "ambiguous" and df.loc["R0", "ambig_type"] == "lexical;semantic"
+    labelstudio.import_annotations([old], pool, ledger=tmp_path / "l.sqlite")
+    assert storage.read_table(pool).astype(str).set_index("id").loc["R0", "ambig_presence"] == "ambiguous"
+    labelstudio.import_annotations([old], pool, overwrite=True, ledger=tmp_path / "l.sqlite")
+    assert storage.read_table(pool).astype(str).set_index("id").loc["R0", "ambig_presence"] == "clear"
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import near_dup, storage
+
+BASE = ["The brake controller shall engage within 200 ms of a fault signal.",
+        "The infusion pump shall stop delivery when an occlusion is detected.",
+        "The operator console shall display the current altitude in feet.",
+        "All log entries shall carry a UTC timestamp with millisecond precision."]
+VARIANTS = ["THE BRAKE CONTROLLER SHALL ENGAGE WITHIN 350 MS OF A FAULT SIGNAL!",
+            "The infusion-pump shall stop delivery when an occlusion is detected",
+            "the operator console shall display the current altitude in feet ..."]
+
+def _texts():
+    rng = np.random.default_rng(0)
+    words = ["".join(chr(97 + c) for c in rng.integers(0, 26, 6)) for _ in range(500)]
+    filler = [" ".join(words[x] for x in rng.integers(0, 500, 12)) for _ in range(200)]
+    return BASE + filler + VARIANTS + ["...", "!!"]
+
+def _clusters(texts, batch, **kw):
+    idx = near_dup.NearDupIndex(0.8, **kw)
+    for i in range(0, len(texts), batch):
+        idx.add([f"r{j}" for j in range(i, min(i + batch, len(texts)))], texts[i:i + batch])
+    return idx, idx.clusters()
+
+def test_variants_join_their_original():
+    texts = _texts()
+    _, df = _clusters(texts, 1000)
+    canon = dict(zip(df["id"], df["canonical_id"]))
+    n = len(texts)
+    for k in range(3):
+        assert canon[f"r{n - 5 + k}"] == f"r{k}"
+    assert canon["r3"] == "r3"
+    assert canon[f"r{n - 2}"] == f"r{n - 2}" and canon[f"r{n - 1}"] == f"r{n - 1}"     # blank texts stay alone
+    assert int((~df["is_canonical"]).sum()) == 3
+
+def test_batching_and_disk_store_do_not_change_clusters(tmp_path):
+    texts = _texts()
+    _, one = _clusters(texts, 1000)
+    idx, many = _clusters(texts, 7, store=tmp_path / "index.npz")
+    assert many.equals(one)
+    assert sum(len(runs) for runs in idx.tables) <= idx.bands * 8        # runs are merged, not one per batch
+
+def test_save_load_and_extend(tmp_path):
+    texts = _texts()
+    path = tmp_path / "index.npz"
+    idx, _ = _clusters(texts[:100], 30, store=path)
+    idx.save(path)
+    again = near_dup.NearDupIndex.load(path)
+    assert isinstance(again._sigs, np.memmap) and len(again) == 100
+    again.add([f"r{j}" for j in range(100, len(texts))], texts[100:])
+    again.save(path)
+    _, want = _clusters(texts, 1000)
+    assert near_dup.NearDupIndex.load(path).clusters().equals(want)
+    assert len(list(tmp_path.glob("*.sigs"))) == 1
+
+def test_cluster_pool_reroots_departed_canonical(tmp_path):
+    texts = _texts()
+    pool = tmp_path / "pool.parquet"
+    storage.write_table(pd.DataFrame({"id": [f"r{j}" for j in range(len(texts))], "req_text": texts}), pool)
+    kw = dict(out=tmp_path / "clusters.parquet", index_path=tmp_path / "index.npz", chunksize=50)
+    near_dup.cluster_pool(pool, **kw)
+    storage.write_table(pd.DataFrame({"id": [f"r{j}" for j in range(1, len(texts))], "req_text": texts[1:]}), pool)
+    df = near_dup.cluster_pool(pool, **kw)
+    variant = f"r{len(texts) - 5}"
+    row = df.set_index("id").loc[variant]
+    assert "r0" not in set(df["id"]) and row["canonical_id"] == variant and row["is_canonical"]
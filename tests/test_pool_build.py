@@ -0,0 +1,44 @@
+import pandas as pd
+import clean_all, storage
+from conftest import write_raw
+
+PURE = ["The ECU shall log faults.", "The system shall respond quickly.", "short", "The ECU shall log faults.",
+        "The pump shall stop on occlusion."]
+SYN = ["The system shall respond quickly.", "The aircraft shall report its position.", "Trains shall stop at red."]
+
+def _raw(data):
+    write_raw(data, "t1_pure", "a.csv", PURE)
+    write_raw(data, "t2_synthetic", "b.csv", SYN, col="sentence")
+
+def test_stream_matches_memory_build(pool_env):
+    _raw(pool_env)
+    mem = clean_all.build_pool(fmt="parquet").astype(str)
+    clean_all.POOL.unlink(); clean_all.REGISTRY.unlink()
+    out = clean_all.build_pool(stream=True, chunksize=2)
+    got = storage.read_table(out).astype(str)
+    assert got.to_dict("records") == mem.to_dict("records")
+    assert got["req_text"].is_unique and not got["req_text"].str.len().le(5).any()
+    # first occurrence wins: the text shared by both tiers stays T1/PURE
+    row = got.set_index("req_text").loc["The system shall respond quickly."]
+    assert (row["tier"], row["source"]) == ("T1", "PURE")
+    assert dict(zip(got["req_text"], got["sector"]))["The ECU shall log faults."] == "automotive"
+
+def test_stream_rebuild_keeps_ids_and_labels(pool_env):
+    _raw(pool_env)
+    first = storage.read_table(clean_all.build_pool(stream=True, chunksize=2)).astype(str)
+    assert len(storage.read_table(clean_all.DELTA)) == len(first)
+    pool = first.copy()
+    pool.loc[pool["req_text"].str.startswith("The pump"), ["ambig_presence", "notes"]] = ["ambiguous", "checked"]
+    storage.write_table(pool, clean_all.POOL)
+    write_raw(pool_env, "t2_synthetic", "c.csv", ["The scheduler shall meet all deadlines."])
+    second = storage.read_table(clean_all.build_pool(stream=True, chunksize=2)).astype(str)
+    ids = dict(zip(first["req_text"], first["id"]))
+    assert all(ids[t] == i for t, i in zip(second["req_text"], second["id"]) if t in ids)
+    labelled = second[second["req_text"].str.startswith("The pump")].iloc[0]
+    assert (labelled["ambig_presence"], labelled["notes"]) == ("ambiguous", "checked")
+    delta = storage.read_table(clean_all.DELTA)
+    assert delta["req_text"].tolist() == ["The scheduler shall meet all deadlines."]
+
+def test_stream_without_raw_files(pool_env):
+    assert clean_all.build_pool(stream=True) is None
+    assert not clean_all.POOL.exists()
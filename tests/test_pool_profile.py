@@ -0,0 +1,49 @@
+import sqlite3
+import pandas as pd
+import pool_profile, storage
+
+TEXTS = ["The system shall respond quickly.", "The operator shall log in.", "It should be user-friendly.",
+         "Data shall be kept for 5 years.", "The unit may be reset as appropriate."]
+
+def _pool(n=200):
+    return pd.DataFrame({"id": [f"R{i:04d}" for i in range(n)], "document": [f"doc{i % 7}" for i in range(n)],
+                         "tier": [f"T{i % 3 + 1}" for i in range(n)], "sector": ["rail", "health"] * (n // 2),
+                         "req_text": [f"{TEXTS[i % 5]} Item {i}." for i in range(n)],
+                         "ambig_presence": "", "ambig_type": "", "reg_clause": "", "severity": "",
+                         "notes": [f"note {i}" for i in range(n)]})
+
+def _run(tmp_path, df, full=False):
+    storage.write_table(df, tmp_path / "pool.parquet")
+    return pool_profile.profile(tmp_path / "pool.parquet", tmp_path / "report.json", tmp_path / "state.json",
+                                full=full, batch_size=64)
+
+def test_incremental_matches_full_rescan(tmp_path):
+    df = _pool()
+    _run(tmp_path, df)
+    df.loc[df.index[:30], ["ambig_presence", "ambig_type"]] = ["ambiguous", "vague_term"]
+    df = df.drop(index=range(150, 170))
+    inc = _run(tmp_path, df)
+    full = _run(tmp_path, df, full=True)
+    assert inc["rows"] == full["rows"] == 180
+    for key in ("crosstabs", "req_text_length", "heuristics", "weak_labeled_rows"):
+        assert inc[key] == full[key]
+    for c in pool_profile.LEDGER_COLS:
+        assert inc["columns"][c] == full["columns"][c]
+    # sketch-only: a relabeled id is not counted twice
+    doc0 = dict((v, n) for v, n, _ in inc["columns"]["document"]["top"])["doc0"]
+    assert doc0 == int((_pool()["document"] == "doc0").sum())
+
+def test_ledger_keeps_no_free_text(tmp_path):
+    _run(tmp_path, _pool())
+    db = sqlite3.connect(tmp_path / "state.sqlite")
+    vals = [v for (v,) in db.execute("SELECT vals FROM rows")]
+    assert vals and not any("note" in v or "doc" in v for v in vals)
+
+def test_rule_edit_forces_rescan(tmp_path, monkeypatch, capsys):
+    _run(tmp_path, _pool())
+    _run(tmp_path, _pool())
+    assert "profiled: 0 " in capsys.readouterr().out
+    lab = pool_profile.rule_cache.labeler()
+    monkeypatch.setitem(lab.heuristics, "vague_term", (r"\bquickly\b", lab.heuristics["vague_term"][1]))
+    _run(tmp_path, _pool())
+    assert "profiled: 200 " in capsys.readouterr().out
@@ -0,0 +1,38 @@
+import json
+import numpy as np
+import rule_cache
+
+TEXTS = ["The system shall respond quickly.", "The operator shall log in.", "It should be user-friendly.",
+         "Data shall be kept for 5 years.", "The unit may be reset as appropriate.", "It shall be fast."]
+
+def _masks(tmp_path, ids, texts):
+    return rule_cache.RuleCache(tmp_path / "rc").masks(ids, texts)
+
+def test_masks_equal_scan_and_are_cached(tmp_path, capsys):
+    lab = rule_cache.labeler()
+    ids = [f"R{i}" for i in range(len(TEXTS))]
+    assert np.array_equal(_masks(tmp_path, ids, TEXTS), lab.scan(TEXTS))
+    assert np.array_equal(_masks(tmp_path, ids[::-1], TEXTS[::-1]), lab.scan(TEXTS[::-1]))
+    assert "0 rule evaluations" in capsys.readouterr().out.splitlines()[-1]
+
+def test_ids_are_appended_not_rewritten(tmp_path):
+    _masks(tmp_path, ["R0", "R1"], TEXTS[:2])
+    first = (tmp_path / "rc" / "ids.txt").read_text()
+    _masks(tmp_path, ["R1", "R2"], TEXTS[1:3])
+    after = (tmp_path / "rc" / "ids.txt").read_text()
+    assert after.startswith(first) and after.count("\n") == 3 and after.split("\n")[2].startswith("R2\t")
+
+def test_positional_id_with_new_text_is_rescanned(tmp_path):
+    lab = rule_cache.labeler()
+    _masks(tmp_path, ["PURE_000001"], [TEXTS[1]])
+    assert np.array_equal(_masks(tmp_path, ["PURE_000001"], [TEXTS[0]]), lab.scan([TEXTS[0]]))
+
+def test_interrupted_update_is_cut_back(tmp_path):
+    _masks(tmp_path, ["R0", "R1"], TEXTS[:2])
+    with open(tmp_path / "rc" / "ids.txt", "a") as fh:
+        fh.write("R9\tdeadbeef\nR1")                  # appended, but meta.json never written
+    cache = rule_cache.RuleCache(tmp_path / "rc")
+    assert cache.rows == 2 and (tmp_path / "rc" / "ids.txt").read_text().count("\n") == 2
+    meta = json.loads((tmp_path / "rc" / "meta.json").read_text())
+    (tmp_path / "rc" / "meta.json").write_text(json.dumps({**meta, "version": 0}))
+    assert rule_cache.RuleCache(tmp_path / "rc").rows == 0 and not list((tmp_path / "rc").glob("*.npz"))
@@ -0,0 +1,77 @@
+import json
+import pytest
+import run_ingest
+
+STAGE = '''
+from pathlib import Path
+def main(src, dst, log, fail=False):
+    Path(log).open("a").write(Path(__file__).stem + "\\n")
+    if fail:
+        raise RuntimeError("boom")
+    Path(dst).parent.mkdir(parents=True, exist_ok=True)
+    Path(dst).write_text(Path(src).read_text().upper())
+'''
+
+@pytest.fixture
+def dag(tmp_path, monkeypatch):
+    """Three toy stages a → b, c (independent), reading/writing under tmp_path."""
+    (tmp_path / "in").mkdir()
+    (tmp_path / "in" / "a.txt").write_text("alpha")
+    (tmp_path / "in" / "c.txt").write_text("gamma")
+    for s in "abcf":
+        (tmp_path / f"{s}.py").write_text(STAGE)
+    stage = lambda *a, **kw: _stage(tmp_path, *a, **kw)
+    monkeypatch.setattr(run_ingest, "ROOT", tmp_path)
+    monkeypatch.setattr(run_ingest, "INTERIM", tmp_path / "interim")
+    monkeypatch.setattr(run_ingest, "STATE", tmp_path / "interim" / "state.json")
+    monkeypatch.setattr(run_ingest, "REPORTS", tmp_path / "interim" / "reports")
+    monkeypatch.setattr(run_ingest, "STAGES", {"a": stage("a", "in/a.txt", "out/a.txt"),
+                                               "b": stage("b", "out/a.txt", "out/b.txt", deps=["a"]),
+                                               "c": stage("c", "in/c.txt", "out/c.txt")})
+    return tmp_path
+
+def _stage(root, name, src, dst, deps=(), **kw):
+    """A STAGES entry running <root>/<name>.py (code paths are absolute: spawned workers keep the real ROOT)."""
+    return (str(root / f"{name}.py"), "main", {"src": str(root / src), "dst": str(root / dst),
+                                               "log": str(root / "log.txt"), **kw}, list(deps), [src], [dst])
+
+def _log(root):
+    p = root / "log.txt"
+    return p.read_text().split() if p.exists() else []
+
+def test_runs_then_skips_unchanged(dag):
+    assert run_ingest.run(workers=2) == 0
+    assert sorted(_log(dag)) == ["a", "b", "c"] and (dag / "out" / "b.txt").read_text() == "ALPHA"
+    assert run_ingest.run(workers=2) == 0
+    assert len(_log(dag)) == 3
+    latest = json.loads((dag / "interim" / "reports" / "latest.json").read_text())
+    assert {s["status"] for s in latest["stages"].values()} == {"up-to-date"}
+
+def test_input_change_reruns_downstream_only(dag):
+    run_ingest.run(workers=2)
+    (dag / "in" / "a.txt").write_text("alpha 2")
+    run_ingest.run(workers=2)
+    assert _log(dag)[3:] == ["a", "b"] and (dag / "out" / "b.txt").read_text() == "ALPHA 2"
+
+def test_missing_output_reruns_stage(dag):
+    run_ingest.run(workers=2)
+    (dag / "out" / "c.txt").unlink()
+    run_ingest.run(workers=2)
+    assert _log(dag)[3:] == ["c"]
+
+def test_failure_blocks_dependents(dag, monkeypatch):
+    stages = dict(run_ingest.STAGES)
+    stages["a"] = _stage(dag, "f", "in/a.txt", "out/a.txt", fail=True)
+    monkeypatch.setattr(run_ingest, "STAGES", stages)
+    assert run_ingest.run(workers=2) == 1
+    latest = json.loads((dag / "interim" / "reports" / "latest.json").read_text())
+    assert latest["stages"]["a"]["status"] == "failed" and "boom" in latest["stages"]["a"]["error"]
+    assert latest["stages"]["b"]["status"] == "blocked" and latest["stages"]["c"]["status"] == "ok"
+    assert "a" not in json.loads((dag / "interim" / "state.json").read_text())["stages"]
+
+def test_only_pulls_in_dependencies(dag):
+    assert run_ingest._select("b") == ["a", "b"]
+    assert run_ingest.run(only="b", dry_run=True) == 0
+    assert _log(dag) == [] and not (dag / "interim" / "reports").exists()
+    with pytest.raises(SystemExit):
+        run_ingest._select("nope")
@@ -0,0 +1,67 @@
+import asyncio, json, threading, urllib.error, urllib.request
+import pytest
+import score_server
+
+@pytest.fixture(scope="module")
+def server():
+    loop, addr = asyncio.new_event_loop(), []
+    ready = threading.Event()
+    task = loop.create_task(score_server.serve(port=0, max_wait_ms=2, max_queue=100,
+                                               ready=lambda a: (addr.append(a), ready.set())))
+
+    def run():
+        try:
+            loop.run_until_complete(task)
+        except asyncio.CancelledError:
+            pass
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    assert ready.wait(10)
+    yield f"http://{addr[0][0]}:{addr[0][1]}"
+    loop.call_soon_threadsafe(task.cancel)
+    thread.join(5)
+
+def _call(url, path, body=None):
+    req = urllib.request.Request(url + path, data=None if body is None else json.dumps(body).encode())
+    try:
+        with urllib.request.urlopen(req, timeout=10) as r:
+            raw = r.read().decode()
+            return r.status, json.loads(raw) if r.headers["Content-Type"] == "application/json" else raw
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+def test_scores_match_the_labeler(server):
+    lab = score_server.labeler
+    texts = ["The system shall respond quickly.", "The operator shall log in.", "It should be user-friendly."]
+    status, out = _call(server, "/score", {"texts": texts})
+    want = lab.labels_from_masks(lab.scan(texts))[lab.LABEL_COLS].to_dict("records")
+    assert status == 200 and out["results"] == want
+    assert _call(server, "/score", {"text": texts[0]})[1]["results"] == want[:1]
+
+def test_cache_ignores_sector_without_model(server):
+    text = "The pump shall stop as appropriate."
+    _call(server, "/score", {"text": text, "sector": "rail"})
+    hits = _call(server, "/stats")[1]["cache_hits"]
+    _call(server, "/score", {"text": text, "sector": "medical"})
+    assert _call(server, "/stats")[1]["cache_hits"] == hits + 1
+
+def test_errors_and_metrics(server):
+    assert _call(server, "/score", {"nope": 1})[0] == 400
+    assert _call(server, "/stats", {"text": "x"})[0] == 405
+    assert _call(server, "/missing")[0] == 404
+    assert _call(server, "/score", {"texts": [f"text {i}" for i in range(101)]})[0] == 413
+    status, prom = _call(server, "/metrics")
+    assert status == 200 and "# TYPE regulqa_score_requests_total counter" in prom
+    assert "regulqa_score_rejected_total 1" in prom and "regulqa_score_latency_ms_p99 " in prom
+
+def test_full_queue_is_rejected_with_503():
+    async def run():
+        scorer = score_server.Scorer(cache_size=0)
+        scorer.queue = asyncio.Queue(maxsize=3)                 # no batcher: queued texts stay queued
+        waiting = asyncio.create_task(scorer.score(["a", "b"]))
+        await asyncio.sleep(0)
+        with pytest.raises(score_server.Overloaded) as e:
+            await scorer.score(["c", "d"])
+        assert e.value.status == 503 and scorer.queue.qsize() == 2 and scorer.stats.rejected == 1
+        waiting.cancel()
+    asyncio.run(run())
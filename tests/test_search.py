@@ -0,0 +1,44 @@
+import pandas as pd
+import pytest
+import search, storage
+
+def _pool(tmp_path, rows):
+    df = pd.DataFrame(rows, columns=["id", "tier", "sector", "source", "ambig_presence", "document", "req_text"])
+    storage.write_table(df, tmp_path / "pool.parquet")
+    return tmp_path / "pool.parquet"
+
+ROWS = [("A", "T1", "automotive", "PURE", "", "d1", "The brake shall be applied within 50 ms."),
+        ("B", "T3", "rail", "DOMAIN", "ambiguous", "d2", "The train should stop as soon as possible."),
+        ("C", "T1", "medical", "PURE", "clear", "d3", "The pump shall be réinitialised after a fault."),
+        ("D", "T2", "automotive", "SYNTHETIC", "", "d4", "Real-time braking shall be supported.")]
+
+def test_update_is_incremental(tmp_path):
+    idx = tmp_path / "idx.sqlite"
+    pool = _pool(tmp_path, ROWS)
+    assert search.update(pool, idx) == (4, 0, 0)
+    assert search.update(pool, idx) == (0, 0, 0)                  # same file: skipped
+    rows = [r if r[0] != "A" else r[:4] + ("ambiguous",) + r[5:] for r in ROWS if r[0] != "D"]
+    pool = _pool(tmp_path, rows + [("E", "T3", "energy", "DOMAIN", "", "d5", "The grid shall recover.")])
+    assert search.update(pool, idx) == (1, 1, 1)
+    assert search.count(path=idx) == 4 and search.count("braking", path=idx) == 0
+    assert search.query("brake", path=idx)["ambig_presence"].tolist() == ["ambiguous"]
+
+def test_query_syntax_and_filters(tmp_path):
+    idx = tmp_path / "idx.sqlite"
+    search.update(_pool(tmp_path, ROWS), idx)
+    assert search.query('"shall be"', path=idx, order="pool")["id"].tolist() == ["A", "C", "D"]
+    assert search.count("brak*", path=idx) == 2 and search.count("brak*", sector="automotive", tier="T2", path=idx) == 1
+    assert search.count("reinitialised", path=idx) == 1            # diacritics folded
+    assert search.count("shall NOT brake", tier=["T1", "T2"], path=idx) == 2
+    assert search.count(source="PURE", path=idx) == 2 and search.count("stop", ambig_presence="ambiguous", path=idx) == 1
+    hit = search.query("train", path=idx)
+    assert hit["id"].tolist() == ["B"] and "[train]" in hit["snippet"][0]
+
+def test_bad_query_and_missing_index(tmp_path):
+    idx = tmp_path / "idx.sqlite"
+    search.update(_pool(tmp_path, ROWS), idx)
+    with pytest.raises(ValueError, match="real-time"):
+        search.query("real-time", path=idx)
+    assert search.count('"real-time"', path=idx) == 1
+    with pytest.raises(FileNotFoundError):
+        search.count("x", path=tmp_path / "none.sqlite")
@@ -0,0 +1,39 @@
+import segmenter
+
+WORDS = "alpha bravo charlie delta echo foxtrot golf hotel india juliet kilo lima".split()
+
+def _pages(n, body):
+    """Pages with a running header and footer around a few body lines of their own."""
+    return [f"ACME Spec v2\nSection {WORDS[i % 12]}\n{body(i)}\nNotes on {WORDS[(i + 5) % 12]}\n"
+            f"Page {i + 1} of {n}" for i in range(n)]
+
+def test_running_headers_and_footers_are_dropped():
+    pages = list(segmenter.strip_running(_pages(12, lambda i: f"The unit shall report item {i}.")))
+    assert len(pages) == 12
+    assert all("ACME" not in p and "Page" not in p for p in pages)
+    assert pages[5] == "Section foxtrot\nThe unit shall report item 5.\nNotes on kilo"
+
+def test_rare_edge_lines_are_kept():
+    pages = ["Title page\nIntro text."] + [f"Body {i}." for i in range(11)]
+    assert next(segmenter.strip_running(pages)).startswith("Title page")
+
+def test_sentences_cross_page_breaks():
+    chunks = ["The system shall log each", "call. It should retry\non error. Then", "stop"]
+    assert list(segmenter.iter_sentences(chunks)) == [
+        "The system shall log each call.", "It should retry on error.", "Then stop"]
+
+def test_boundary_needs_upper_case_or_digit():
+    assert list(segmenter.iter_sentences(["See e.g. section 3. 4 users shall log in."])) == [
+        "See e.g. section 3.", "4 users shall log in."]
+
+def test_unterminated_run_is_flushed_at_max_carry():
+    out = list(segmenter.iter_sentences(["word " * 10] * 5, max_carry=100))
+    assert all(len(s) <= 100 + 60 for s in out) and len(out) > 1
+    assert " ".join(out).split() == ["word"] * 50
+
+def test_segment_pages_is_lazy():
+    def pages():
+        yield from _pages(10, lambda i: f"Item {i} shall work.")
+        raise AssertionError("read past the first sentences")
+    it = segmenter.segment_pages(pages())
+    assert next(it) == "Section alpha Item 0 shall work."
@@ -1,47 +1,85 @@
 """
 Extract requirement-like sentences from T3 downloads into CSVs.
 Usage:
-  python tools/extract_to_csv.py [--min-len 15] [--max-len 500] [--regex "..."]
+  python tools/extract_to_csv.py [--min-len 15] [--max-len 500] [--regex "..."] [--workers N]
+
+PDF text is segmented across pages (src/data/segmenter.py): running
+headers/footers are stripped and sentences crossing a page break stay whole.
+
+With --workers N > 1 files are spread over a process pool, and large PDFs are
+split into page ranges (--pages-per-task) whose text is segmented in order by
+the parent, so the CSVs are identical to the serial run.
+
+Extraction results are cached under harvested/.cache/ keyed by
+(file sha256, EXTRACTOR_VERSION, min_len, max_len, regex): unchanged documents
+are not parsed again and their CSVs are left alone, and ALL_t3_harvested.csv is
+only appended to / rebuilt when a per-source CSV actually changed.
+Bump EXTRACTOR_VERSION whenever the extraction logic changes.
 """
-import argparse, re, csv
+import argparse, re, sys, csv, json, hashlib
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 
 ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "src" / "data"))
+import html_extract, metrics, segmenter
+
 DL = ROOT / "data" / "raw" / "t3_domain" / "downloads"
 OUT = ROOT / "data" / "raw" / "t3_domain" / "harvested"
+CACHE = OUT / ".cache"
 OUT.mkdir(parents=True, exist_ok=True)
 
+EXTRACTOR_VERSION = "3"
+
 def sentences_from_text(text):
-    import re
-    parts = re.split(r'(?<=[.?!])\s+(?=[A-Z0-9])', text)
-    return [re.sub(r'\s+', ' ', p).strip() for p in parts if p and len(p.strip())>0]
+    return list(segmenter.iter_sentences([text]))
+
+def pdf_pages(path, start=0, stop=None):
+    """Raw text of pages [start, stop) of a PDF."""
+    import fitz
+    with fitz.open(path) as doc:
+        return [doc[pno].get_text("text") for pno in range(start, doc.page_count if stop is None else min(stop, doc.page_count))]
 
 def from_pdf(path):
+    """Sentences of a whole PDF, streamed page by page (running headers/footers removed,
+    sentences crossing a page break kept whole)."""
     import fitz
-    doc = fitz.open(path)
-    for page in doc:
-        txt = page.get_text("text")
-        for s in sentences_from_text(txt):
-            yield s
+    with fitz.open(path) as doc:
+        yield from segmenter.segment_pages(page.get_text("text") for page in doc)
 
 def from_html(path):
-    from bs4 import BeautifulSoup
-    html = path.read_text(encoding="utf-8", errors="ignore")
-    soup = BeautifulSoup(html, "lxml")
-    tags = soup.find_all(["li","p"]) or soup.find_all(text=True)
-    for tag in tags:
-        t = tag.get_text(" ", strip=True) if hasattr(tag, "get_text") else str(tag)
-        t = ' '.join(t.split())
-        if t:
-            yield t
+    emitted = False
+    for t in html_extract.iter_blocks(path, ("li", "p")):
+        emitted = True
+        yield t
+    if not emitted:
+        yield from html_extract.iter_text(path)
 
 def from_txt(path):
     txt = path.read_text(encoding="utf-8", errors="ignore")
     for s in sentences_from_text(txt):
         yield s
 
-def process_file(path, rx_req, min_len, max_len):
+def _keep(sentences, rx_req, min_len, max_len):
+    if not metrics.enabled():
+        return [s for s in sentences if min_len <= len(s) <= max_len and rx_req.search(s)]
+    rx, out, n, length, rejected = metrics.pattern("extract.rx_req", rx_req), [], 0, 0, 0
+    for s in sentences:
+        n += 1
+        if not min_len <= len(s) <= max_len:
+            length += 1
+        elif not rx.search(s):
+            rejected += 1
+        else:
+            out.append(s)
+    metrics.count("extract.sentences", n)
+    metrics.count("extract.dropped", length, reason="length")
+    metrics.count("extract.dropped", rejected, reason="rx_req")
+    return out
+
+def _candidates(path, rx_req, min_len, max_len):
+    """Requirement-like sentences of one file, in order."""
     ext = path.suffix.lower()
     if ext == ".pdf":
         gen = from_pdf(path)
@@ -49,41 +87,191 @@ def process_file(path, rx_req, min_len, max_len):
         gen = from_html(path)
     else:
         gen = from_txt(path)
-    keep = []
-    for s in gen:
-        if min_len <= len(s) <= max_len and rx_req.search(s):
-            keep.append(s)
+    return _keep(gen, rx_req, min_len, max_len)
+
+def _dedup(keep):
     # dedup preserve order
     seen = set(); dedup = []
     for s in keep:
         if s not in seen:
             seen.add(s); dedup.append(s)
+    metrics.count("extract.dropped", len(keep) - len(dedup), reason="dedup")
     return dedup
 
-def main(min_len=15, max_len=500, regex=r"\b(shall|should|must)\b"):
+def process_file(path, rx_req, min_len, max_len):
+    with metrics.span("extract.file", kind=path.suffix.lower().lstrip(".")) as sp:
+        rows = _dedup(_candidates(path, rx_req, min_len, max_len))
+        sp.add(docs=1, bytes=path.stat().st_size, sentences=len(rows))
+    return rows
+
+def _run_task(task):
+    """Worker: page texts of a PDF page range, or the candidates of any other file."""
+    path, start, stop, regex, min_len, max_len = task
+    kind = Path(path).suffix.lower().lstrip(".")
+    with metrics.span("extract.task", kind=kind) as sp:
+        if kind == "pdf":
+            out = pdf_pages(path, start, stop)
+            sp.add(pages=len(out))
+        else:
+            out = _candidates(Path(path), re.compile(regex, re.I), min_len, max_len)
+            sp.add(docs=1, bytes=Path(path).stat().st_size)
+    metrics.flush()               # pool workers exit without atexit
+    return out
+
+def _page_count(path):
+    import fitz
+    with fitz.open(path) as doc:
+        return doc.page_count
+
+def iter_processed(paths, regex, min_len, max_len, workers=1, pages_per_task=64):
+    """Yield (path, rows) per file in input order; parallel over files and PDF page ranges.
+
+    PDF workers only extract page text; the parent segments each PDF's pages in
+    order, so sentences spanning task boundaries and header/footer detection
+    behave exactly as in the serial run.
+    """
     rx_req = re.compile(regex, re.I)
+    if workers <= 1:
+        for path in paths:
+            yield path, process_file(path, rx_req, min_len, max_len)
+        return
+    tasks, owners = [], []
+    for path in paths:
+        n = _page_count(path) if path.suffix.lower() == ".pdf" else 0
+        ranges = [(a, a + pages_per_task) for a in range(0, n, pages_per_task)] if n > pages_per_task else [(0, None)]
+        for a, b in ranges:
+            tasks.append((str(path), a, b, regex, min_len, max_len)); owners.append(path)
+
+    def finish(path, parts):
+        if path.suffix.lower() == ".pdf":
+            pages = (p for part in parts for p in part)
+            return _dedup(_keep(segmenter.segment_pages(pages), rx_req, min_len, max_len))
+        return _dedup([s for part in parts for s in part])
+
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        cur, buf = None, []
+        # map() yields in submission order → deterministic merge
+        for path, part in zip(owners, ex.map(_run_task, tasks)):
+            if path is not cur:
+                if cur is not None:
+                    yield cur, finish(cur, buf)
+                cur, buf = path, []
+            buf.append(part)
+        if cur is not None:
+            yield cur, finish(cur, buf)
+
+def sha256_file(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def cache_key(file_sha, min_len, max_len, regex):
+    """Extraction cache key: (content hash, extractor version, filter settings)."""
+    raw = json.dumps([file_sha, EXTRACTOR_VERSION, min_len, max_len, regex])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+def _cache_get(key):
+    p = CACHE / f"{key}.json"
+    try:
+        return json.loads(p.read_text(encoding="utf-8"))["rows"]
+    except Exception:
+        return None
+
+def _cache_put(key, name, rows):
+    CACHE.mkdir(parents=True, exist_ok=True)
+    tmp = CACHE / f"{key}.json.tmp"
+    tmp.write_text(json.dumps({"file": name, "rows": rows}), encoding="utf-8")
+    tmp.replace(CACHE / f"{key}.json")
+
+def _write_csv(out, name, rows):
+    with out.open("w", newline='', encoding="utf-8") as f:
+        w = csv.writer(f); w.writerow(["document","req_text"])
+        for s in rows:
+            w.writerow([name, s])
+
+def _csv_sig(path):
+    st = path.stat()
+    return [st.st_size, st.st_mtime_ns]
+
+def update_merged(out_dir=None):
+    """Refresh ALL_t3_harvested.csv from harvested/*.csv, touching only what changed.
+
+    Unchanged inputs → nothing is written; only new CSVs → their rows are appended
+    (minus texts already merged); anything changed/removed → rebuild.
+    """
+    out_dir = out_dir or OUT
+    merged_path = out_dir.parent / "ALL_t3_harvested.csv"
+    state_path = out_dir / "merge_state.json"
+    current = {c.name: _csv_sig(c) for c in sorted(out_dir.glob("*.csv"))}
+    try:
+        state = json.loads(state_path.read_text())
+    except Exception:
+        state = {}
+    prev = state.get("inputs", {})
+    if not current:
+        return None
+    if merged_path.exists() and prev == current:
+        print("ALL_t3_harvested.csv unchanged, rows:", state.get("rows"))
+        return state.get("rows")
+
+    added = [n for n in current if n not in prev]
+    if merged_path.exists() and prev and all(current.get(n) == sig for n, sig in prev.items()):
+        seen = set(pd.read_csv(merged_path, usecols=["req_text"])["req_text"].astype(str))
+        new = pd.concat([pd.read_csv(out_dir / n) for n in added], ignore_index=True).drop_duplicates(subset=["req_text"])
+        new = new[~new["req_text"].astype(str).isin(seen)]
+        new.to_csv(merged_path, mode="a", header=False, index=False)
+        rows = len(seen) + len(new)
+        print("ALL_t3_harvested.csv appended:", len(new), "rows:", rows)
+    else:
+        frames = [pd.read_csv(out_dir / n) for n in current]
+        merged = pd.concat(frames, ignore_index=True).drop_duplicates(subset=["req_text"])
+        merged.to_csv(merged_path, index=False)
+        rows = len(merged)
+        print("ALL_t3_harvested.csv rows:", rows)
+    state_path.write_text(json.dumps({"inputs": current, "rows": rows}, indent=2))
+    return rows
+
+def main(min_len=15, max_len=500, regex=r"\b(shall|should|must)\b", workers=1, pages_per_task=64,
+         use_cache=True):
     summary = []
-    for path in sorted(DL.glob("*")):
-        if path.suffix.lower() not in (".pdf",".html",".htm",".txt"):
-            continue
-        rows = process_file(path, rx_req, min_len, max_len)
+    paths = [p for p in sorted(DL.glob("*")) if p.suffix.lower() in (".pdf",".html",".htm",".txt")]
+    try:
+        prev = {e["file"]: e for e in json.loads((OUT / "manifest.json").read_text())}
+    except Exception:
+        prev = {}
+
+    keys, cached = {}, {}
+    for path in paths:
+        keys[path] = cache_key(sha256_file(path), min_len, max_len, regex)
+        rows = _cache_get(keys[path]) if use_cache else None
+        if rows is not None:
+            cached[path] = rows
+    todo = [p for p in paths if p not in cached]
+
+    metrics.count("extract.cache_hits", len(cached))
+    with metrics.span("extract.run", workers=workers) as sp:
+        fresh = iter_processed(todo, regex, min_len, max_len, workers, pages_per_task)
+        for path, rows in fresh:
+            _cache_put(keys[path], path.name, rows)
+            cached[path] = rows
+            sp.add(docs=1, bytes=path.stat().st_size, sentences=len(rows))
+            print("[parsed]", path.name)
+
+    for path in paths:
+        rows, key = cached[path], keys[path]
         if not rows:
             print("[empty]", path.name); continue
         out = OUT / f"{path.stem}.csv"
-        with out.open("w", newline='', encoding="utf-8") as f:
-            w = csv.writer(f); w.writerow(["document","req_text"])
-            for s in rows:
-                w.writerow([path.name, s])
-        print("[ok]", path.name, "→", out.name, "rows:", len(rows))
-        summary.append({"file": path.name, "rows": len(rows)})
+        if out.exists() and prev.get(path.name, {}).get("key") == key:
+            print("[cached]", path.name, "rows:", len(rows))
+        else:
+            _write_csv(out, path.name, rows)
+            print("[ok]", path.name, "→", out.name, "rows:", len(rows))
+        summary.append({"file": path.name, "rows": len(rows), "key": key})
     # merged
-    all_csvs = list(OUT.glob("*.csv"))
-    if all_csvs:
-        frames = [pd.read_csv(c) for c in all_csvs]
-        merged = pd.concat(frames, ignore_index=True).drop_duplicates(subset=["req_text"])
-        merged.to_csv(OUT.parent / "ALL_t3_harvested.csv", index=False)
-        print("ALL_t3_harvested.csv rows:", len(merged))
-    import json
+    update_merged(OUT)
     (OUT / "manifest.json").write_text(json.dumps(summary, indent=2))
 
 if __name__ == "__main__":
@@ -91,5 +279,8 @@ if __name__ == "__main__":
     ap.add_argument("--min-len", type=int, default=15)
     ap.add_argument("--max-len", type=int, default=500)
     ap.add_argument("--regex", type=str, default=r"\b(shall|should|must)\b")
+    ap.add_argument("--workers", type=int, default=1, help="Process pool size (1 = serial)")
+    ap.add_argument("--pages-per-task", type=int, default=64, help="PDF page range per parallel task")
+    ap.add_argument("--no-cache", action="store_true", help="Re-parse every document")
     args = ap.parse_args()
-    main(args.min_len, args.max_len, args.regex)
+    main(args.min_len, args.max_len, args.regex, args.workers, args.pages_per_task, not args.no_cache)
@@ -5,19 +5,37 @@ Usage:
   python tools/fetch_sources.py
 Options:
   --only NAME1,NAME2        Fetch only listed sources
-  --skip-existing           Skip already downloaded files
+  --skip-existing           Skip already downloaded files (no request is made)
+  --force                   Ignore stored ETag/Last-Modified and re-download
+  --workers N               Concurrent downloads (default 8)
+  --per-host N              Max concurrent downloads per host (default 2)
+  --config PATH             Sources YAML (default config/sources_t3.yaml)
+  --out-dir PATH            Download directory (default data/raw/t3_domain/downloads)
   --ca-bundle PATH          Custom CA bundle (e.g., from certifi)
   --insecure                Disable SSL verification (NOT recommended)
+
+Unchanged files are detected with conditional GETs (If-None-Match /
+If-Modified-Since) against the ETag/Last-Modified stored per source in
+manifest.json; bodies are streamed to a temp file and renamed into place.
 """
-import argparse, sys, time
+import argparse, sys, time, os, json, hashlib, threading
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
 import requests, yaml, certifi
+from requests.adapters import HTTPAdapter
 from urllib.parse import urlparse
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src" / "data"))
+import metrics
+
 ROOT = Path(__file__).resolve().parents[1]
 CONF = ROOT / "config" / "sources_t3.yaml"
 OUT_DIR = ROOT / "data" / "raw" / "t3_domain" / "downloads"
-OUT_DIR.mkdir(parents=True, exist_ok=True)
+
+USER_AGENT = "RegulQA-Harvester/1.0"
+CHUNK = 1 << 20
+EXTS = (".pdf", ".html", ".txt")
 
 def sanitize_ext(url, content_type, forced_type):
     if forced_type and forced_type != "auto":
@@ -32,35 +50,132 @@ def sanitize_ext(url, content_type, forced_type):
             return ".html" if ext==".htm" else ext
     return ""
 
-def fetch_one(name, url, forced_type="auto", skip_existing=False, verify=True):
-    """Download one source file with retries and SSL control."""
-    hdr = {"User-Agent":"RegulQA-Harvester/1.0"}
+def existing_file(name, out_dir=OUT_DIR):
+    """Return an already downloaded file for `name` (any known extension), if any."""
+    for ext in EXTS:
+        p = out_dir / f"{name}{ext}"
+        if p.exists():
+            return p
+    return None
+
+_local = threading.local()
+
+def _session(pool_size=8):
+    """One pooled, keep-alive session per worker thread."""
+    s = getattr(_local, "session", None)
+    if s is None:
+        s = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        s.mount("http://", adapter); s.mount("https://", adapter)
+        s.headers["User-Agent"] = USER_AGENT
+        _local.session = s
+    return s
+
+class HostLimiter:
+    """Bounded semaphore per host so one server never sees more than `limit` downloads."""
+    def __init__(self, limit):
+        self.limit = max(1, int(limit))
+        self._sems = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, url):
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            if host not in self._sems:
+                self._sems[host] = threading.BoundedSemaphore(self.limit)
+            return self._sems[host]
+
+def _stream_to(blocks, out):
+    """Stream body blocks to `out` via a temp file + atomic rename; return (sha256, bytes)."""
+    tmp = out.with_name(out.name + ".part")
+    h = hashlib.sha256(); size = 0
+    try:
+        with open(tmp, "wb") as f:
+            for block in blocks:
+                if not block: continue
+                f.write(block); h.update(block); size += len(block)
+        os.replace(tmp, out)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+    return h.hexdigest(), size
+
+def fetch_one(name, url, forced_type="auto", skip_existing=False, verify=True,
+              prev=None, out_dir=OUT_DIR, limiter=None, force=False):
+    """Download one source file with retries, SSL control and conditional GET.
+
+    Returns a manifest entry dict (with "status" ok/unchanged/skip) or None on failure.
+    """
+    with metrics.span("fetch.source") as sp:
+        entry = _fetch_one(name, url, forced_type, skip_existing, verify, prev, out_dir, limiter, force)
+        status = entry["status"] if entry else "fail"
+        metrics.count("fetch.sources", status=status)
+        if status == "ok":
+            sp.add(docs=1, bytes=entry.get("bytes", 0))
+    return entry
+
+def _fetch_one(name, url, forced_type, skip_existing, verify, prev, out_dir, limiter, force):
+    prev = prev or {}
+    have = existing_file(name, out_dir)
+    if skip_existing and have:
+        print(f"[skip] {name} exists:", have.name)
+        return {**prev, "url": url, "file": have.name, "status": "skip"}
+
+    hdr = {}
+    if have and not force and prev.get("url") == url and prev.get("file") == have.name:
+        if prev.get("etag"): hdr["If-None-Match"] = prev["etag"]
+        if prev.get("last_modified"): hdr["If-Modified-Since"] = prev["last_modified"]
+    sem = limiter(url) if limiter else threading.BoundedSemaphore(1)
+
     for attempt in range(3):
         try:
-            r = requests.get(url, headers=hdr, timeout=90, verify=verify)
-            r.raise_for_status()
-            ctype = r.headers.get("Content-Type","").lower()
-            ext = sanitize_ext(url, ctype, forced_type)
-            if not ext:
-                if r.content[:4] == b"%PDF": ext = ".pdf"
-                else: ext = ".html"
-            out = OUT_DIR / f"{name}{ext}"
-            if skip_existing and out.exists():
-                print(f"[skip] {name} exists:", out.name)
-                return out
-            out.write_bytes(r.content)
-            print(f"[ok] {name} → {out}")
-            return out
+            with sem, _session().get(url, headers=hdr, timeout=90, verify=verify, stream=True) as r:
+                if r.status_code == 304:
+                    print(f"[unchanged] {name} (304)")
+                    return {**prev, "status": "unchanged"}
+                r.raise_for_status()
+                ctype = r.headers.get("Content-Type","").lower()
+                ext = sanitize_ext(url, ctype, forced_type)
+                body = r.iter_content(chunk_size=CHUNK)
+                first = next(body, b"")
+                if not ext:
+                    ext = ".pdf" if first[:4] == b"%PDF" else ".html"
+                out = out_dir / f"{name}{ext}"
+                digest, size = _stream_to(chain([first], body), out)
+                for ext_ in EXTS:          # the type changed (e.g. .html → .pdf): drop the old copy
+                    old = out_dir / f"{name}{ext_}"
+                    if old != out and old.exists():
+                        old.unlink()
+                entry = {"url": url, "file": out.name, "sha256": digest, "bytes": size,
+                         "etag": r.headers.get("ETag"), "last_modified": r.headers.get("Last-Modified"),
+                         "status": "ok"}
+            if prev.get("sha256") == digest and prev.get("file") == out.name:
+                entry["status"] = "unchanged"
+                print(f"[unchanged] {name} (same sha256)")
+            else:
+                print(f"[ok] {name} → {out}")
+            return entry
         except Exception as e:
             print(f"[warn] {name} attempt {attempt+1}: {e}")
             time.sleep(2*(attempt+1))
     print(f"[fail] {name}")
     return None
 
-def main(only_names=None, skip_existing=False, ca_bundle=None, insecure=False):
+def load_manifest(out_dir=OUT_DIR):
+    """Per-source entries from manifest.json ({} for the legacy {"downloaded": [...]} layout)."""
+    p = out_dir / "manifest.json"
+    try:
+        return json.loads(p.read_text()).get("sources", {})
+    except Exception:
+        return {}
+
+def main(only_names=None, skip_existing=False, ca_bundle=None, insecure=False,
+         workers=8, per_host=2, force=False, conf=CONF, out_dir=OUT_DIR):
     """Main entry point."""
+    conf, out_dir = Path(conf), Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
     try:
-        cfg = yaml.safe_load(CONF.read_text())
+        cfg = yaml.safe_load(conf.read_text())
     except Exception as e:
         print("Error loading config:", e)
         return 1
@@ -71,29 +186,45 @@ def main(only_names=None, skip_existing=False, ca_bundle=None, insecure=False):
         allow = set(n.strip() for n in only_names.split(","))
         srcs = [s for s in srcs if s.get("name") in allow]
 
-    downloaded = []
-    for s in srcs:
-        out = fetch_one(
+    manifest = load_manifest(out_dir)
+    limiter = HostLimiter(per_host)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+        futs = {ex.submit(
+            fetch_one,
             s.get("name"),
-            s.get("url"),
+            (s.get("url") or "").strip(),
             s.get("type", "auto"),
             skip_existing=skip_existing,
-            verify=verify
-        )
-        if out:
-            downloaded.append(str(out))
-
-    # Write manifest
-    import json
-    (OUT_DIR / "manifest.json").write_text(json.dumps({"downloaded": downloaded}, indent=2))
-    print("Downloaded:", len(downloaded))
+            verify=verify,
+            prev=manifest.get(s.get("name")),
+            out_dir=out_dir,
+            limiter=limiter,
+            force=force,
+        ): s.get("name") for s in srcs}
+        results = [(name, f.result()) for f, name in futs.items()]
+
+    # Write manifest (keeps entries of sources not fetched in this run)
+    for name, entry in results:
+        if entry:
+            manifest[name] = {k: v for k, v in entry.items() if k != "status"}
+    downloaded = [str(out_dir / e["file"]) for e in manifest.values() if e.get("file")]
+    (out_dir / "manifest.json").write_text(json.dumps({"downloaded": downloaded, "sources": manifest}, indent=2))
+    status = [e["status"] for _, e in results if e]
+    print("Downloaded:", status.count("ok"), "unchanged:", status.count("unchanged"),
+          "skipped:", status.count("skip"), "failed:", sum(1 for _, e in results if not e))
     return 0
 
 if __name__ == "__main__":
     ap = argparse.ArgumentParser()
     ap.add_argument("--only", dest="only", default=None)
     ap.add_argument("--skip-existing", action="store_true")
+    ap.add_argument("--force", action="store_true", help="Ignore stored validators and re-download")
+    ap.add_argument("--workers", type=int, default=8)
+    ap.add_argument("--per-host", type=int, default=2)
+    ap.add_argument("--config", default=str(CONF))
+    ap.add_argument("--out-dir", default=str(OUT_DIR))
     ap.add_argument("--ca-bundle", default=None, help="Path to a CA bundle (e.g., from certifi)")
     ap.add_argument("--insecure", action="store_true", help="Disable TLS verification (not recommended)")
     args = ap.parse_args()
-    sys.exit(main(args.only, args.skip_existing, args.ca_bundle, args.insecure))
\ No newline at end of file
+    sys.exit(main(args.only, args.skip_existing, args.ca_bundle, args.insecure,
+                  args.workers, args.per_host, args.force, args.config, args.out_dir))
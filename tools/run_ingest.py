@@ -0,0 +1,241 @@
+"""
+One-command, incremental ingest: runs the pipeline stages as a DAG.
+
+Usage:
+  python tools/run_ingest.py [--fetch] [--force] [--only STAGE1,STAGE2] [--workers N] [--dry-run] [--metrics]
+
+Each stage declares its code, inputs and outputs (globs under the repo root).
+A stage is skipped when the fingerprint of its code, settings and input
+contents matches the last successful run and its outputs still exist.
+Content hashes are cached by (size, mtime), so unchanged files are never
+re-read. Independent stages (T1 conversion, T2 synthesis, T3 extraction) run in
+parallel, each in a fresh worker process so its peak RSS can be measured.
+
+Network stages (download_t1, fetch_t3) only run with --fetch.
+State: data/interim/ingest_state.json
+Run report (wall time, rows in/out, peak RSS per stage): data/interim/ingest_reports/
+"""
+import argparse, hashlib, json, os, sys, time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+INTERIM = ROOT / "data" / "interim"
+STATE = INTERIM / "ingest_state.json"
+REPORTS = INTERIM / "ingest_reports"
+
+sys.path.insert(0, str(ROOT / "src" / "data"))
+
+# name: (code file, function, kwargs, deps, inputs, outputs, network)
+STAGES = {
+    "download_t1": ("src/data/download_t1.py", "main", {}, [],
+                    [], ["data/raw/t1_pure/**/*", "data/raw/t1_promise_exp/*", "data/raw/t1_nasa_srs/*.csv"], True),
+    "fetch_t3": ("tools/fetch_sources.py", "main", {}, [],
+                 ["config/sources_t3.yaml"], ["data/raw/t3_domain/downloads/*"], True),
+    "convert_t1": ("src/data/convert_t1_html_xml.py", "convert_all", {}, ["download_t1"],
+                   ["data/raw/t1_*/**/*.html", "data/raw/t1_*/**/*.htm", "data/raw/t1_*/**/*.xhtml",
+                    "data/raw/t1_*/**/*.xml"], []),
+    "synth_t2": ("src/data/synth_t2.py", "make_synthetic", {}, [],
+                 ["config/synth_t2.yaml"], ["data/raw/t2_synthetic/*.csv"]),
+    "extract_t3": ("tools/extract_to_csv.py", "main", {"workers": min(4, os.cpu_count() or 1)}, ["fetch_t3"],
+                   ["data/raw/t3_domain/downloads/*.pdf", "data/raw/t3_domain/downloads/*.html",
+                    "data/raw/t3_domain/downloads/*.htm", "data/raw/t3_domain/downloads/*.txt"],
+                   ["data/raw/t3_domain/harvested/*.csv", "data/raw/t3_domain/ALL_t3_harvested.csv"]),
+    "collect_t3": ("src/data/collect_t3.py", "collect", {}, ["extract_t3"],
+                   ["data/raw/t3_domain/**/*.csv", "data/raw/t3_domain/**/*.xlsx", "data/raw/t3_domain/**/*.arff"],
+                   ["data/raw/t3_domain/domain_collected.csv"]),
+    "build_pool": ("src/data/clean_all.py", "build_pool", {}, ["convert_t1", "synth_t2", "collect_t3"],
+                   ["data/raw/**/*.csv", "data/raw/**/*.xlsx", "data/raw/**/*.arff", "config/sector_overrides.yaml"],
+                   ["data/processed/regulqa_ambig_pool.parquet"]),
+    "near_dup": ("src/data/near_dup.py", "cluster_pool", {}, ["build_pool"],
+                 ["data/processed/regulqa_ambig_pool.parquet"], ["data/interim/near_dup_clusters.parquet"]),
+    "profile": ("src/data/pool_profile.py", "profile", {}, ["build_pool"],
+                ["data/processed/regulqa_ambig_pool.parquet", "data/processed/bootstrap_v1_labels.py"],
+                ["data/interim/pool_profile.json"]),
+    "search_index": ("src/data/search.py", "update", {}, ["build_pool"],
+                     ["data/processed/regulqa_ambig_pool.parquet"], ["data/interim/pool_search.sqlite"]),
+    "features": ("src/data/features.py", "build", {}, ["build_pool"],
+                 ["data/processed/regulqa_ambig_pool.parquet", "data/processed/bootstrap_v1_labels.py"],
+                 ["data/interim/features/meta.json"]),
+    "cap_pool": ("src/data/cap_pool.py", "cap_pool", {"per_document": 150, "label_ratio": "ambiguous=0.5,clear=0.5"},
+                 ["build_pool"], ["data/processed/regulqa_ambig_pool.parquet", "data/processed/bootstrap_v1_labels.py"],
+                 ["data/processed/regulqa_ambig_pool_capped.parquet"]),
+    "label": ("data/processed/bootstrap_v1_labels.py", "main", {}, ["cap_pool"],
+              ["data/processed/regulqa_ambig_pool_capped.*", "src/data/rule_cache.py"],
+              ["data/processed/regulqa_ambig_v11.parquet"]),
+}
+# shared code whose changes invalidate every stage that imports it
+SHARED = ["src/data/storage.py", "src/data/readers.py", "src/data/sectors.py"]
+
+def _stage(name):
+    code, func, kwargs, deps, inputs, outputs, *net = STAGES[name]
+    return code, func, kwargs, deps, inputs, outputs, bool(net and net[0])
+
+def _glob(patterns):
+    files = set()
+    for pat in patterns:
+        files.update(p for p in ROOT.glob(pat) if p.is_file() and not p.name.endswith(".part"))
+    return sorted(files)
+
+def _content_hash(path, cache):
+    """sha256 of a file, reused from `cache` while its (size, mtime_ns) is unchanged."""
+    st = path.stat()
+    rel = str(path.relative_to(ROOT))
+    hit = cache.get(rel)
+    if hit and hit[0] == st.st_size and hit[1] == st.st_mtime_ns:
+        return hit[2]
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    cache[rel] = [st.st_size, st.st_mtime_ns, h.hexdigest()]
+    return cache[rel][2]
+
+def fingerprint(name, cache):
+    """Hash of the stage's code, settings and input file contents (its own outputs excluded)."""
+    code, func, kwargs, _, inputs, outputs, _ = _stage(name)
+    outs = set(_glob(outputs))
+    h = hashlib.sha256(json.dumps([func, kwargs], sort_keys=True).encode())
+    for p in [ROOT / code] + [ROOT / s for s in SHARED] + [p for p in _glob(inputs) if p not in outs]:
+        if p.exists():
+            h.update(str(p.relative_to(ROOT)).encode()); h.update(_content_hash(p, cache).encode())
+    return h.hexdigest()
+
+def count_rows(paths):
+    """Rows over the tabular files in `paths` (None if there are none)."""
+    import storage
+    total, seen = 0, False
+    for p in paths:
+        if p.suffix.lower() not in (".csv", ".parquet"): continue
+        try:
+            total += storage.count_rows(p); seen = True
+        except Exception:
+            pass
+    return total if seen else None
+
+def _run_stage(name, code, func, kwargs):
+    """Worker entry: import the stage module by path, call it, measure wall time and peak RSS."""
+    import importlib.util, traceback
+    t0 = time.perf_counter()
+    error = None
+    try:
+        spec = importlib.util.spec_from_file_location(f"stage_{name}", ROOT / code)
+        mod = importlib.util.module_from_spec(spec); spec.loader.exec_module(mod)
+        ret = getattr(mod, func)(**kwargs)
+        if isinstance(ret, int) and not isinstance(ret, bool) and func == "main" and ret != 0:
+            error = f"exit code {ret}"
+    except SystemExit as e:
+        if e.code not in (0, None): error = f"exit code {e.code}"
+    except Exception:
+        error = traceback.format_exc(limit=3)
+    if "metrics" in sys.modules:
+        sys.modules["metrics"].flush()
+    from metrics import _peak_rss_mb
+    return {"wall_s": round(time.perf_counter() - t0, 3), "peak_rss_mb": _peak_rss_mb(children=True), "error": error}
+
+def _select(only):
+    """Requested stages plus everything they depend on, in declaration (= topological) order."""
+    if not only:
+        return list(STAGES)
+    want, todo = set(), [s.strip() for s in only.split(",") if s.strip()]
+    for s in todo:
+        if s not in STAGES:
+            raise SystemExit(f"Unknown stage: {s} (choose from {', '.join(STAGES)})")
+    while todo:
+        s = todo.pop()
+        if s not in want:
+            want.add(s); todo.extend(_stage(s)[3])
+    return [s for s in STAGES if s in want]
+
+def _load_state():
+    try:
+        return json.loads(STATE.read_text())
+    except Exception:
+        return {"stages": {}, "files": {}}
+
+def run(only=None, fetch=False, force=False, workers=None, dry_run=False):
+    names = _select(only)
+    state = _load_state()
+    state.setdefault("stages", {}); cache = state.setdefault("files", {})
+    report = {"started": datetime.now(timezone.utc).isoformat(timespec="seconds"), "stages": {}}
+    status, pending, running = {}, list(names), {}
+    t_run = time.perf_counter()
+
+    def decide(name):
+        """'run', or the reason the stage is not run."""
+        _, _, _, deps, inputs, outputs, net = _stage(name)
+        if any(status.get(d) in ("failed", "blocked") for d in deps if d in status):
+            return "blocked"
+        if net:
+            return "run" if fetch else "skipped (network, use --fetch)"
+        if inputs and not _glob(inputs):
+            return "skipped (no inputs)"
+        if force:
+            return "run"
+        prev = state["stages"].get(name, {})
+        if prev.get("fingerprint") != fingerprint(name, cache) or (outputs and not _glob(outputs)):
+            return "run"
+        return "up-to-date"
+
+    max_workers = workers or min(4, os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=max_workers, max_tasks_per_child=1) as ex:
+        while pending or running:
+            for name in [n for n in pending if all(d in status for d in _stage(n)[3] if d in names)]:
+                pending.remove(name)
+                verdict = decide(name)
+                if verdict != "run" or dry_run:
+                    status[name] = verdict if verdict != "run" else "would run"
+                    report["stages"][name] = {"status": status[name]}
+                    print(f"[{status[name]}] {name}")
+                    continue
+                code, func, kwargs, _, inputs, outputs, _ = _stage(name)
+                print(f"[run] {name}")
+                rows_in = count_rows(_glob(inputs))
+                running[ex.submit(_run_stage, name, code, func, kwargs)] = (name, rows_in)
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                name, rows_in = running.pop(fut)
+                res = fut.result()
+                _, _, _, _, _, outputs, net = _stage(name)
+                res.update(rows_in=rows_in, rows_out=count_rows(_glob(outputs)))
+                res["status"] = status[name] = "failed" if res["error"] else "ok"
+                if not res["error"] and not net:
+                    state["stages"][name] = {"fingerprint": fingerprint(name, cache), "finished": time.time(),
+                                             "rows_out": res["rows_out"]}
+                    INTERIM.mkdir(parents=True, exist_ok=True); STATE.write_text(json.dumps(state, indent=2))
+                report["stages"][name] = res
+                print(f"[{res['status']}] {name} wall={res['wall_s']}s rows_in={rows_in} "
+                      f"rows_out={res['rows_out']} peak_rss={res['peak_rss_mb']}MB")
+                if res["error"]:
+                    print(res["error"])
+
+    report["wall_s"] = round(time.perf_counter() - t_run, 3)
+    if not dry_run:
+        REPORTS.mkdir(parents=True, exist_ok=True)
+        STATE.write_text(json.dumps(state, indent=2))
+        out = REPORTS / f"ingest_{report['started'].replace(':', '').replace('+0000', 'Z')}.json"
+        out.write_text(json.dumps(report, indent=2))
+        (REPORTS / "latest.json").write_text(json.dumps(report, indent=2))
+        print("Report →", out)
+    ran = [n for n, s in status.items() if s == "ok"]
+    print("Ran:", len(ran), "up-to-date:", sum(1 for s in status.values() if s == "up-to-date"),
+          "failed:", sum(1 for s in status.values() if s == "failed"), "wall:", report["wall_s"], "s")
+    return 1 if any(s in ("failed", "blocked") for s in status.values()) else 0
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--only", default=None, help="Comma-separated stages (their dependencies are included)")
+    ap.add_argument("--fetch", action="store_true", help="Also run the network stages")
+    ap.add_argument("--force", action="store_true", help="Run stages even if their fingerprint is unchanged")
+    ap.add_argument("--workers", type=int, default=None, help="Parallel stages (default min(4, cpus))")
+    ap.add_argument("--dry-run", action="store_true", help="Show what would run")
+    ap.add_argument("--metrics", action="store_true",
+                    help="Record stage metrics → data/interim/metrics/ (metrics.jsonl, run_ingest.prom)")
+    args = ap.parse_args()
+    if args.metrics:
+        import metrics
+        metrics.enable(component="run_ingest")
+    sys.exit(run(args.only, args.fetch, args.force, args.workers, args.dry_run))
@@ -0,0 +1,309 @@
+"""
+Local ambiguity scoring service (stdlib asyncio HTTP, CPU only).
+
+Usage:
+  python tools/score_server.py [--host 127.0.0.1] [--port 8765] [--max-batch 64] [--max-wait-ms 5]
+                               [--cache-size 100000] [--max-queue 10000] [--model MODEL.npz] [--workers 1]
+
+Endpoints:
+  POST /score    {"text": "..."} or {"texts": [...], "sector": "rail"}  → {"results": [{ambig_presence, ...}]}
+  GET  /stats    JSON: requests, texts, batches, mean batch size, cache hit rate,
+                 latency p50/p99 (ms, last 10k requests) and requests/s over the last 10 s
+  GET  /metrics  the same as Prometheus text
+  GET  /health
+
+Requests are answered from an LRU cache keyed by text (text and sector with
+--model, whose score depends on it) when possible; the rest are queued, and a batcher coalesces concurrent texts into one scan of the
+labeler rules (bootstrap_v1_labels.scan + labels_from_masks) of at most
+--max-batch texts, waiting no longer than --max-wait-ms for the batch to fill.
+Scoring runs in a thread pool of --workers threads, each scoring one batch, so
+the event loop keeps accepting and collecting the next batch meanwhile. The
+queue holds at most --max-queue texts; a request that doesn't fit is answered
+503 at once (413 if it could never fit), so latency stays bounded under overload.
+
+--model adds "score" (probability of ambiguous) from a linear model over the
+feature store's features (src/data/features.featurize): an .npz with coef
+(2**bits + cue columns), intercept and bits.
+
+Load test: python benchmarks/load_score_server.py
+"""
+import argparse, asyncio, json, sys, time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "src" / "data"))
+sys.path.insert(0, str(ROOT / "data" / "processed"))
+import bootstrap_v1_labels as labeler
+
+LABEL_COLS = labeler.LABEL_COLS
+MAX_BODY = 4 << 20
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+           500: "Internal Server Error", 503: "Service Unavailable"}
+COUNTERS = ("requests", "texts", "errors", "rejected", "batches", "cache_hits", "cache_misses")
+
+class Overloaded(Exception):
+    """The queue can't take a request's texts now (status 503), or ever (413)."""
+    def __init__(self, status):
+        super().__init__(REASONS[status]); self.status = status
+
+class LRU:
+    def __init__(self, size):
+        self.size, self.data = size, OrderedDict()
+
+    def get(self, key):
+        v = self.data.get(key)
+        if v is not None:
+            self.data.move_to_end(key)
+        return v
+
+    def put(self, key, value):
+        if self.size <= 0:
+            return
+        self.data[key] = value; self.data.move_to_end(key)
+        if len(self.data) > self.size:
+            self.data.popitem(last=False)
+
+class LinearModel:
+    """Logistic score over features.featurize columns."""
+
+    def __init__(self, path):
+        import features
+        z = np.load(path)
+        self.coef, self.intercept, self.bits = z["coef"].astype(np.float32), float(z["intercept"]), int(z["bits"])
+        self.featurize = features.featurize
+
+    def score(self, texts, sectors):
+        data, indices, indptr = self.featurize(texts, sectors, self.bits)
+        rows = np.repeat(np.arange(len(texts)), np.diff(indptr))
+        sums = np.bincount(rows, weights=data * self.coef[indices], minlength=len(texts))
+        return 1 / (1 + np.exp(-(sums + self.intercept)))
+
+class Stats:
+    def __init__(self, window=10_000):
+        self.latency = deque(maxlen=window)         # seconds per request
+        self.done = deque(maxlen=window)            # completion times, for requests/s
+        self.requests = self.texts = self.batches = self.batched = self.hits = self.misses = self.errors = self.rejected = 0
+        self.started = time.time()
+
+    def report(self):
+        lat = np.array(self.latency) * 1000 if self.latency else np.zeros(1)
+        now = time.monotonic()
+        recent = sum(1 for t in self.done if now - t <= 10)
+        # a full window may cover less than 10 s at high rates
+        span = now - self.done[0] if recent == self.done.maxlen else min(10, time.time() - self.started)
+        return {"requests": self.requests, "texts": self.texts, "errors": self.errors, "rejected": self.rejected,
+                "batches": self.batches,
+                "mean_batch": round(self.batched / self.batches, 2) if self.batches else 0,
+                "cache_hits": self.hits, "cache_misses": self.misses,
+                "cache_hit_rate": round(self.hits / (self.hits + self.misses), 4) if self.hits + self.misses else 0,
+                "latency_ms_p50": round(float(np.percentile(lat, 50)), 3),
+                "latency_ms_p99": round(float(np.percentile(lat, 99)), 3),
+                "requests_per_s_10s": round(recent / span, 1) if span > 0 else 0.0, "uptime_s": round(time.time() - self.started, 1)}
+
+    def prom(self):
+        r = self.report()
+        out = []
+        for k, v in r.items():
+            name, kind = (f"regulqa_score_{k}_total", "counter") if k in COUNTERS else (f"regulqa_score_{k}", "gauge")
+            out += [f"# TYPE {name} {kind}", f"{name} {v}"]
+        return "\n".join(out) + "\n"
+
+class Scorer:
+    """LRU + micro-batching front of the labeler (and optional linear model)."""
+
+    def __init__(self, max_batch=64, max_wait_ms=5.0, cache_size=100_000, model=None, workers=1):
+        self.max_batch, self.max_wait = max_batch, max_wait_ms / 1000
+        self.cache, self.model, self.stats = LRU(cache_size), model, Stats()
+        self.queue = None
+        self.workers, self.pool = workers, ThreadPoolExecutor(max_workers=workers)
+
+    def _score(self, texts, sectors):
+        labels = labeler.labels_from_masks(labeler.scan(texts))
+        rows = [dict(zip(LABEL_COLS, r)) for r in labels[LABEL_COLS].itertuples(index=False, name=None)]
+        if self.model is not None:
+            for r, s in zip(rows, self.model.score(texts, sectors)):
+                r["score"] = round(float(s), 6)
+        return rows
+
+    def _key(self, text, sector):
+        return (text, sector) if self.model is not None else text
+
+    async def score(self, texts, sector="general"):
+        out, todo = [None] * len(texts), []
+        for i, t in enumerate(texts):
+            hit = self.cache.get(self._key(t, sector))
+            if hit is not None:
+                out[i] = hit; self.stats.hits += 1
+            else:
+                todo.append(i); self.stats.misses += 1
+        if todo:
+            if self.queue.maxsize and len(todo) > self.queue.maxsize - self.queue.qsize():
+                self.stats.rejected += 1
+                raise Overloaded(413 if len(todo) > self.queue.maxsize else 503)
+            loop = asyncio.get_running_loop()
+            futs = [loop.create_future() for _ in todo]
+            for i, f in zip(todo, futs):
+                self.queue.put_nowait((texts[i], sector, f))
+            for i, r in zip(todo, await asyncio.gather(*futs)):
+                out[i] = r
+        return out
+
+    async def batcher(self):
+        """Collect batches and hand each to the pool; up to --workers batches are scored at once."""
+        loop = asyncio.get_running_loop()
+        slots = asyncio.Semaphore(self.workers)
+        while True:
+            await slots.acquire()
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    left = deadline - loop.time()
+                    if left <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self.queue.get(), left))
+                    except asyncio.TimeoutError:
+                        break
+            fut = loop.run_in_executor(self.pool, self._score, [b[0] for b in batch], [b[1] for b in batch])
+
+            def done(fut, batch=batch):
+                slots.release()
+                self._finish(batch, fut)
+            fut.add_done_callback(done)
+
+    def _finish(self, batch, fut):
+        if fut.cancelled():
+            return
+        if fut.exception() is not None:
+            for _, _, f in batch:
+                if not f.done(): f.set_exception(fut.exception())
+            return
+        self.stats.batches += 1; self.stats.batched += len(batch)
+        for (t, s, f), r in zip(batch, fut.result()):
+            self.cache.put(self._key(t, s), r)
+            if not f.done(): f.set_result(r)
+
+async def _read_request(reader):
+    """(method, path, headers, body) of one HTTP/1.1 request, or None at EOF."""
+    line = await reader.readline()
+    if not line:
+        return None
+    method, path, version = line.decode("latin-1").split(" ", 2)
+    headers = {}
+    while True:
+        h = await reader.readline()
+        if h in (b"\r\n", b"\n", b""):
+            break
+        k, _, v = h.decode("latin-1").partition(":")
+        headers[k.strip().lower()] = v.strip()
+    n = int(headers.get("content-length", 0) or 0)
+    if n > MAX_BODY:
+        raise ValueError(413)
+    body = await reader.readexactly(n) if n else b""
+    return method, path, version.strip(), headers, body
+
+def _response(status, body, ctype="application/json", keep_alive=True):
+    if not isinstance(body, bytes):
+        body = (json.dumps(body) if ctype == "application/json" else body).encode("utf-8")
+    head = (f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\nContent-Type: {ctype}\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode("latin-1") + body
+
+async def _handle(scorer, method, path, body):
+    path = path.split("?", 1)[0]
+    if path == "/score":
+        if method != "POST":
+            return 405, {"error": "POST a JSON body"}
+        try:
+            req = json.loads(body or b"{}")
+            texts = req["texts"] if "texts" in req else [req["text"]]
+            texts = [str(t) for t in texts]
+        except Exception:
+            return 400, {"error": 'expected {"text": ...} or {"texts": [...]}'}
+        t0 = time.monotonic()
+        try:
+            results = await scorer.score(texts, str(req.get("sector") or "general"))
+        except Overloaded as e:
+            return e.status, {"error": str(e)}
+        st = scorer.stats
+        st.requests += 1; st.texts += len(texts)
+        st.latency.append(time.monotonic() - t0); st.done.append(time.monotonic())
+        return 200, {"results": results}
+    if method != "GET":
+        return 405, {"error": "GET only"}
+    if path == "/stats":
+        return 200, scorer.stats.report()
+    if path == "/metrics":
+        return 200, scorer.stats.prom()
+    if path == "/health":
+        return 200, {"ok": True}
+    return 404, {"error": "not found"}
+
+async def serve(host="127.0.0.1", port=8765, max_batch=64, max_wait_ms=5.0, cache_size=100_000, model=None,
+                workers=1, ready=None, max_queue=10_000):
+    scorer = Scorer(max_batch, max_wait_ms, cache_size, LinearModel(model) if model else None, workers)
+    scorer.queue = asyncio.Queue(maxsize=max_queue)
+    batcher = asyncio.create_task(scorer.batcher())
+
+    async def client(reader, writer):
+        try:
+            while True:
+                try:
+                    req = await _read_request(reader)
+                except ValueError as e:
+                    code = e.args[0] if e.args and e.args[0] in REASONS else 400
+                    writer.write(_response(code, {"error": REASONS[code]}, keep_alive=False)); break
+                if req is None:
+                    break
+                method, path, version, headers, body = req
+                keep = headers.get("connection", "").lower() != "close" and version != "HTTP/1.0"
+                try:
+                    status, payload = await _handle(scorer, method, path, body)
+                except Exception as e:
+                    scorer.stats.errors += 1
+                    status, payload = 500, {"error": str(e)}
+                ctype = "text/plain; version=0.0.4" if path.startswith("/metrics") and status == 200 else "application/json"
+                writer.write(_response(status, payload, ctype, keep))
+                await writer.drain()
+                if not keep:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(client, host, port, backlog=1024)
+    addr = server.sockets[0].getsockname()
+    print(f"Scoring on http://{addr[0]}:{addr[1]} (max batch {max_batch}, max wait {max_wait_ms} ms, "
+          f"cache {cache_size}{', model ' + str(model) if model else ''})", flush=True)
+    if ready is not None:
+        ready(addr)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        batcher.cancel()
+        scorer.pool.shutdown(wait=False)
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--max-batch", type=int, default=64)
+    ap.add_argument("--max-wait-ms", type=float, default=5.0, help="Longest a text waits for its batch to fill")
+    ap.add_argument("--cache-size", type=int, default=100_000, help="LRU entries (0 disables the cache)")
+    ap.add_argument("--model", default=None, help="Linear model .npz over features.featurize (coef, intercept, bits)")
+    ap.add_argument("--workers", type=int, default=1, help="Batches scored at once (threads)")
+    ap.add_argument("--max-queue", type=int, default=10_000, help="Queued texts before requests get 503 (0: unbounded)")
+    args = ap.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.max_batch, args.max_wait_ms, args.cache_size, args.model,
+                          args.workers, max_queue=args.max_queue))
+    except KeyboardInterrupt:
+        pass